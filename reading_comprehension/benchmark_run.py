@@ -0,0 +1,45 @@
+import argparse
+
+import numpy as np
+
+from util.benchmark_util import *
+
+def add_arguments(parser):
+    parser.add_argument("--mode", help="mode to run", required=True)
+    parser.add_argument("--batch-size", help="batch size", type=int, default=100)
+    parser.add_argument("--context-length", help="list of context length", type=int, nargs="+", default=[100, 200, 300, 400, 500])
+    parser.add_argument("--answer-length", help="max answer length", type=int, default=30)
+    parser.add_argument("--subword-length", help="max subword length", type=int, default=16)
+    parser.add_argument("--subword-size", help="subword size", type=int, default=3)
+    parser.add_argument("--char-length", help="max char length", type=int, default=16)
+    parser.add_argument("--num-parallel", help="num of parallel processes", type=int, default=1)
+    parser.add_argument("--num-iter", help="num of iteration", type=int, default=10)
+    parser.add_argument("--random-seed", help="random seed", type=int, default=100)
+
+def print_result(benchmark_result):
+    for result in benchmark_result:
+        print(", ".join(["{0}={1}".format(key, result[key]) for key in result.keys()]))
+
+def main(args):
+    if (args.mode == 'span_decode'):
+        benchmark_result = benchmark_span_decode(args.batch_size,
+            args.context_length, args.answer_length, args.num_iter, args.random_seed)
+    elif (args.mode == 'subword_feat'):
+        benchmark_result = benchmark_subword_feat(args.batch_size, args.context_length,
+            args.subword_length, args.subword_size, args.num_iter, args.random_seed)
+    elif (args.mode == 'char_feat'):
+        benchmark_result = benchmark_char_feat(args.batch_size, args.context_length,
+            args.char_length, args.num_iter, args.random_seed)
+    elif (args.mode == 'vocab'):
+        benchmark_result = benchmark_vocab(args.batch_size, args.context_length,
+            args.subword_size, args.num_parallel, args.random_seed)
+    else:
+        raise ValueError("unsupported benchmark mode {0}".format(args.mode))
+    
+    print_result(benchmark_result)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args()
+    main(args)
@@ -31,6 +31,7 @@ class Embedding(object):
             self.embedding = tf.get_variable("embedding", shape=[self.vocab_size, self.embed_dim],
                 initializer=initializer, regularizer=self.regularizer, trainable=self.trainable, dtype=tf.float32)
             self.embedding_placeholder = None
+            self.embedding_initializer = None
     
     def __call__(self,
                  input_data):
@@ -43,13 +44,16 @@ class Embedding(object):
     def get_embedding_placeholder(self):
         """get pretrained embedding placeholder"""
         return self.embedding_placeholder
+    
+    def get_embedding_initializer(self):
+        """get pretrained embedding initializer"""
+        return self.embedding_initializer
 
 class PretrainedEmbedding(object):
     """Pretrained Embedding layer"""
     def __init__(self,
                  vocab_size,
                  embed_dim,
-                 embedding,
                  num_gpus=1,
                  default_gpu_id=0,
                  regularizer=None,
@@ -58,25 +62,20 @@ class PretrainedEmbedding(object):
         """initialize pretrained embedding layer"""
         self.vocab_size = vocab_size
         self.embed_dim = embed_dim
-        self.embedding = embedding
         self.regularizer = regularizer if trainable == True else None
         self.trainable = trainable
         self.scope = scope
         self.device_spec = get_device_spec(default_gpu_id, num_gpus)
         
         with tf.variable_scope(self.scope, reuse=tf.AUTO_REUSE), tf.device(self.device_spec):
-            if self.embedding is not None:
-                initializer = tf.constant_initializer(self.embedding)
-                self.embedding = tf.get_variable("pretrained_embedding", shape=[self.vocab_size, self.embed_dim],
-                    initializer=initializer, regularizer=self.regularizer, trainable=self.trainable, dtype=tf.float32)
-                self.embedding_placeholder = None
-            else:
-                initializer = create_variable_initializer("zero")
-                embedding = tf.get_variable("pretrained_embedding", shape=[self.vocab_size, self.embed_dim],
-                    initializer=initializer, regularizer=self.regularizer, trainable=self.trainable, dtype=tf.float32)
-                self.embedding_placeholder = tf.placeholder(name="embedding_placeholder",
-                    shape=[self.vocab_size, self.embed_dim], dtype=tf.float32)
-                self.embedding = embedding.assign(self.embedding_placeholder)
+            initializer = create_variable_initializer("zero")
+            self.embedding = tf.get_variable("pretrained_embedding", shape=[self.vocab_size, self.embed_dim],
+                initializer=initializer, regularizer=self.regularizer, trainable=self.trainable, dtype=tf.float32)
+            
+            """pretrained embedding is uploaded once through initializer op, so that lookup reads variable directly"""
+            self.embedding_placeholder = tf.placeholder(name="embedding_placeholder",
+                shape=[self.vocab_size, self.embed_dim], dtype=tf.float32)
+            self.embedding_initializer = self.embedding.assign(self.embedding_placeholder)
     
     def __call__(self,
                  input_data):
@@ -89,3 +88,7 @@ class PretrainedEmbedding(object):
     def get_embedding_placeholder(self):
         """get pretrained embedding placeholder"""
         return self.embedding_placeholder
+    
+    def get_embedding_initializer(self):
+        """get pretrained embedding initializer"""
+        return self.embedding_initializer
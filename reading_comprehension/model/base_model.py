@@ -1,4 +1,5 @@
 import collections
+import contextlib
 import os.path
 
 import numpy as np
@@ -7,15 +8,16 @@ import tensorflow as tf
 from util.default_util import *
 from util.reading_comprehension_util import *
 from util.layer_util import *
+from util.decode_util import *
 
 __all__ = ["TrainResult", "InferResult", "BaseModel"]
 
 class TrainResult(collections.namedtuple("TrainResult",
-    ("loss", "learning_rate", "global_step", "batch_size", "summary"))):
+    ("loss", "learning_rate", "global_step", "batch_size", "summary", "tower_batch_size", "tower_time"))):
     pass
 
 class InferResult(collections.namedtuple("InferResult",
-    ("predict", "predict_detail", "batch_size", "summary"))):
+    ("predict", "predict_score", "predict_nbest", "predict_nbest_score", "predict_detail", "batch_size", "summary"))):
     pass
 
 class BaseModel(object):
@@ -43,9 +45,18 @@ class BaseModel(object):
         self.infer_answer_start_mask = None
         self.infer_answer_end = None
         self.infer_answer_end_mask = None
+        self.infer_answer_span = None
+        self.infer_answer_span_score = None
+        self.infer_answer_nbest = None
+        self.infer_answer_nbest_score = None
         self.infer_summary = None
         self.word_embedding = external_data["word_embedding"] if external_data is not None and "word_embedding" in external_data else None
         self.word_embedding_placeholder = None
+        self.word_embedding_initializer = None
+        self.ckpt_debug_writer = None
+        self.ckpt_epoch_writer = None
+        self.variable_assign_op = None
+        self.variable_assign_placeholder = None
         
         self.batch_size = tf.size(tf.reduce_max(self.data_pipeline.input_answer_mask, axis=-2))
         
@@ -54,6 +65,11 @@ class BaseModel(object):
         self.logger.log_print("# {0} gpus are used with default gpu id set as {1}"
             .format(self.num_gpus, self.default_gpu_id))
         
+        self.num_towers = max(self.hyperparams.device_num_towers, 1) if self.mode == "train" else 1
+        self.tower_batch_size = None
+        if self.num_towers > 1:
+            self.logger.log_print("# {0} towers are used for data-parallel training".format(self.num_towers))
+        
         if self.hyperparams.train_regularization_enable == True:
             self.regularizer = create_weight_regularizer(self.hyperparams.train_regularization_type,
                 self.hyperparams.train_regularization_scale)
@@ -62,6 +78,68 @@ class BaseModel(object):
         
         self.random_seed = self.hyperparams.train_random_seed if self.hyperparams.train_enable_debugging else None
     
+    def _split_tower_input(self,
+                           input_data_list):
+        """split batch input along batch dimension into towers, tower sizes differ by at most one sample"""
+        if self.num_towers <= 1:
+            return [input_data_list]
+        
+        batch_size = tf.shape(next(input_data for input_data in input_data_list if input_data is not None))[0]
+        tower_bound = [(batch_size * tower_id) // self.num_towers for tower_id in range(self.num_towers + 1)]
+        self.tower_batch_size = tf.stack([tower_bound[tower_id+1] - tower_bound[tower_id]
+            for tower_id in range(self.num_towers)])
+        
+        tower_input_list = []
+        for tower_id in range(self.num_towers):
+            tower_input_list.append([input_data[tower_bound[tower_id]:tower_bound[tower_id+1]]
+                if input_data is not None else None for input_data in input_data_list])
+        
+        return tower_input_list
+    
+    @contextlib.contextmanager
+    def _tower_scope(self,
+                     tower_id):
+        """build tower with shared variables, layers of tower are placed on gpu of default gpu id plus tower id"""
+        if self.num_towers <= 1:
+            yield
+            return
+        
+        default_gpu_id = self.default_gpu_id
+        self.default_gpu_id = default_gpu_id + tower_id
+        try:
+            """re-entering current variable scope restores default layer names, so that every tower reuses same variables"""
+            with tf.variable_scope(tf.get_variable_scope(), reuse=tf.AUTO_REUSE), tf.name_scope("tower_{0}".format(tower_id)):
+                yield
+        finally:
+            self.default_gpu_id = default_gpu_id
+    
+    def _merge_tower_output(self,
+                            tower_output_list):
+        """merge tower outputs along batch dimension in original batch order"""
+        if len(tower_output_list) <= 1:
+            return tower_output_list[0]
+        
+        return tuple(tf.concat(list(tower_output), axis=0) for tower_output in zip(*tower_output_list))
+    
+    def _get_tower_time(self,
+                        run_metadata):
+        """get per-tower step time from traced step stats, tower time spans forward and backward ops of tower"""
+        tower_time = []
+        for tower_id in range(self.num_towers):
+            tower_prefix = "tower_{0}/".format(tower_id)
+            node_time_list = [(node_stats.all_start_micros, node_stats.all_start_micros + node_stats.all_end_rel_micros)
+                for device_stats in run_metadata.step_stats.dev_stats for node_stats in device_stats.node_stats
+                if tower_prefix in node_stats.node_name]
+            
+            if len(node_time_list) > 0:
+                tower_start_time = min([node_time[0] for node_time in node_time_list])
+                tower_end_time = max([node_time[1] for node_time in node_time_list])
+                tower_time.append((tower_end_time - tower_start_time) / 1000000.0)
+            else:
+                tower_time.append(0.0)
+        
+        return tower_time
+    
     def _create_fusion_layer(self,
                              input_unit_dim,
                              output_unit_dim,
@@ -212,8 +290,8 @@ class BaseModel(object):
     def _minimize_loss(self,
                        loss):
         """minimize optimization loss"""
-        """compute gradients"""
-        if self.num_gpus > 1:
+        """compute gradients, gradients of each tower are colocated with tower ops and summed on shared variables"""
+        if self.num_gpus > 1 or self.num_towers > 1:
             grads_and_vars = self.optimizer.compute_gradients(loss, colocate_gradients_with_ops=True)
         else:
             grads_and_vars = self.optimizer.compute_gradients(loss, colocate_gradients_with_ops=False)
@@ -229,73 +307,196 @@ class BaseModel(object):
         
         return update_model, clipped_gradients, gradient_norm
     
+    def init_embedding(self,
+                       sess):
+        """initialize pretrained word embedding with one-time upload of embedding matrix"""
+        init_word_embed = (self.hyperparams.model_representation_word_embed_pretrained and
+            self.word_embedding is not None and self.word_embedding_initializer is not None)
+        
+        if init_word_embed == True:
+            sess.run(self.word_embedding_initializer,
+                feed_dict={self.word_embedding_placeholder: self.word_embedding})
+    
     def train(self,
               sess,
-              word_embedding):
-        """train model"""
-        feed_word_embed = (self.hyperparams.model_representation_word_embed_pretrained and
-            word_embedding is not None and self.word_embedding_placeholder is not None)
-        
-        if feed_word_embed == True:
-            (_, loss, learning_rate, global_step, batch_size, summary) = sess.run([self.update_op,
-                self.train_loss, self.decayed_learning_rate, self.global_step, self.batch_size, self.train_summary],
-                feed_dict={self.word_embedding_placeholder: word_embedding})
+              enable_profile=False):
+        """train model, batch split and per-tower step time are traced on profile steps when tower trace is enabled for multi-tower model"""
+        if enable_profile == True and self.num_towers > 1 and self.hyperparams.device_enable_tower_trace == True:
+            run_options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+            run_metadata = tf.RunMetadata()
+            (_, loss, learning_rate, global_step, batch_size, summary,
+                tower_batch_size) = sess.run([self.update_op, self.train_loss, self.decayed_learning_rate,
+                    self.global_step, self.batch_size, self.train_summary, self.tower_batch_size],
+                    options=run_options, run_metadata=run_metadata)
+            tower_time = self._get_tower_time(run_metadata)
         else:
             _, loss, learning_rate, global_step, batch_size, summary = sess.run([self.update_op,
                 self.train_loss, self.decayed_learning_rate, self.global_step, self.batch_size, self.train_summary])
+            tower_batch_size = None
+            tower_time = None
         
-        return TrainResult(loss=loss, learning_rate=learning_rate,
-            global_step=global_step, batch_size=batch_size, summary=summary)
+        return TrainResult(loss=loss, learning_rate=learning_rate, global_step=global_step,
+            batch_size=batch_size, summary=summary, tower_batch_size=tower_batch_size, tower_time=tower_time)
+    
+    def _decode_answer_span(self,
+                            answer_start,
+                            answer_start_mask,
+                            answer_end,
+                            answer_end_mask,
+                            nbest_size):
+        """decode top-k answer spans in graph with banded span score"""
+        max_context_length = self.hyperparams.data_max_context_length
+        max_answer_length = self.hyperparams.data_max_answer_length
+        
+        with tf.variable_scope("decode", reuse=tf.AUTO_REUSE):
+            answer_start = (answer_start * answer_start_mask)[:,:max_context_length]
+            answer_end = (answer_end * answer_end_mask)[:,:max_context_length]
+            answer_end = tf.pad(answer_end, [[0, 0], [0, max_answer_length-1]])
+            answer_start_mask = answer_start_mask[:,:max_context_length]
+            answer_end_mask = tf.pad(answer_end_mask[:,:max_context_length], [[0, 0], [0, max_answer_length-1]])
+            
+            """span score for start i and end i+k is kept in a [batch, context, answer] band"""
+            batch_size = tf.shape(answer_start)[0]
+            context_length = tf.shape(answer_start)[1]
+            band_index = tf.expand_dims(tf.range(context_length), axis=-1) + tf.expand_dims(tf.range(max_answer_length), axis=0)
+            band_mask = tf.cast(tf.less(band_index, context_length), dtype=tf.float32)
+            answer_span = tf.expand_dims(answer_start, axis=-1) * tf.gather(answer_end, band_index, axis=1)
+            answer_span = generate_masked_data(answer_span, band_mask)
+            answer_span = tf.reshape(answer_span, shape=[batch_size, context_length * max_answer_length])
+            
+            """spans out of band or with masked start/end are invalid"""
+            answer_span_mask = (tf.expand_dims(answer_start_mask, axis=-1) *
+                tf.gather(answer_end_mask, band_index, axis=1) * band_mask)
+            answer_span_mask = tf.reshape(answer_span_mask, shape=[-1])
+            
+            """top-k keeps the lower index first on ties, which matches the original loop for the best span"""
+            topk_size = tf.minimum(nbest_size, context_length * max_answer_length)
+            answer_nbest_score, span_index = tf.nn.top_k(answer_span, k=topk_size, sorted=True)
+            span_offset = tf.expand_dims(tf.range(batch_size) * context_length * max_answer_length, axis=-1)
+            span_valid = tf.greater(tf.gather(answer_span_mask, span_index + span_offset), 0.0)
+            span_start = tf.floordiv(span_index, max_answer_length)
+            span_end = span_start + tf.floormod(span_index, max_answer_length)
+            span_start = tf.where(span_valid, span_start, -tf.ones_like(span_start))
+            span_end = tf.where(span_valid, span_end, -tf.ones_like(span_end))
+            answer_nbest = tf.stack([span_start, span_end], axis=-1)
+            answer_nbest_score = tf.where(span_valid, answer_nbest_score,
+                tf.fill(tf.shape(answer_nbest_score), float('-inf')))
+            
+            """top-k is padded to [batch, nbest] with invalid spans, which matches decode_span_nbest"""
+            pad_size = nbest_size - topk_size
+            answer_nbest = tf.pad(answer_nbest, [[0, 0], [0, pad_size], [0, 0]], constant_values=-1)
+            answer_nbest_score = tf.pad(answer_nbest_score, [[0, 0], [0, pad_size]], constant_values=float('-inf'))
+        
+        return answer_nbest, answer_nbest_score
     
     def infer(self,
-              sess,
-              word_embedding):
+              sess):
         """infer model"""
-        feed_word_embed = (self.hyperparams.model_representation_word_embed_pretrained and
-            word_embedding is not None and self.word_embedding_placeholder is not None)
-        
-        if feed_word_embed == True:
-            (answer_start, answer_end, answer_start_mask, answer_end_mask,
-                batch_size, summary) = sess.run([self.infer_answer_start, self.infer_answer_end,
-                    self.infer_answer_start_mask, self.infer_answer_end_mask, self.batch_size, self.infer_summary],
-                    feed_dict={self.word_embedding_placeholder: word_embedding})
-        else:
-            (answer_start, answer_end, answer_start_mask, answer_end_mask,
-                batch_size, summary) = sess.run([self.infer_answer_start, self.infer_answer_end,
-                    self.infer_answer_start_mask, self.infer_answer_end_mask, self.batch_size, self.infer_summary])
+        nbest_size = self.hyperparams.model_infer_nbest_size
+        if self.infer_answer_nbest is not None:
+            (predict_nbest, predict_nbest_score, batch_size, summary) = sess.run([self.infer_answer_nbest,
+                self.infer_answer_nbest_score, self.batch_size, self.infer_summary])
+            
+            predict = predict_nbest[:,0,:]
+            predict_score = predict_nbest_score[:,0]
+            if nbest_size <= 1:
+                predict_nbest = None
+                predict_nbest_score = None
+            
+            return InferResult(predict=predict, predict_score=predict_score, predict_nbest=predict_nbest,
+                predict_nbest_score=predict_nbest_score, predict_detail=None, batch_size=batch_size, summary=summary)
+        
+        (answer_start, answer_end, answer_start_mask, answer_end_mask,
+            batch_size, summary) = sess.run([self.infer_answer_start, self.infer_answer_end,
+                self.infer_answer_start_mask, self.infer_answer_end_mask, self.batch_size, self.infer_summary])
         
         max_context_length = self.hyperparams.data_max_context_length
         max_answer_length = self.hyperparams.data_max_answer_length
         
-        predict_start = np.expand_dims(answer_start[:max_context_length], axis=-1)
-        predict_start_mask = np.expand_dims(answer_start_mask[:max_context_length], axis=-1)
-        predict_start_start = predict_start * predict_start_mask
-        predict_end = np.expand_dims(answer_end[:max_context_length], axis=-1)
-        predict_end_mask = np.expand_dims(answer_end_mask[:max_context_length], axis=-1)
-        predict_end = predict_end * predict_end_mask
-        
-        predict_span = np.matmul(predict_start, predict_end.transpose((0,2,1)))
-        predict_span_mask = np.matmul(predict_start_mask, predict_end_mask.transpose((0,2,1)))
-        predict_span = predict_span * predict_span_mask
-        
-        predict = np.full((batch_size, 2), -1)
-        for k in range(batch_size):
-            max_prob = float('-inf')
-            max_prob_start = -1
-            max_prob_end = -1
-            for i in range(max_context_length):
-                for j in range(i, min(max_context_length, i+max_answer_length)):
-                    if predict_span[k, i, j] > max_prob:
-                        max_prob = predict_span[k, i, j]
-                        max_prob_start = i
-                        max_prob_end = j
-            
-            predict[k, 0] = max_prob_start
-            predict[k, 1] = max_prob_end
+        if nbest_size > 1:
+            predict_nbest, predict_nbest_score = decode_span_nbest(answer_start, answer_start_mask,
+                answer_end, answer_end_mask, max_context_length, max_answer_length, nbest_size)
+            predict = predict_nbest[:,0,:]
+            predict_score = predict_nbest_score[:,0]
+        else:
+            predict_nbest = None
+            predict_nbest_score = None
+            predict, predict_score = decode_span(answer_start, answer_start_mask,
+                answer_end, answer_end_mask, max_context_length, max_answer_length)
         
+        predict_start = np.expand_dims(answer_start, axis=-1)
+        predict_end = np.expand_dims(answer_end * answer_end_mask, axis=-1)
         predict_detail = np.concatenate((predict_start, predict_end), axis=-1)
         
-        return InferResult(predict=predict, predict_detail=predict_detail, batch_size=batch_size, summary=summary)
+        return InferResult(predict=predict, predict_score=predict_score, predict_nbest=predict_nbest,
+            predict_nbest_score=predict_nbest_score, predict_detail=predict_detail, batch_size=batch_size, summary=summary)
+    
+    def get_variable_dict(self):
+        """get checkpoint name to variable map of model variable list"""
+        if isinstance(self.variable_list, dict):
+            return self.variable_list
+        
+        return { variable.op.name: variable for variable in self.variable_list }
+    
+    def _build_variable_assign_op(self):
+        """build placeholders and assign ops for assigning model variables from host memory by checkpoint name"""
+        self.variable_assign_placeholder = {}
+        variable_assign_list = []
+        with tf.name_scope("variable_assign"):
+            for variable_name, variable in self.get_variable_dict().items():
+                variable_placeholder = tf.placeholder(shape=variable.get_shape(), dtype=variable.dtype.base_dtype)
+                self.variable_assign_placeholder[variable_name] = variable_placeholder
+                variable_assign_list.append(variable.assign(variable_placeholder))
+        
+        self.variable_assign_op = tf.group(*variable_assign_list)
+    
+    def assign_variable(self,
+                        sess,
+                        variable_value_dict):
+        """assign model variables from host memory by checkpoint name, assign ops are built with infer model"""
+        if self.variable_assign_op is None:
+            raise ValueError("variable assign op is not built, weight share is disabled")
+        
+        feed_dict = { self.variable_assign_placeholder[variable_name]: variable_value
+            for variable_name, variable_value in variable_value_dict.items() }
+        sess.run(self.variable_assign_op, feed_dict=feed_dict)
+    
+    def get_last_ckpt(self,
+                      ckpt_type):
+        """get checkpoint last saved by this model, its write may still be pending in background"""
+        if ckpt_type == "debug":
+            return self.ckpt_debug_writer.get_last_ckpt()
+        elif ckpt_type == "epoch":
+            return self.ckpt_epoch_writer.get_last_ckpt()
+        else:
+            raise ValueError("unsupported checkpoint type {0}".format(ckpt_type))
+    
+    def wait_ckpt(self,
+                  ckpt_file):
+        """wait for pending write of given checkpoint only, later writes keep running in background"""
+        for ckpt_writer in [self.ckpt_debug_writer, self.ckpt_epoch_writer]:
+            if ckpt_writer is not None:
+                ckpt_writer.wait_writer(ckpt_file)
+    
+    def flush_ckpt(self):
+        """wait for pending checkpoint writes"""
+        for ckpt_writer in [self.ckpt_debug_writer, self.ckpt_epoch_writer]:
+            if ckpt_writer is not None:
+                ckpt_writer.flush_writer()
+    
+    def close_ckpt(self):
+        """wait for pending checkpoint writes and close checkpoint writers, first write failure is re-raised after all are closed"""
+        write_error = None
+        for ckpt_writer in [self.ckpt_debug_writer, self.ckpt_epoch_writer]:
+            if ckpt_writer is not None:
+                try:
+                    ckpt_writer.close_writer()
+                except Exception as e:
+                    if write_error is None:
+                        write_error = e
+        
+        if write_error is not None:
+            raise write_error
     
     def _get_train_summary(self):
         """get train summary"""
@@ -7,6 +7,7 @@ import tensorflow as tf
 from util.default_util import *
 from util.reading_comprehension_util import *
 from util.layer_util import *
+from util.checkpoint_writer import *
 
 from model.base_model import *
 
@@ -45,12 +46,18 @@ class BiDAF(BaseModel):
             answer_result = tf.squeeze(self.data_pipeline.input_answer, axis=-1)
             answer_result_mask = tf.squeeze(self.data_pipeline.input_answer_mask, axis=-1)
             
-            """build graph for bidaf model"""
+            """build graph for bidaf model, batch is split across towers for data-parallel training"""
             self.logger.log_print("# build graph")
+            tower_input_list = self._split_tower_input([question_word, question_word_mask,
+                question_subword, question_subword_mask, question_char, question_char_mask,
+                context_word, context_word_mask, context_subword, context_subword_mask, context_char, context_char_mask])
+            tower_output_list = []
+            for tower_id, tower_input in enumerate(tower_input_list):
+                with self._tower_scope(tower_id):
+                    tower_output_list.append(self._build_graph(*tower_input))
+            
             (answer_start_output, answer_end_output, answer_start_output_mask,
-                answer_end_output_mask) = self._build_graph(question_word, question_word_mask,
-                    question_subword, question_subword_mask, question_char, question_char_mask,
-                    context_word, context_word_mask, context_subword, context_subword_mask, context_char, context_char_mask)
+                answer_end_output_mask) = self._merge_tower_output(tower_output_list)
             answer_start_output_mask = tf.squeeze(answer_start_output_mask, axis=-1)
             answer_end_output_mask = tf.squeeze(answer_end_output_mask, axis=-1)
             answer_start_output = tf.squeeze(answer_start_output, axis=-1)
@@ -73,6 +80,13 @@ class BiDAF(BaseModel):
                 self.infer_answer_start = self.answer_start
                 self.infer_answer_end = self.answer_end
                 
+                if self.hyperparams.model_infer_decode_in_graph == True:
+                    """decode infer answer span in graph"""
+                    self.infer_answer_nbest, self.infer_answer_nbest_score = self._decode_answer_span(self.answer_start,
+                        self.answer_start_mask, self.answer_end, self.answer_end_mask, self.hyperparams.model_infer_nbest_size)
+                    self.infer_answer_span = self.infer_answer_nbest[:,0,:]
+                    self.infer_answer_span_score = self.infer_answer_nbest_score[:,0]
+                
                 """create infer summary"""
                 self.infer_summary = self._get_infer_summary()
             
@@ -150,10 +164,19 @@ class BiDAF(BaseModel):
             if self.mode == "infer":
                 self.ckpt_debug_saver = tf.train.Saver(self.variable_list)
                 self.ckpt_epoch_saver = tf.train.Saver(self.variable_list, max_to_keep=self.hyperparams.train_num_epoch)  
+                self.ckpt_debug_writer = CheckpointWriter(self.logger, self.ckpt_debug_saver, self.variable_list)
+                self.ckpt_epoch_writer = CheckpointWriter(self.logger, self.ckpt_epoch_saver, self.variable_list)
+                
+                if self.hyperparams.train_eval_enable_weight_share == True:
+                    self._build_variable_assign_op()
             
             if self.mode == "train":
                 self.ckpt_debug_saver = tf.train.Saver()
                 self.ckpt_epoch_saver = tf.train.Saver(max_to_keep=self.hyperparams.train_num_epoch) 
+                self.ckpt_debug_writer = CheckpointWriter(self.logger, self.ckpt_debug_saver,
+                    tf.global_variables(), self.hyperparams.train_ckpt_enable_async)
+                self.ckpt_epoch_writer = CheckpointWriter(self.logger, self.ckpt_epoch_saver,
+                    tf.global_variables(), self.hyperparams.train_ckpt_enable_async)
     
     def _build_representation_layer(self,
                                     input_question_word,
@@ -208,7 +231,7 @@ class BiDAF(BaseModel):
             if word_feat_enable == True:
                 self.logger.log_print("# build word-level representation layer")
                 word_feat_layer = WordFeat(vocab_size=word_vocab_size, embed_dim=word_embed_dim, pretrained=word_embed_pretrained,
-                    embedding=self.word_embedding, num_gpus=self.num_gpus, default_gpu_id=self.default_gpu_id,
+                    num_gpus=self.num_gpus, default_gpu_id=self.default_gpu_id,
                     regularizer=self.regularizer, random_seed=self.random_seed, trainable=word_feat_trainable)
                 
                 (input_question_word_feat,
@@ -223,9 +246,11 @@ class BiDAF(BaseModel):
                 
                 word_unit_dim = word_embed_dim
                 self.word_embedding_placeholder = word_feat_layer.get_embedding_placeholder()
+                self.word_embedding_initializer = word_feat_layer.get_embedding_initializer()
             else:
                 word_unit_dim = 0
                 self.word_embedding_placeholder = None
+                self.word_embedding_initializer = None
             
             if subword_feat_enable == True:
                 self.logger.log_print("# build subword-level representation layer")
@@ -636,9 +661,9 @@ class BiDAF(BaseModel):
              save_mode):
         """save checkpoint for bidaf model"""
         if save_mode == "debug":
-            self.ckpt_debug_saver.save(sess, self.ckpt_debug_name, global_step=global_step)
+            self.ckpt_debug_writer.save(sess, self.ckpt_debug_name, global_step)
         elif save_mode == "epoch":
-            self.ckpt_epoch_saver.save(sess, self.ckpt_epoch_name, global_step=global_step)
+            self.ckpt_epoch_writer.save(sess, self.ckpt_epoch_name, global_step)
         else:
             raise ValueError("unsupported save mode {0}".format(save_mode))
     
@@ -699,7 +724,6 @@ class WordFeat(object):
                  vocab_size,
                  embed_dim,
                  pretrained,
-                 embedding=None,
                  num_gpus=1,
                  default_gpu_id=0,
                  regularizer=None,
@@ -710,7 +734,6 @@ class WordFeat(object):
         self.vocab_size = vocab_size
         self.embed_dim = embed_dim
         self.pretrained = pretrained
-        self.embedding = embedding
         self.num_gpus = num_gpus
         self.default_gpu_id = default_gpu_id
         self.regularizer = regularizer
@@ -720,7 +743,7 @@ class WordFeat(object):
         
         with tf.variable_scope(self.scope, reuse=tf.AUTO_REUSE):
             self.embedding_layer = create_embedding_layer(self.vocab_size, self.embed_dim, self.pretrained,
-                self.embedding, self.num_gpus, self.default_gpu_id, None, self.random_seed, self.trainable)
+                self.num_gpus, self.default_gpu_id, None, self.random_seed, self.trainable)
     
     def __call__(self,
                  input_word,
@@ -735,6 +758,10 @@ class WordFeat(object):
     def get_embedding_placeholder(self):
         """get word-level embedding placeholder"""
         return self.embedding_layer.get_embedding_placeholder()
+    
+    def get_embedding_initializer(self):
+        """get word-level embedding initializer"""
+        return self.embedding_layer.get_embedding_initializer()
 
 class SubwordFeat(object):
     """subword-level featurization layer"""
@@ -1,5 +1,7 @@
 import argparse
 import os.path
+import queue
+import threading
 import time
 
 import numpy as np
@@ -25,17 +27,24 @@ def sample_predict(sess,
                    batch_size,
                    ckpt_file,
                    eval_mode):
-    load_model(sess, model, ckpt_file, eval_mode)
+    """variables already assigned in session are used when no checkpoint file is given"""
+    if ckpt_file is not None:
+        load_model(sess, model, ckpt_file, eval_mode)
     
     data_size = len(model.input_data)
     feed_dict, data_dict = generate_feed_dict(model, data_size, batch_size)
     sess.run(model.data_pipeline.initializer, feed_dict=feed_dict)
     
     predict_span = []
+    predict_nbest = []
+    predict_nbest_score = []
     while True:
         try:
-            infer_result = model.model.infer(sess, model.word_embedding)
+            infer_result = model.model.infer(sess)
             predict_span.extend(infer_result.predict)
+            if infer_result.predict_nbest is not None:
+                predict_nbest.extend(infer_result.predict_nbest)
+                predict_nbest_score.extend(infer_result.predict_nbest_score)
         except  tf.errors.OutOfRangeError:
             break
     
@@ -64,6 +73,21 @@ def sample_predict(sess,
             "answers": []
         })
         
+        if len(predict_nbest) > 0:
+            sample_result[-1]["nbest"] = []
+            for nbest_span, nbest_score in zip(predict_nbest[i], predict_nbest_score[i]):
+                nbest_start = int(nbest_span[0])
+                nbest_end = int(nbest_span[1])
+                if nbest_start < 0 or nbest_end < 0:
+                    continue
+                
+                sample_result[-1]["nbest"].append({
+                    "text": " ".join(context_tokens[nbest_start:nbest_end+1]),
+                    "start": nbest_start,
+                    "end": nbest_end,
+                    "score": float(nbest_score)
+                })
+        
         for answer in data_dict["input_data"][i]["answers"]:
             label_start = int(answer["start"])
             label_end = int(answer["end"])
@@ -104,6 +128,8 @@ def extrinsic_eval(logger,
     
     if detail_type == "simplified":
         sample_output = { sample["id"]: sample["predict"]["text"] for sample in sample_output }
+    elif detail_type == "nbest":
+        sample_output = { sample["id"]: sample["nbest"] if "nbest" in sample else [sample["predict"]] for sample in sample_output }
     
     eval_result_detail = ExtrinsicEvalLog(metric="detail",
         score=0.0, sample_output=sample_output, sample_size=len(sample_output))
@@ -155,9 +181,13 @@ def generate_feed_dict(model,
     input_question_char = model.input_question_char[:data_size] if model.input_question_char is not None else None
     
     input_context = model.input_context[:data_size]
-    input_context_word = model.input_context_word[:data_size] if model.input_context_word is not None else None
-    input_context_subword = model.input_context_subword[:data_size] if model.input_context_subword is not None else None
-    input_context_char = model.input_context_char[:data_size] if model.input_context_char is not None else None
+    input_context_index = model.input_context_index[:data_size] if model.input_context_index is not None else None
+    
+    """context features are stored per unique context when context index is given, so they are fed as a whole"""
+    context_data_size = data_size if model.input_context_index is None else None
+    input_context_word = model.input_context_word[:context_data_size] if model.input_context_word is not None else None
+    input_context_subword = model.input_context_subword[:context_data_size] if model.input_context_subword is not None else None
+    input_context_char = model.input_context_char[:context_data_size] if model.input_context_char is not None else None
     
     data_dict = {
         "data_size": data_size,
@@ -170,36 +200,104 @@ def generate_feed_dict(model,
         "input_context": input_context,
         "input_context_word": input_context_word,
         "input_context_subword": input_context_subword,
-        "input_context_char": input_context_char
+        "input_context_char": input_context_char,
+        "input_context_index": input_context_index
     }
     
+    """input data is kept in data store of model since initialization, only data/batch size are fed per initialization"""
     feed_dict = {
         model.data_pipeline.data_size_placeholder: data_size,
         model.data_pipeline.batch_size_placeholder: batch_size
     }
+    
+    return feed_dict, data_dict
+
+def async_eval(logger,
+               eval_logger,
+               summary_writer,
+               sess,
+               model,
+               train_model,
+               hyperparams,
+               eval_queue,
+               eval_error_list):
+    """evaluate checkpoints taken from queue in background until stop signal is received, failures are recorded for main thread"""
+    while True:
+        eval_item = eval_queue.get()
+        if eval_item is None:
+            break
+        
+        ckpt_file, variable_value_dict, eval_mode, global_step, epoch = eval_item
+        if ckpt_file is not None:
+            """background write of checkpoint under evaluation is waited for here, so that training is not blocked"""
+            train_model.model.wait_ckpt(ckpt_file)
+        
+        if variable_value_dict is None and (ckpt_file is None or not tf.train.checkpoint_exists(ckpt_file)):
+            logger.log_print("# skip evaluation of removed checkpoint {0} at step {1}".format(ckpt_file, global_step))
+            continue
+        
+        try:
+            start_time = time.time()
+            if variable_value_dict is not None:
+                assign_model_variable(sess, model, variable_value_dict)
+            
+            sample_result = sample_predict(sess, model, hyperparams.train_eval_batch_size, ckpt_file, eval_mode)
+            extrinsic_eval(eval_logger, summary_writer, sample_result,
+                hyperparams.train_eval_metric, hyperparams.train_eval_detail_type, global_step, epoch)
+            decoding_eval(eval_logger, sample_result, hyperparams.train_decoding_sample_size, 
+                hyperparams.train_random_seed + global_step, global_step, epoch)
+            logger.log_print("# async evaluation at step {0} took {1:.2f} sec".format(global_step, time.time() - start_time))
+        except tf.errors.NotFoundError as e:
+            if variable_value_dict is None and not tf.train.checkpoint_exists(ckpt_file):
+                logger.log_print("# skip evaluation of removed checkpoint {0} at step {1}".format(ckpt_file, global_step))
+            else:
+                logger.log_print("# async evaluation at step {0} failed: {1}".format(global_step, e))
+                eval_error_list.append(e)
+        except Exception as e:
+            logger.log_print("# async evaluation at step {0} failed: {1}".format(global_step, e))
+            eval_error_list.append(e)
 
-    if model.data_pipeline.input_answer_placeholder is not None and input_answer is not None:
-        feed_dict[model.data_pipeline.input_answer_placeholder] = input_answer
+def check_async_eval(eval_error_list):
+    """re-raise first async evaluation failure on main thread"""
+    if len(eval_error_list) > 0:
+        raise eval_error_list[0]
 
-    if model.data_pipeline.input_question_placeholder is not None and input_question is not None:
-        feed_dict[model.data_pipeline.input_question_placeholder] = input_question
-    if model.data_pipeline.input_question_word_placeholder is not None and input_question_word is not None:
-        feed_dict[model.data_pipeline.input_question_word_placeholder] = input_question_word
-    if model.data_pipeline.input_question_subword_placeholder is not None and input_question_subword is not None:
-        feed_dict[model.data_pipeline.input_question_subword_placeholder] = input_question_subword
-    if model.data_pipeline.input_question_char_placeholder is not None and input_question_char is not None:
-        feed_dict[model.data_pipeline.input_question_char_placeholder] = input_question_char
-    
-    if model.data_pipeline.input_context_placeholder is not None and input_context is not None:
-        feed_dict[model.data_pipeline.input_context_placeholder] = input_context
-    if model.data_pipeline.input_context_word_placeholder is not None and input_context_word is not None:
-        feed_dict[model.data_pipeline.input_context_word_placeholder] = input_context_word
-    if model.data_pipeline.input_context_subword_placeholder is not None and input_context_subword is not None:
-        feed_dict[model.data_pipeline.input_context_subword_placeholder] = input_context_subword
-    if model.data_pipeline.input_context_char_placeholder is not None and input_context_char is not None:
-        feed_dict[model.data_pipeline.input_context_char_placeholder] = input_context_char
+def submit_async_eval(logger,
+                      eval_queue,
+                      eval_error_list,
+                      eval_item):
+    """submit checkpoint or variables to async evaluation, oldest pending evaluation is skipped when queue is full"""
+    check_async_eval(eval_error_list)
+    while True:
+        try:
+            eval_queue.put_nowait(eval_item)
+            break
+        except queue.Full:
+            try:
+                stale_item = eval_queue.get_nowait()
+                logger.log_print("# skip stale evaluation at step {0}".format(stale_item[3]))
+            except queue.Empty:
+                pass
+
+def get_eval_source(train_sess,
+                    train_model,
+                    infer_model,
+                    hyperparams,
+                    eval_mode):
+    """get latest checkpoint or in-memory copy of train variables for evaluation"""
+    if hyperparams.train_eval_enable_weight_share == True:
+        variable_name_list = list(infer_model.model.get_variable_dict().keys())
+        variable_value_dict = fetch_model_variable(train_sess, train_model, variable_name_list)
+        return None, variable_value_dict
     
-    return feed_dict, data_dict
+    """checkpoint last saved in this run is evaluated, only its own pending write is waited for"""
+    ckpt_file = train_model.model.get_last_ckpt(eval_mode)
+    if ckpt_file is None:
+        ckpt_file = infer_model.model.get_latest_ckpt(eval_mode)
+    elif hyperparams.train_eval_enable_async == False:
+        train_model.model.wait_ckpt(ckpt_file)
+    
+    return ckpt_file, None
 
 def train(logger,
           hyperparams,
@@ -207,7 +305,8 @@ def train(logger,
           enable_debug=False):
     config_proto = get_config_proto(hyperparams.device_log_device_placement,
         hyperparams.device_allow_soft_placement, hyperparams.device_allow_growth,
-        hyperparams.device_per_process_gpu_memory_fraction)
+        hyperparams.device_per_process_gpu_memory_fraction, hyperparams.device_intra_op_parallelism_threads,
+        hyperparams.device_inter_op_parallelism_threads)
     
     summary_output_dir = hyperparams.train_summary_output_dir
     if not tf.gfile.Exists(summary_output_dir):
@@ -225,7 +324,7 @@ def train(logger,
     
     if enable_eval == True:
         logger.log_print("##### create infer model #####")
-        infer_model = create_infer_model(logger, hyperparams)
+        infer_model = create_infer_model(logger, hyperparams, train_model.feature_cache)
         infer_sess = tf.Session(config=config_proto, graph=infer_model.graph)
         if enable_debug == True:
             infer_sess = tf_debug.LocalCLIDebugWrapperSession(infer_sess)
@@ -233,6 +332,15 @@ def train(logger,
         infer_summary_writer = SummaryWriter(infer_model.graph, os.path.join(summary_output_dir, "infer"))
         init_model(infer_sess, infer_model)
         eval_logger = EvalLogger(hyperparams.data_log_output_dir)
+        
+        if hyperparams.train_eval_enable_async == True:
+            """checkpoints are evaluated in background thread with its own infer session, training is not blocked"""
+            eval_queue = queue.Queue(maxsize=max(hyperparams.train_eval_async_queue_size, 1))
+            eval_error_list = []
+            eval_thread = threading.Thread(target=async_eval, args=(logger, eval_logger,
+                infer_summary_writer, infer_sess, infer_model, train_model, hyperparams, eval_queue, eval_error_list))
+            eval_thread.daemon = True
+            eval_thread.start()
     
     logger.log_print("##### start training #####")
     global_step = 0
@@ -241,43 +349,79 @@ def train(logger,
         train_sess.run(train_model.data_pipeline.initializer, feed_dict=feed_dict)
         
         step_in_epoch = 0
+        train_start_time = time.time()
+        train_sample_size = 0
         while True:
             try:
                 start_time = time.time()
-                train_result = train_model.model.train(train_sess, train_model.word_embedding)
+                enable_profile = (step_in_epoch + 1) % hyperparams.train_step_per_stat == 0
+                train_result = train_model.model.train(train_sess, enable_profile)
                 end_time = time.time()
                 
                 global_step = train_result.global_step
                 step_in_epoch += 1
+                train_sample_size += train_result.batch_size
                 train_logger.update(train_result, epoch, step_in_epoch, end_time-start_time)
                 
                 if step_in_epoch % hyperparams.train_step_per_stat == 0:
                     train_logger.check()
                     train_summary_writer.add_summary(train_result.summary, global_step)
+                    train_time = time.time() - train_start_time
+                    logger.log_print("# train throughput={0:.2f} examples/sec over {1} examples, including input pipeline and train step".format(
+                        train_sample_size / max(train_time, EPSILON), train_sample_size))
+                    train_start_time = time.time()
+                    train_sample_size = 0
+                    if train_result.tower_time is not None:
+                        logger.log_print("# tower batch size={0}, tower step time=[{1}] sec".format(
+                            train_result.tower_batch_size.tolist(), ", ".join(["{0:.3f}".format(tower_time)
+                                for tower_time in train_result.tower_time])))
                 if step_in_epoch % hyperparams.train_step_per_ckpt == 0:
                     train_model.model.save(train_sess, global_step, "debug")
                 if step_in_epoch % hyperparams.train_step_per_eval == 0 and enable_eval == True:
-                    ckpt_file = infer_model.model.get_latest_ckpt("debug")
-                    sample_result = sample_predict(infer_sess, infer_model, hyperparams.train_eval_batch_size, ckpt_file, "debug")
-                    extrinsic_eval(eval_logger, infer_summary_writer, sample_result,
-                        hyperparams.train_eval_metric, hyperparams.train_eval_detail_type, global_step, epoch)
-                    decoding_eval(eval_logger, sample_result, hyperparams.train_decoding_sample_size, 
-                        hyperparams.train_random_seed + global_step, global_step, epoch)
+                    ckpt_file, variable_value_dict = get_eval_source(train_sess,
+                        train_model, infer_model, hyperparams, "debug")
+                    if hyperparams.train_eval_enable_async == True:
+                        submit_async_eval(logger, eval_queue, eval_error_list,
+                            (ckpt_file, variable_value_dict, "debug", global_step, epoch))
+                    else:
+                        if variable_value_dict is not None:
+                            assign_model_variable(infer_sess, infer_model, variable_value_dict)
+                        
+                        sample_result = sample_predict(infer_sess, infer_model, hyperparams.train_eval_batch_size, ckpt_file, "debug")
+                        extrinsic_eval(eval_logger, infer_summary_writer, sample_result,
+                            hyperparams.train_eval_metric, hyperparams.train_eval_detail_type, global_step, epoch)
+                        decoding_eval(eval_logger, sample_result, hyperparams.train_decoding_sample_size, 
+                            hyperparams.train_random_seed + global_step, global_step, epoch)
             except tf.errors.OutOfRangeError:
                 train_logger.check()
                 train_summary_writer.add_summary(train_result.summary, global_step)
                 train_model.model.save(train_sess, global_step, "epoch")
                 if enable_eval == True:
-                    ckpt_file = infer_model.model.get_latest_ckpt("epoch")
-                    sample_result = sample_predict(infer_sess, infer_model, hyperparams.train_eval_batch_size, ckpt_file, "epoch")
-                    extrinsic_eval(eval_logger, infer_summary_writer, sample_result,
-                        hyperparams.train_eval_metric, hyperparams.train_eval_detail_type, global_step, epoch)
-                    decoding_eval(eval_logger, sample_result, hyperparams.train_decoding_sample_size, 
-                        hyperparams.train_random_seed + global_step, global_step, epoch)
+                    ckpt_file, variable_value_dict = get_eval_source(train_sess,
+                        train_model, infer_model, hyperparams, "epoch")
+                    if hyperparams.train_eval_enable_async == True:
+                        submit_async_eval(logger, eval_queue, eval_error_list,
+                            (ckpt_file, variable_value_dict, "epoch", global_step, epoch))
+                    else:
+                        if variable_value_dict is not None:
+                            assign_model_variable(infer_sess, infer_model, variable_value_dict)
+                        
+                        sample_result = sample_predict(infer_sess, infer_model, hyperparams.train_eval_batch_size, ckpt_file, "epoch")
+                        extrinsic_eval(eval_logger, infer_summary_writer, sample_result,
+                            hyperparams.train_eval_metric, hyperparams.train_eval_detail_type, global_step, epoch)
+                        decoding_eval(eval_logger, sample_result, hyperparams.train_decoding_sample_size, 
+                            hyperparams.train_random_seed + global_step, global_step, epoch)
                 break
 
+    train_model.model.close_ckpt()
     train_summary_writer.close_writer()
     if enable_eval == True:
+        if hyperparams.train_eval_enable_async == True:
+            logger.log_print("# wait for pending async evaluation")
+            eval_queue.put(None)
+            eval_thread.join()
+            check_async_eval(eval_error_list)
+        
         infer_summary_writer.close_writer()
     
     logger.log_print("##### finish training #####")
@@ -287,7 +431,8 @@ def evaluate(logger,
              enable_debug=False):   
     config_proto = get_config_proto(hyperparams.device_log_device_placement,
         hyperparams.device_allow_soft_placement, hyperparams.device_allow_growth,
-        hyperparams.device_per_process_gpu_memory_fraction)
+        hyperparams.device_per_process_gpu_memory_fraction, hyperparams.device_intra_op_parallelism_threads,
+        hyperparams.device_inter_op_parallelism_threads)
     
     summary_output_dir = hyperparams.train_summary_output_dir
     if not tf.gfile.Exists(summary_output_dir):
@@ -1,2 +1,3 @@
 __all__ = ["debug_logger", "train_logger", "eval_logger.py", "summary_writer", "result_writer",
-           "default_util", "param_util", "data_util", "model_util", "eval_util", "layer_util", "reading_comprehension_util"]
\ No newline at end of file
+           "default_util", "param_util", "data_util", "model_util", "eval_util", "layer_util", "reading_comprehension_util",
+           "decode_util", "benchmark_util", "feature_util"]
\ No newline at end of file
@@ -0,0 +1,405 @@
+import itertools
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from util.decode_util import *
+from util.data_util import *
+from util.data_util import _generate_vocab_subword
+
+__all__ = ["benchmark_span_decode", "benchmark_subword_feat", "benchmark_char_feat", "benchmark_vocab"]
+
+def _generate_span_distribution(batch_size,
+                                context_length,
+                                random_seed):
+    """generate random start/end distribution and mask for span decoding benchmark"""
+    np.random.seed(random_seed)
+    answer_start = np.random.rand(batch_size, context_length).astype(np.float32)
+    answer_end = np.random.rand(batch_size, context_length).astype(np.float32)
+    
+    valid_length = np.random.randint(1, context_length+1, size=(batch_size, 1))
+    answer_mask = (np.arange(context_length)[np.newaxis,:] < valid_length).astype(np.float32)
+    answer_start = answer_start * answer_mask / np.sum(answer_start * answer_mask, axis=-1, keepdims=True)
+    answer_end = answer_end * answer_mask / np.sum(answer_end * answer_mask, axis=-1, keepdims=True)
+    
+    return answer_start, answer_mask, answer_end, answer_mask
+
+def _time_function(function,
+                   num_iter,
+                   *args):
+    """time function call and return average seconds per call with last output"""
+    start_time = time.time()
+    for _ in range(num_iter):
+        output = function(*args)
+    end_time = time.time()
+    
+    return (end_time - start_time) / num_iter, output
+
+def _check_span_nbest(answer_start,
+                      answer_start_mask,
+                      answer_end,
+                      answer_end_mask,
+                      context_length,
+                      max_answer_length,
+                      nbest_size):
+    """check top-1 of nbest span decoding matches best span decoding, best span with masked start/end is invalid in nbest"""
+    predict, predict_score = decode_span(answer_start, answer_start_mask,
+        answer_end, answer_end_mask, context_length, max_answer_length)
+    batch_index = np.arange(answer_start.shape[0])
+    predict_valid = ((answer_start_mask[batch_index,predict[:,0]] > 0) &
+        (answer_end_mask[batch_index,predict[:,1]] > 0))
+    predict = np.where(predict_valid[:,np.newaxis], predict, -1)
+    predict_score = np.where(predict_valid, predict_score, float('-inf'))
+    predict_nbest, predict_nbest_score = decode_span_nbest(answer_start, answer_start_mask,
+        answer_end, answer_end_mask, context_length, max_answer_length, nbest_size)
+    
+    return (predict_nbest.shape[:2] == (answer_start.shape[0], nbest_size) and
+        bool(np.array_equal(predict_nbest[:,0,:], predict)) and
+        bool(np.array_equal(predict_nbest_score[:,0], predict_score)))
+
+def _decode_span_loop(answer_start,
+                      answer_start_mask,
+                      answer_end,
+                      answer_end_mask,
+                      max_context_length,
+                      max_answer_length):
+    """decode best answer span with python loop, reference for decode_span"""
+    batch_size = answer_start.shape[0]
+    
+    predict_start = np.expand_dims(answer_start, axis=-1)
+    predict_start_mask = np.expand_dims(answer_start_mask, axis=-1)
+    predict_end = np.expand_dims(answer_end, axis=-1) * np.expand_dims(answer_end_mask, axis=-1)
+    predict_end_mask = np.expand_dims(answer_end_mask, axis=-1)
+    
+    predict_span = np.matmul(predict_start, predict_end.transpose((0,2,1)))
+    predict_span_mask = np.matmul(predict_start_mask, predict_end_mask.transpose((0,2,1)))
+    predict_span = predict_span * predict_span_mask
+    
+    context_length = min(predict_span.shape[-1], max_context_length)
+    predict = np.full((batch_size, 2), -1)
+    predict_score = np.full((batch_size,), float('-inf'), dtype=np.float32)
+    for k in range(batch_size):
+        max_prob = float('-inf')
+        max_prob_start = -1
+        max_prob_end = -1
+        for i in range(context_length):
+            for j in range(i, min(context_length, i+max_answer_length)):
+                if predict_span[k, i, j] > max_prob:
+                    max_prob = predict_span[k, i, j]
+                    max_prob_start = i
+                    max_prob_end = j
+        
+        predict[k, 0] = max_prob_start
+        predict[k, 1] = max_prob_end
+        predict_score[k] = max_prob
+    
+    return predict, predict_score
+
+def benchmark_span_decode(batch_size,
+                          context_length_list,
+                          max_answer_length,
+                          num_iter,
+                          random_seed):
+    """benchmark vectorized span decoding against python loop decoding"""
+    benchmark_result = []
+    for context_length in context_length_list:
+        (answer_start, answer_start_mask, answer_end,
+            answer_end_mask) = _generate_span_distribution(batch_size, context_length, random_seed)
+        
+        loop_time, (loop_predict, _) = _time_function(_decode_span_loop, 1, answer_start,
+            answer_start_mask, answer_end, answer_end_mask, context_length, max_answer_length)
+        vector_time, (vector_predict, _) = _time_function(decode_span, num_iter, answer_start,
+            answer_start_mask, answer_end, answer_end_mask, context_length, max_answer_length)
+        
+        """quantized distributions produce many tied span scores"""
+        answer_start_tie = np.round(answer_start * 2.0, decimals=2)
+        answer_end_tie = np.round(answer_end * 2.0, decimals=2)
+        nbest_match = (_check_span_nbest(answer_start, answer_start_mask, answer_end, answer_end_mask,
+            context_length, max_answer_length, 5) and
+            _check_span_nbest(answer_start_tie, answer_start_mask, answer_end_tie, answer_end_mask,
+            context_length, max_answer_length, 5) and
+            _check_span_nbest(answer_start_mask, answer_start_mask, answer_end_mask, answer_end_mask,
+            context_length, max_answer_length, context_length * max_answer_length + 1) and
+            _check_span_nbest(answer_start, np.zeros_like(answer_start_mask), answer_end, np.zeros_like(answer_end_mask),
+            context_length, max_answer_length, 5))
+        
+        benchmark_result.append({
+            "context_length": context_length,
+            "batch_size": batch_size,
+            "loop_time": loop_time,
+            "vector_time": vector_time,
+            "speedup": loop_time / max(vector_time, 1e-12),
+            "match": bool(np.array_equal(loop_predict, vector_predict)),
+            "nbest_match": nbest_match
+        })
+    
+    return benchmark_result
+
+def _generate_sentence(batch_size,
+                       context_length,
+                       alphabet,
+                       random_seed):
+    """generate random sentences for featurization benchmark"""
+    np.random.seed(random_seed)
+    sentence_list = []
+    for _ in range(batch_size):
+        word_length = np.random.randint(1, 12, size=context_length)
+        word_list = ["".join(np.random.choice(alphabet, size=length)) for length in word_length]
+        sentence_list.append(" ".join(word_list))
+    
+    return sentence_list
+
+def _run_dataset_feat(feat_function,
+                      sentence_list,
+                      feat_vocab,
+                      num_iter):
+    """run featurization over all sentences with dataset map and return average seconds per pass with last output"""
+    graph = tf.Graph()
+    with graph.as_default():
+        vocab_index = tf.contrib.lookup.index_table_from_tensor(
+            mapping=tf.constant(feat_vocab), default_value=1)
+        dataset = tf.data.Dataset.from_tensor_slices(tf.constant(sentence_list))
+        dataset = dataset.map(lambda sent: feat_function(sent, vocab_index))
+        iterator = dataset.make_initializable_iterator()
+        next_feat = iterator.get_next()
+        
+        with tf.Session(graph=graph) as sess:
+            sess.run(tf.tables_initializer())
+            start_time = time.time()
+            for _ in range(num_iter):
+                sess.run(iterator.initializer)
+                output = []
+                while True:
+                    try:
+                        output.append(sess.run(next_feat))
+                    except tf.errors.OutOfRangeError:
+                        break
+            end_time = time.time()
+    
+    return (end_time - start_time) / num_iter, output
+
+def _generate_subword_feat_loop(sentence,
+                                subword_vocab_index,
+                                word_max_length,
+                                subword_max_length,
+                                subword_size,
+                                word_sos,
+                                word_eos,
+                                word_placeholder_enable,
+                                subword_pad):
+    def word_to_subword(word):
+        """generate subwords for word"""
+        word_len = tf.size(tf.string_split([word], delimiter=''))
+        subwords = tf.substr([word], 0, subword_size)
+        for i in range(1, subword_max_length):
+            subwords = tf.cond(i+subword_size-1 < word_len,
+                lambda: tf.concat([subwords, tf.substr([word], i, subword_size)], 0),
+                lambda: subwords)
+        
+        subwords = tf.concat([subwords[:subword_max_length],
+            tf.constant(subword_pad, shape=[subword_max_length])], axis=0)
+        subwords = tf.reshape(subwords[:subword_max_length], shape=[subword_max_length])
+        
+        return subwords
+    
+    """generate variable-length subword feature for sentence with per-word map_fn, reference for generate_subword_feat"""
+    words = tf.string_split([sentence], delimiter=' ').values
+    words = words[:word_max_length]
+    if word_placeholder_enable == True:
+        words = tf.concat([[word_sos], words, [word_eos]], axis=0)
+    
+    word_subwords = tf.map_fn(word_to_subword, words)
+    word_subwords = tf.cast(subword_vocab_index.lookup(word_subwords), dtype=tf.int32)
+    
+    return word_subwords
+
+def benchmark_subword_feat(batch_size,
+                           context_length_list,
+                           subword_max_length,
+                           subword_size,
+                           num_iter,
+                           random_seed):
+    """benchmark vectorized subword featurization against per-word map_fn featurization"""
+    alphabet = list("abcdefgh")
+    feat_vocab = ["<pad>", "<unk>", "<sos>", "<eos>"]
+    feat_vocab.extend(["".join(subword) for subword in itertools.product(alphabet, repeat=subword_size)])
+    
+    benchmark_result = []
+    for context_length in context_length_list:
+        sentence_list = _generate_sentence(batch_size, context_length, alphabet, random_seed)
+        
+        loop_function = lambda sent, vocab_index: _generate_subword_feat_loop(sent, vocab_index,
+            context_length, subword_max_length, subword_size, "<sos>", "<eos>", True, "<pad>")
+        vector_function = lambda sent, vocab_index: generate_subword_feat(sent, vocab_index,
+            context_length, subword_max_length, subword_size, "<sos>", "<eos>", True, "<pad>")
+        
+        loop_time, loop_output = _run_dataset_feat(loop_function, sentence_list, feat_vocab, num_iter)
+        vector_time, vector_output = _run_dataset_feat(vector_function, sentence_list, feat_vocab, num_iter)
+        
+        benchmark_result.append({
+            "context_length": context_length,
+            "batch_size": batch_size,
+            "loop_time": loop_time,
+            "vector_time": vector_time,
+            "speedup": loop_time / max(vector_time, 1e-12),
+            "match": len(loop_output) == len(vector_output) and all([np.array_equal(loop_feat, vector_feat)
+                for loop_feat, vector_feat in zip(loop_output, vector_output)])
+        })
+    
+    return benchmark_result
+
+def _generate_char_feat_loop(sentence,
+                             char_vocab_index,
+                             word_max_length,
+                             char_max_length,
+                             word_sos,
+                             word_eos,
+                             word_placeholder_enable,
+                             char_pad):
+    def word_to_char(word):
+        """generate chars for word"""
+        chars = tf.string_split([word], delimiter='').values
+        chars = tf.concat([chars[:char_max_length],
+            tf.constant(char_pad, shape=[char_max_length])], axis=0)
+        chars = tf.reshape(chars[:char_max_length], shape=[char_max_length])
+        
+        return chars
+    
+    """generate variable-length char feature for sentence with per-word map_fn, reference for generate_char_feat"""
+    words = tf.string_split([sentence], delimiter=' ').values
+    words = words[:word_max_length]
+    if word_placeholder_enable == True:
+        words = tf.concat([[word_sos], words, [word_eos]], axis=0)
+    
+    word_chars = tf.map_fn(word_to_char, words)
+    word_chars = tf.cast(char_vocab_index.lookup(word_chars), dtype=tf.int32)
+    
+    return word_chars
+
+def benchmark_char_feat(batch_size,
+                        context_length_list,
+                        char_max_length,
+                        num_iter,
+                        random_seed):
+    """benchmark vectorized char featurization against per-word map_fn featurization"""
+    alphabet = list("abcdefghijklmnopqrstuvwxyz")
+    feat_vocab = ["<pad>", "<unk>"] + alphabet
+    
+    benchmark_result = []
+    for context_length in context_length_list:
+        sentence_list = _generate_sentence(batch_size, context_length, alphabet, random_seed)
+        
+        loop_function = lambda sent, vocab_index: _generate_char_feat_loop(sent, vocab_index,
+            context_length, char_max_length, "<sos>", "<eos>", True, "<pad>")
+        vector_function = lambda sent, vocab_index: generate_char_feat(sent, vocab_index,
+            context_length, char_max_length, "<sos>", "<eos>", True, "<pad>")
+        
+        loop_time, loop_output = _run_dataset_feat(loop_function, sentence_list, feat_vocab, num_iter)
+        vector_time, vector_output = _run_dataset_feat(vector_function, sentence_list, feat_vocab, num_iter)
+        
+        benchmark_result.append({
+            "context_length": context_length,
+            "batch_size": batch_size,
+            "loop_time": loop_time,
+            "vector_time": vector_time,
+            "speedup": loop_time / max(vector_time, 1e-12),
+            "match": len(loop_output) == len(vector_output) and all([np.array_equal(loop_feat, vector_feat)
+                for loop_feat, vector_feat in zip(loop_output, vector_output)])
+        })
+    
+    return benchmark_result
+
+def _create_vocab_table(vocab):
+    """create full vocab table from vocab count"""
+    vocab_table, _, _, _ = process_vocab_table(vocab, len(vocab) + 2, 0, None, "<unk>", "<pad>", None, None)
+    return vocab_table
+
+def _create_word_vocab_loop(input_data):
+    """create word vocab from input data with per-token loop"""
+    word_vocab_lookup = {}
+    for sentence in input_data:
+        words = sentence.strip().split(' ')
+        for word in words:
+            word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
+            for word_vocab in word_vocabs:
+                if word_vocab not in word_vocab_lookup:
+                    word_vocab_lookup[word_vocab] = 1
+                else:
+                    word_vocab_lookup[word_vocab] += 1
+    
+    return word_vocab_lookup
+
+def _create_subword_vocab_loop(input_data,
+                               subword_size):
+    """create subword vocab from input data with per-token loop"""
+    subword_vocab_lookup = {}
+    for sentence in input_data:
+        words = sentence.strip().split(' ')
+        for word in words:
+            word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
+            for word_vocab in word_vocabs:
+                subword_vocabs = _generate_vocab_subword(word_vocab, subword_size)
+                for subword_vocab in subword_vocabs:
+                    if subword_vocab not in subword_vocab_lookup:
+                        subword_vocab_lookup[subword_vocab] = 1
+                    else:
+                        subword_vocab_lookup[subword_vocab] += 1
+    
+    return subword_vocab_lookup
+
+def _create_char_vocab_loop(input_data):
+    """create char vocab from input data with per-token loop"""
+    char_vocab_lookup = {}
+    for sentence in input_data:
+        words = sentence.strip().split(' ')
+        for word in words:
+            word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
+            for word_vocab in word_vocabs:
+                char_vocabs = list(word_vocab)
+                for char_vocab in char_vocabs:
+                    if char_vocab not in char_vocab_lookup:
+                        char_vocab_lookup[char_vocab] = 1
+                    else:
+                        char_vocab_lookup[char_vocab] += 1
+    
+    return char_vocab_lookup
+
+def benchmark_vocab(batch_size,
+                    context_length_list,
+                    subword_size,
+                    num_parallel,
+                    random_seed):
+    """benchmark streamed word count vocab creation against per-token loop vocab creation"""
+    alphabet = list("abcdeABCDE")
+    
+    benchmark_result = []
+    for context_length in context_length_list:
+        sentence_list = _generate_sentence(batch_size, context_length, alphabet, random_seed)
+        """duplicated texts are streamed in to check they are counted once like the de-duplicated loop input"""
+        unique_sentence_list = list(generate_unique_text(sentence_list))
+        
+        start_time = time.time()
+        loop_vocab_list = [_create_word_vocab_loop(unique_sentence_list),
+            _create_subword_vocab_loop(unique_sentence_list, subword_size),
+            _create_char_vocab_loop(unique_sentence_list)]
+        loop_time = time.time() - start_time
+        
+        start_time = time.time()
+        word_count = count_word(generate_unique_text(sentence_list, sentence_list[::2]), num_parallel)
+        count_vocab_list = [create_word_vocab(word_count),
+            create_subword_vocab(word_count, subword_size),
+            create_char_vocab(word_count)]
+        count_time = time.time() - start_time
+        
+        benchmark_result.append({
+            "context_length": context_length,
+            "batch_size": batch_size,
+            "loop_time": loop_time,
+            "count_time": count_time,
+            "speedup": loop_time / max(count_time, 1e-12),
+            "match": all([_create_vocab_table(loop_vocab) == _create_vocab_table(dict(count_vocab))
+                for loop_vocab, count_vocab in zip(loop_vocab_list, count_vocab_list)])
+        })
+    
+    return benchmark_result
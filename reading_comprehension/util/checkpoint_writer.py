@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+__all__ = ["CheckpointWriter"]
+
+class CheckpointWriter(object):
+    """checkpoint writer"""
+    def __init__(self,
+                 logger,
+                 saver,
+                 var_list,
+                 enable_async=False):
+        """initialize checkpoint writer"""
+        self.logger = logger
+        self.saver = saver
+        self.var_list = var_list
+        self.enable_async = enable_async
+        self.write_queue = None
+        self.write_thread = None
+        self.write_error = None
+        self.last_ckpt_file = None
+        self.pending_ckpt_set = set()
+        self.pending_condition = threading.Condition()
+        
+        if self.enable_async == True:
+            """variables are written from shadow graph on cpu, so that training graph is only touched by snapshot"""
+            self.shadow_graph = tf.Graph()
+            with self.shadow_graph.as_default(), tf.device("/cpu:0"):
+                self.shadow_placeholder_list = []
+                shadow_assign_list = []
+                shadow_var_dict = {}
+                for i, var in enumerate(self.var_list):
+                    var_shape = var.get_shape()
+                    var_dtype = var.dtype.base_dtype
+                    shadow_var = tf.get_variable("shadow_var_{0}".format(i), shape=var_shape,
+                        initializer=tf.zeros_initializer, dtype=var_dtype, trainable=False)
+                    shadow_placeholder = tf.placeholder(shape=var_shape, dtype=var_dtype)
+                    self.shadow_placeholder_list.append(shadow_placeholder)
+                    shadow_assign_list.append(shadow_var.assign(shadow_placeholder))
+                    shadow_var_dict[var.op.name] = shadow_var
+                
+                self.shadow_assign_op = tf.group(*shadow_assign_list)
+                self.shadow_saver = tf.train.Saver(var_list=shadow_var_dict,
+                    max_to_keep=self.saver.saver_def.max_to_keep)
+                shadow_initializer = tf.global_variables_initializer()
+            
+            self.shadow_sess = tf.Session(graph=self.shadow_graph, config=tf.ConfigProto(device_count={"GPU": 0}))
+            self.shadow_sess.run(shadow_initializer)
+            
+            """bounded queue keeps at most one pending snapshot in host memory besides the one being written"""
+            self.write_queue = queue.Queue(maxsize=1)
+            self.write_thread = threading.Thread(target=self._write_ckpt)
+            self.write_thread.daemon = True
+            self.write_thread.start()
+    
+    def _write_ckpt(self):
+        """write snapshotted checkpoint in background"""
+        while True:
+            write_item = self.write_queue.get()
+            if write_item is None:
+                self.write_queue.task_done()
+                break
+            
+            ckpt_name, global_step, var_value_list, snapshot_time = write_item
+            try:
+                start_time = time.time()
+                feed_dict = dict(zip(self.shadow_placeholder_list, var_value_list))
+                self.shadow_sess.run(self.shadow_assign_op, feed_dict=feed_dict)
+                ckpt_file = self.shadow_saver.save(self.shadow_sess, ckpt_name,
+                    global_step=global_step, write_meta_graph=False)
+                self.logger.log_print("# write checkpoint {0} in background, snapshot={1:.3f} sec, write={2:.3f} sec"
+                    .format(ckpt_file, snapshot_time, time.time() - start_time))
+            except Exception as e:
+                self.logger.log_print("# write checkpoint {0} at step {1} failed: {2}".format(ckpt_name, global_step, e))
+                if self.write_error is None:
+                    self.write_error = e
+            finally:
+                with self.pending_condition:
+                    self.pending_ckpt_set.discard(self._get_ckpt_file(ckpt_name, global_step))
+                    self.pending_condition.notify_all()
+                
+                self.write_queue.task_done()
+    
+    def _get_ckpt_file(self,
+                       ckpt_name,
+                       global_step):
+        """get checkpoint file name as written by saver with global step"""
+        return "{0}-{1}".format(ckpt_name, global_step)
+    
+    def _raise_write_error(self):
+        """re-raise first background write failure on caller thread"""
+        if self.write_error is not None:
+            write_error = self.write_error
+            self.write_error = None
+            raise write_error
+    
+    def save(self,
+             sess,
+             ckpt_name,
+             global_step):
+        """save checkpoint, variables are snapshotted to host memory and written in background when async is enabled"""
+        start_time = time.time()
+        if self.enable_async == True:
+            self._raise_write_error()
+            var_value_list = sess.run(self.var_list)
+            ckpt_file = self._get_ckpt_file(ckpt_name, global_step)
+            with self.pending_condition:
+                self.pending_ckpt_set.add(ckpt_file)
+                self.last_ckpt_file = ckpt_file
+            
+            self.write_queue.put((ckpt_name, global_step, var_value_list, time.time() - start_time))
+        else:
+            ckpt_file = self.saver.save(sess, ckpt_name, global_step=global_step)
+            self.last_ckpt_file = ckpt_file
+            self.logger.log_print("# save checkpoint {0}, save={1:.3f} sec".format(ckpt_file, time.time() - start_time))
+    
+    def get_last_ckpt(self):
+        """get checkpoint file of last save, none if nothing has been saved by this writer"""
+        return self.last_ckpt_file
+    
+    def wait_writer(self,
+                    ckpt_file):
+        """wait for pending write of given checkpoint file, other pending writes are not waited for"""
+        with self.pending_condition:
+            while ckpt_file in self.pending_ckpt_set:
+                self.pending_condition.wait()
+    
+    def flush_writer(self):
+        """wait for pending checkpoint writes"""
+        if self.enable_async == True:
+            self.write_queue.join()
+            self._raise_write_error()
+    
+    def close_writer(self):
+        """wait for pending checkpoint writes and close checkpoint writer"""
+        if self.enable_async == True and self.write_thread is not None:
+            self.write_queue.put(None)
+            self.write_thread.join()
+            self.shadow_sess.close()
+            self.write_thread = None
+            self._raise_write_error()
@@ -1,20 +1,30 @@
 import codecs
 import collections
+import hashlib
+import itertools
 import os.path
+import sys
 import json
+import time
 
 import numpy as np
 import tensorflow as tf
 
 from util.default_util import *
+from util.feature_util import *
+from util.feature_util import (_featurize_src_data, _featurize_src_shard, _count_word_shard,
+    _generate_data_shard, _get_storage_dtype, _write_tfrecord_shard)
 
-__all__ = ["DataPipeline", "create_data_pipeline",
-           "create_src_data", "create_trg_data", "create_src_dataset", "create_trg_dataset",
-           "generate_word_feat", "generate_subword_feat", "generate_char_feat",
-           "generate_dataset_from_tfrecord", "create_tfrecord_file",
-           "create_embedding_file", "load_embedding_file", "convert_embedding",
+__all__ = ["DataPipeline", "FeatureCache", "ProcessPool", "create_data_pipeline", "create_data_store", "get_id_dtype",
+           "create_src_data", "create_trg_data", "create_src_dataset", "create_trg_dataset", "create_mrc_dataset",
+           "generate_src_feat", "generate_trg_feat", "generate_word_feat", "generate_subword_feat", "generate_char_feat",
+           "generate_dataset_from_tfrecord", "get_tfrecord_shard_file", "create_tfrecord_file",
+           "generate_dataset_from_mmap", "get_mmap_file", "create_mmap_file",
+           "create_cache_key", "create_tfrecord_manifest", "load_tfrecord_manifest", "create_context_index",
+           "create_embedding_file", "create_embedding_store", "convert_embedding_file",
+           "load_embedding_file", "convert_embedding",
            "create_vocab_file", "load_vocab_file", "process_vocab_table",
-           "create_word_vocab", "create_subword_vocab", "create_char_vocab",
+           "generate_unique_text", "count_word", "create_word_vocab", "create_subword_vocab", "create_char_vocab",
            "load_tsv_data", "load_json_data", "load_mrc_data",
            "prepare_data", "prepare_mrc_data"]
 
@@ -27,16 +37,11 @@ class DataPipeline(collections.namedtuple("DataPipeline",
      "input_question_subword_placeholder", "input_question_char_placeholder",
      "input_context_placeholder", "input_context_word_placeholder",
      "input_context_subword_placeholder", "input_context_char_placeholder",
-     "input_answer_placeholder", "data_size_placeholder", "batch_size_placeholder"))):
+     "input_answer_placeholder", "input_context_index_placeholder",
+     "data_size_placeholder", "batch_size_placeholder"))):
     pass
 
-def create_data_pipeline(input_question_word_dataset,
-                         input_question_subword_dataset,
-                         input_question_char_dataset,
-                         input_context_word_dataset,
-                         input_context_subword_dataset,
-                         input_context_char_dataset,
-                         input_answer_dataset,
+def create_data_pipeline(input_dataset,
                          input_answer_type,
                          word_vocab_index,
                          word_pad,
@@ -60,50 +65,146 @@ def create_data_pipeline(input_question_word_dataset,
                          input_context_char_placeholder,
                          input_answer_placeholder,
                          data_size_placeholder,
-                         batch_size_placeholder):
+                         batch_size_placeholder,
+                         input_context_tensor=None,
+                         input_context_index_placeholder=None,
+                         enable_bucket=False,
+                         bucket_width=40,
+                         bucket_token_size=0,
+                         enable_autotune=False,
+                         cache_file=None):
     """create data pipeline for reading comprehension model"""
     default_pad_id = tf.constant(0, shape=[], dtype=tf.int32)
-    default_dataset_tensor = tf.constant(0, shape=[1,1], dtype=tf.int32)
+    num_parallel = tf.contrib.data.AUTOTUNE if enable_autotune == True else None
+    prefetch_size = tf.contrib.data.AUTOTUNE if enable_autotune == True else 1
     
+    feat_pad_id = {}
     if word_feat_enable == True:
-        word_pad_id = tf.cast(word_vocab_index.lookup(tf.constant(word_pad)), dtype=tf.int32)
-    else:
-        word_pad_id = default_pad_id
-        input_question_word_dataset = tf.data.Dataset.from_tensors(default_dataset_tensor).repeat(data_size_placeholder)
-        input_context_word_dataset = tf.data.Dataset.from_tensors(default_dataset_tensor).repeat(data_size_placeholder)
-        input_answer_dataset = tf.data.Dataset.from_tensors(default_dataset_tensor).repeat(data_size_placeholder)
+        feat_pad_id["word"] = tf.cast(word_vocab_index.lookup(tf.constant(word_pad)), dtype=tf.int32)
     
     if subword_feat_enable == True:
-        subword_pad_id = tf.cast(subword_vocab_index.lookup(tf.constant(subword_pad)), dtype=tf.int32)
-    else:
-        subword_pad_id = default_pad_id
-        input_question_subword_dataset = tf.data.Dataset.from_tensors(default_dataset_tensor).repeat(data_size_placeholder)
-        input_context_subword_dataset = tf.data.Dataset.from_tensors(default_dataset_tensor).repeat(data_size_placeholder)
+        feat_pad_id["subword"] = tf.cast(subword_vocab_index.lookup(tf.constant(subword_pad)), dtype=tf.int32)
     
     if char_feat_enable == True:
-        char_pad_id = tf.cast(char_vocab_index.lookup(tf.constant(char_pad)), dtype=tf.int32)
-    else:
-        char_pad_id = default_pad_id
-        input_question_char_dataset = tf.data.Dataset.from_tensors(default_dataset_tensor).repeat(data_size_placeholder)
-        input_context_char_dataset = tf.data.Dataset.from_tensors(default_dataset_tensor).repeat(data_size_placeholder)
+        feat_pad_id["char"] = tf.cast(char_vocab_index.lookup(tf.constant(char_pad)), dtype=tf.int32)
     
-    dataset = tf.data.Dataset.zip((input_question_word_dataset, input_question_subword_dataset, input_question_char_dataset,
-        input_context_word_dataset, input_context_subword_dataset, input_context_char_dataset, input_answer_dataset))
+    """each example is a dict of question/context feature dicts and answer, context may be replaced by context index"""
+    dataset = input_dataset.take(data_size_placeholder)
     
     if enable_shuffle == True:
         dataset = dataset.shuffle(buffer_size, random_seed)
     
-    dataset = dataset.batch(batch_size=batch_size_placeholder)
-    dataset = dataset.prefetch(buffer_size=1)
+    def process_example(data):
+        """gather context features by context index and widen ids to int32 per example, ahead of batching"""
+        if input_context_tensor is not None:
+            context_data = { key: tf.gather(input_context_tensor[key], data["context_index"])
+                for key in input_context_tensor.keys() }
+        else:
+            context_data = data["context"]
+        
+        """context index is kept for bucketing and dropped once batches are formed"""
+        output_data = { key: data[key] for key in data.keys() if key != "context" }
+        if enable_bucket == False:
+            output_data.pop("context_index", None)
+        
+        output_data["question"] = { key: tf.cast(data["question"][key], dtype=tf.int32) for key in data["question"].keys() }
+        output_data["context"] = { key: tf.cast(context_data[key], dtype=tf.int32) for key in context_data.keys() }
+        if "answer" in output_data:
+            output_data["answer"] = tf.cast(output_data["answer"], dtype=tf.int32)
+        
+        return output_data
+    
+    def get_padding_values(output_types):
+        """features of variable length are padded per batch to max length within batch, padding values follow dtype of each feature"""
+        padding_values = {}
+        for key in output_types.keys():
+            if key in ["question", "context"]:
+                padding_values[key] = { feat_key: tf.cast(feat_pad_id[feat_key], dtype=output_types[key][feat_key])
+                    for feat_key in output_types[key].keys() }
+            elif key == "answer" and input_answer_type == "text":
+                padding_values[key] = tf.cast(feat_pad_id["word"], dtype=output_types[key])
+            else:
+                padding_values[key] = tf.cast(default_pad_id, dtype=output_types[key])
+        
+        return padding_values
+    
+    def get_sequence_length(feat_data):
+        """get true sequence length of padded word/subword/char-level feature along the second-to-last axis"""
+        feat_key = [key for key in ["word", "subword", "char"] if key in feat_data][0]
+        feat_pad = tf.cast(feat_pad_id[feat_key], dtype=feat_data[feat_key].dtype)
+        sequence_mask = tf.reduce_any(tf.not_equal(feat_data[feat_key], feat_pad), axis=-1)
+        sequence_position = tf.to_int32(sequence_mask) * tf.range(1, tf.shape(sequence_mask)[-1] + 1)
+        sequence_length = tf.reduce_max(sequence_position, axis=-1)
+        
+        return sequence_length
+    
+    if enable_bucket == True:
+        """group examples into buckets of true context length, batch size is either fixed or derived from token budget"""
+        dataset = dataset.map(process_example, num_parallel_calls=num_parallel)
+        padding_values = get_padding_values(dataset.output_types)
+        padded_shapes = dataset.output_shapes
+        
+        if input_context_tensor is not None:
+            context_length = get_sequence_length(input_context_tensor)
+            key_func = lambda data: tf.to_int64(tf.gather(context_length, data["context_index"]) // bucket_width)
+        else:
+            key_func = lambda data: tf.to_int64(get_sequence_length(data["context"]) // bucket_width)
+        
+        if bucket_token_size > 0:
+            window_size_func = lambda key: tf.maximum(tf.constant(bucket_token_size, dtype=tf.int64) // ((key + 1) * bucket_width),
+                tf.constant(1, dtype=tf.int64))
+        else:
+            window_size_func = lambda key: batch_size_placeholder
+        
+        dataset = dataset.apply(tf.contrib.data.group_by_window(key_func=key_func,
+            reduce_func=lambda key, window: window.padded_batch(batch_size=window_size_func(key),
+                padded_shapes=padded_shapes, padding_values=padding_values),
+            window_size_func=window_size_func))
+        
+        def process_batch(batch_data):
+            """trim padding to max true length within bucketed batch"""
+            question_data = batch_data["question"]
+            context_data = batch_data["context"]
+            question_length = tf.reduce_max(get_sequence_length(question_data))
+            context_length = tf.reduce_max(get_sequence_length(context_data))
+            
+            output_data = { key: batch_data[key] for key in batch_data.keys() if key != "context_index" }
+            output_data["question"] = { key: question_data[key][:,:question_length,:] for key in question_data.keys() }
+            output_data["context"] = { key: context_data[key][:,:context_length,:] for key in context_data.keys() }
+            
+            return output_data
+        
+        dataset = dataset.map(process_batch, num_parallel_calls=num_parallel)
+    elif all([shape.is_fully_defined() for shape in tf.contrib.framework.nest.flatten(dataset.output_shapes)]):
+        """features are of fixed length, per-example map and batching are fused into single stage"""
+        dataset = dataset.apply(tf.contrib.data.map_and_batch(process_example,
+            batch_size=batch_size_placeholder, num_parallel_calls=num_parallel))
+    else:
+        dataset = dataset.map(process_example, num_parallel_calls=num_parallel)
+        dataset = dataset.padded_batch(batch_size=batch_size_placeholder,
+            padded_shapes=dataset.output_shapes, padding_values=get_padding_values(dataset.output_types))
+    
+    if enable_autotune == True:
+        """fuse adjacent map/batch stages and drop no-op stages of the pipeline, applied ahead of cache and prefetch"""
+        dataset = dataset.apply(tf.contrib.data.optimize(["map_and_batch_fusion", "map_fusion", "noop_elimination"]))
+    
+    if cache_file is not None:
+        """featurized batches are written to cache file on first pass and replayed on later initializations"""
+        dataset = dataset.cache(cache_file)
+    
+    dataset = dataset.prefetch(buffer_size=prefetch_size)
     
     iterator = dataset.make_initializable_iterator()
     batch_data = iterator.get_next()
     
+    input_question_data = batch_data["question"]
+    input_context_data = batch_data["context"]
+    
     if word_feat_enable == True:
-        input_question_word = batch_data[0]
-        input_question_word_mask = tf.cast(tf.not_equal(batch_data[0], word_pad_id), dtype=tf.float32)
-        input_context_word = batch_data[3]
-        input_context_word_mask = tf.cast(tf.not_equal(batch_data[3], word_pad_id), dtype=tf.float32)
+        input_question_word = input_question_data["word"]
+        input_question_word_mask = tf.cast(tf.not_equal(input_question_word, feat_pad_id["word"]), dtype=tf.float32)
+        input_context_word = input_context_data["word"]
+        input_context_word_mask = tf.cast(tf.not_equal(input_context_word, feat_pad_id["word"]), dtype=tf.float32)
     else:
         input_question_word = None
         input_question_word_mask = None
@@ -111,10 +212,10 @@ def create_data_pipeline(input_question_word_dataset,
         input_context_word_mask = None
     
     if subword_feat_enable == True:
-        input_question_subword = batch_data[1]
-        input_question_subword_mask = tf.cast(tf.not_equal(batch_data[1], subword_pad_id), dtype=tf.float32)
-        input_context_subword = batch_data[4]
-        input_context_subword_mask = tf.cast(tf.not_equal(batch_data[4], subword_pad_id), dtype=tf.float32)
+        input_question_subword = input_question_data["subword"]
+        input_question_subword_mask = tf.cast(tf.not_equal(input_question_subword, feat_pad_id["subword"]), dtype=tf.float32)
+        input_context_subword = input_context_data["subword"]
+        input_context_subword_mask = tf.cast(tf.not_equal(input_context_subword, feat_pad_id["subword"]), dtype=tf.float32)
     else:
         input_question_subword = None
         input_question_subword_mask = None
@@ -122,10 +223,10 @@ def create_data_pipeline(input_question_word_dataset,
         input_context_subword_mask = None
     
     if char_feat_enable == True:
-        input_question_char = batch_data[2]
-        input_question_char_mask = tf.cast(tf.not_equal(batch_data[2], char_pad_id), dtype=tf.float32)
-        input_context_char = batch_data[5]
-        input_context_char_mask = tf.cast(tf.not_equal(batch_data[5], char_pad_id), dtype=tf.float32)
+        input_question_char = input_question_data["char"]
+        input_question_char_mask = tf.cast(tf.not_equal(input_question_char, feat_pad_id["char"]), dtype=tf.float32)
+        input_context_char = input_context_data["char"]
+        input_context_char_mask = tf.cast(tf.not_equal(input_context_char, feat_pad_id["char"]), dtype=tf.float32)
     else:
         input_question_char = None
         input_question_char_mask = None
@@ -134,11 +235,11 @@ def create_data_pipeline(input_question_word_dataset,
     
     if input_answer_type == "span":
         index_pad_id = tf.constant(0, shape=[], dtype=tf.int32)
-        input_answer = batch_data[6]
-        input_answer_mask = tf.cast(tf.greater_equal(batch_data[6], index_pad_id), dtype=tf.float32)
+        input_answer = batch_data["answer"]
+        input_answer_mask = tf.cast(tf.greater_equal(input_answer, index_pad_id), dtype=tf.float32)
     elif input_answer_type == "text":
-        input_answer = batch_data[6]
-        input_answer_mask = tf.cast(tf.not_equal(batch_data[6], word_pad_id), dtype=tf.float32)
+        input_answer = batch_data["answer"]
+        input_answer_mask = tf.cast(tf.not_equal(input_answer, feat_pad_id["word"]), dtype=tf.float32)
     else:
         input_answer = None
         input_answer_mask = None
@@ -159,8 +260,21 @@ def create_data_pipeline(input_question_word_dataset,
         input_context_subword_placeholder=input_context_subword_placeholder,
         input_context_char_placeholder=input_context_char_placeholder,
         input_answer_placeholder=input_answer_placeholder,
+        input_context_index_placeholder=input_context_index_placeholder,
         data_size_placeholder=data_size_placeholder, batch_size_placeholder=batch_size_placeholder)
 
+def create_data_store(input_data):
+    """create local variable store for (nested dict of) placeholder, data is fed once on initialization and kept in runtime"""
+    if isinstance(input_data, dict):
+        return { key: create_data_store(input_data[key]) for key in input_data.keys() }
+    
+    data_store = tf.Variable(input_data, trainable=False,
+        collections=[tf.GraphKeys.LOCAL_VARIABLES], validate_shape=False)
+    data_tensor = tf.identity(data_store)
+    data_tensor.set_shape(input_data.shape)
+    
+    return data_tensor
+
 def create_src_data(input_data,
                     word_vocab_index,
                     word_max_length,
@@ -177,25 +291,44 @@ def create_src_data(input_data,
                     char_vocab_index,
                     char_max_length,
                     char_pad,
-                    char_feat_enable):
+                    char_feat_enable,
+                    num_parallel=1,
+                    shard_size=20000,
+                    feature_cache=None,
+                    process_pool=None):
     """create word/subword/char-level data for input source data"""
-    word_data = None
-    if word_feat_enable == True:
-        word_data = [generate_word(sent, word_vocab_index, word_max_length,
-            word_pad, word_sos, word_eos, word_placeholder_enable) for sent in input_data]
-        word_data = np.asarray(word_data)
+    if feature_cache is None:
+        feature_cache = FeatureCache(word_vocab_index, word_pad, word_feat_enable,
+            subword_vocab_index, subword_max_length, subword_pad, subword_size, subword_feat_enable,
+            char_vocab_index, char_max_length, char_pad, char_feat_enable)
+    
+    feature_setting = (word_max_length, word_sos, word_eos, word_placeholder_enable)
+    data_size = len(input_data)
+    if num_parallel <= 1 or data_size <= shard_size:
+        return _featurize_src_data(input_data, feature_cache, *feature_setting)
     
+    """featurize large input data in pool workers, each worker keeps its own copy of feature cache across tasks"""
+    word_data = None
     subword_data = None
-    if subword_feat_enable == True:
-        subword_data = [generate_subword(sent, subword_vocab_index, word_max_length, subword_max_length,
-            subword_size, word_sos, word_eos, word_placeholder_enable, subword_pad) for sent in input_data]
-        subword_data = np.asarray(subword_data)
-
     char_data = None
-    if char_feat_enable == True:
-        char_data = [generate_char(sent, char_vocab_index, word_max_length, char_max_length,
-            word_sos, word_eos, word_placeholder_enable, char_pad) for sent in input_data]
-        char_data = np.asarray(char_data)
+    pool = process_pool if process_pool is not None else ProcessPool(num_parallel)
+    try:
+        cache_file = pool.get_feature_cache_file(feature_cache)
+        shard_tasks = ((cache_file, feature_setting, input_shard)
+            for input_shard in _generate_data_shard(input_data, shard_size))
+        for i, (shard_data, num_lookup, num_hit) in enumerate(pool.imap(_featurize_src_shard, shard_tasks)):
+            feature_cache.add_lookup_stat(num_lookup, num_hit)
+            shard_start = i * shard_size
+            shard_end = min(shard_start + shard_size, data_size)
+            if i == 0:
+                word_data, subword_data, char_data = [np.empty((data_size,) + data.shape[1:], dtype=data.dtype)
+                    if data is not None else None for data in shard_data]
+            for output_data, data in zip((word_data, subword_data, char_data), shard_data):
+                if output_data is not None:
+                    output_data[shard_start:shard_end] = data
+    finally:
+        if pool is not process_pool:
+            pool.close()
     
     return word_data, subword_data, char_data
 
@@ -206,11 +339,15 @@ def create_trg_data(input_data,
                     word_pad,
                     word_sos,
                     word_eos,
-                    word_placeholder_enable):
+                    word_placeholder_enable,
+                    feature_cache=None):
     """create data for input target data"""
     if input_data_type == "span":
         output_data = [span.split('|')[:2] for span in input_data]
         output_data = [np.asarray([[int(index)] for index in span]) for span in output_data]
+    elif input_data_type == "text" and feature_cache is not None and feature_cache.word_feat_enable == True:
+        output_data, _, _ = _featurize_src_data(input_data, feature_cache,
+            word_max_length, word_sos, word_eos, word_placeholder_enable, word_only=True)
     elif input_data_type == "text":
         output_data = [generate_word(sent, word_vocab_index, word_max_length,
             word_pad, word_sos, word_eos, word_placeholder_enable) for sent in input_data]
@@ -335,28 +472,13 @@ def create_src_dataset(input_dataset,
                        char_pad,
                        char_feat_enable,
                        num_parallel):
-    """create word/subword/char-level dataset for input source data"""
-    dataset = input_dataset
+    """create dataset of word/subword/char-level feature dict for input source data"""
+    dataset = input_dataset.map(lambda sent: generate_src_feat(sent,
+        word_vocab_index, word_max_length, word_pad, word_sos, word_eos, word_placeholder_enable, word_feat_enable,
+        subword_vocab_index, subword_max_length, subword_pad, subword_size, subword_feat_enable,
+        char_vocab_index, char_max_length, char_pad, char_feat_enable), num_parallel_calls=num_parallel)
     
-    word_dataset = None
-    if word_feat_enable == True:
-        word_dataset = dataset.map(lambda sent: generate_word_feat(sent,
-            word_vocab_index, word_max_length, word_pad, word_sos, word_eos,
-            word_placeholder_enable), num_parallel_calls=num_parallel)
-
-    subword_dataset = None
-    if subword_feat_enable == True:
-        subword_dataset = dataset.map(lambda sent: generate_subword_feat(sent,
-            subword_vocab_index, word_max_length, subword_max_length, subword_size,
-            word_sos, word_eos, word_placeholder_enable, subword_pad), num_parallel_calls=num_parallel)
-
-    char_dataset = None
-    if char_feat_enable == True:
-        char_dataset = dataset.map(lambda sent: generate_char_feat(sent,
-            char_vocab_index, word_max_length, char_max_length, word_sos, word_eos,
-            word_placeholder_enable, char_pad), num_parallel_calls=num_parallel)
-    
-    return word_dataset, subword_dataset, char_dataset
+    return dataset
 
 def create_trg_dataset(input_dataset,
                        input_data_type,
@@ -370,39 +492,178 @@ def create_trg_dataset(input_dataset,
     """create dataset for input target data"""
     dataset = input_dataset
     
-    if input_data_type == "span":
-        dataset = dataset.map(lambda span: tf.string_split([span], delimiter='|').values, num_parallel_calls=num_parallel)
-        dataset = dataset.map(lambda span: tf.string_to_number(span, out_type=tf.int32), num_parallel_calls=num_parallel)
-        dataset = dataset.map(lambda span: tf.expand_dims(span, axis=-1), num_parallel_calls=num_parallel)
-    elif input_data_type == "text":
-        dataset = dataset.map(lambda sent: generate_word_feat(sent,
+    if input_data_type in ["span", "text"]:
+        dataset = dataset.map(lambda sent: generate_trg_feat(sent, input_data_type,
             word_vocab_index, word_max_length, word_pad, word_sos, word_eos,
             word_placeholder_enable), num_parallel_calls=num_parallel)
     
     return dataset
 
-def generate_word_feat(sentence,
+def create_mrc_dataset(input_dataset,
+                       answer_type,
+                       question_max_length,
+                       context_max_length,
+                       answer_max_length,
                        word_vocab_index,
-                       word_max_length,
                        word_pad,
                        word_sos,
                        word_eos,
-                       word_placeholder_enable):
-    """generate word feature for sentence"""
+                       word_placeholder_enable,
+                       word_feat_enable,
+                       subword_vocab_index,
+                       subword_max_length,
+                       subword_pad,
+                       subword_size,
+                       subword_feat_enable,
+                       char_vocab_index,
+                       char_max_length,
+                       char_pad,
+                       char_feat_enable,
+                       num_parallel):
+    """create dataset of question/context/answer feature dict for input mrc data dict in a single map"""
+    def generate_mrc_feat(input_data):
+        """generate question/context/answer feature for mrc data"""
+        question_feat = generate_src_feat(input_data["question"],
+            word_vocab_index, question_max_length, word_pad, word_sos, word_eos, word_placeholder_enable, word_feat_enable,
+            subword_vocab_index, subword_max_length, subword_pad, subword_size, subword_feat_enable,
+            char_vocab_index, char_max_length, char_pad, char_feat_enable)
+        context_feat = generate_src_feat(input_data["context"],
+            word_vocab_index, context_max_length, word_pad, word_sos, word_eos, word_placeholder_enable, word_feat_enable,
+            subword_vocab_index, subword_max_length, subword_pad, subword_size, subword_feat_enable,
+            char_vocab_index, char_max_length, char_pad, char_feat_enable)
+        answer_feat = generate_trg_feat(input_data["answer"], answer_type,
+            word_vocab_index, answer_max_length, word_pad, word_sos, word_eos, word_placeholder_enable)
+        
+        return {
+            "question": question_feat,
+            "context": context_feat,
+            "answer": answer_feat
+        }
+    
+    dataset = input_dataset.map(generate_mrc_feat, num_parallel_calls=num_parallel)
+    
+    return dataset
+
+def generate_trg_feat(sentence,
+                      input_data_type,
+                      word_vocab_index,
+                      word_max_length,
+                      word_pad,
+                      word_sos,
+                      word_eos,
+                      word_placeholder_enable):
+    """generate feature for target sentence, span is parsed from 'start|end' and text is featurized at word-level"""
+    if input_data_type == "span":
+        span = tf.string_split([sentence], delimiter='|').values
+        span = tf.string_to_number(span, out_type=tf.int32)
+        return tf.expand_dims(span, axis=-1)
+    elif input_data_type == "text":
+        return generate_word_feat(sentence, word_vocab_index, word_max_length,
+            word_pad, word_sos, word_eos, word_placeholder_enable)
+    else:
+        return sentence
+
+def _split_sentence(sentence,
+                    word_max_length,
+                    word_sos,
+                    word_eos,
+                    word_placeholder_enable):
+    """split sentence into words with optional sos/eos placeholder"""
     words = tf.string_split([sentence], delimiter=' ').values
+    words = words[:word_max_length]
     if word_placeholder_enable == True:
-        words = tf.concat([[word_sos], words[:word_max_length], [word_eos],
-            tf.constant(word_pad, shape=[word_max_length])], axis=0)
-        word_max_length = word_max_length + 2
-    else:
-        words = tf.concat([words[:word_max_length],
-            tf.constant(word_pad, shape=[word_max_length])], axis=0)
-    words = tf.reshape(words[:word_max_length], shape=[word_max_length])
-    words = tf.cast(word_vocab_index.lookup(words), dtype=tf.int32)
-    words = tf.expand_dims(words, axis=-1)
+        words = tf.concat([[word_sos], words, [word_eos]], axis=0)
     
     return words
 
+def _lookup_word_feat(words,
+                      word_vocab_index):
+    """generate word feature for words"""
+    word_feat = tf.cast(word_vocab_index.lookup(words), dtype=tf.int32)
+    word_feat = tf.expand_dims(word_feat, axis=-1)
+    
+    return word_feat
+
+def _lookup_subword_feat(words,
+                         subword_vocab_index,
+                         subword_max_length,
+                         subword_size,
+                         subword_pad):
+    """generate subword feature for words"""
+    """subword i of word is the n-gram starting at byte i, all subwords of all words are extracted with one substr op"""
+    word_chars = tf.string_split(words, delimiter='')
+    word_length = tf.sparse_reduce_sum(tf.SparseTensor(indices=word_chars.indices,
+        values=tf.ones_like(word_chars.values, dtype=tf.int32), dense_shape=word_chars.dense_shape), axis=1)
+    word_length = tf.reshape(word_length, shape=[-1, 1])
+    
+    subword_position = tf.expand_dims(tf.range(subword_max_length), axis=0)
+    subword_valid = tf.logical_or(tf.equal(subword_position, 0), subword_position + subword_size - 1 < word_length)
+    subword_start = tf.minimum(subword_position, word_length)
+    subword_words = tf.tile(tf.expand_dims(words, axis=-1), multiples=[1, subword_max_length])
+    subwords = tf.substr(subword_words, subword_start, tf.fill(tf.shape(subword_start), subword_size))
+    subwords = tf.where(subword_valid, subwords, tf.fill(tf.shape(subwords), subword_pad))
+    subword_feat = tf.cast(subword_vocab_index.lookup(subwords), dtype=tf.int32)
+    
+    return subword_feat
+
+def _lookup_char_feat(words,
+                      char_vocab_index,
+                      char_max_length,
+                      char_pad):
+    """generate char feature for words"""
+    """chars of all words are split with one op and padded to char max length as a single dense tensor"""
+    word_chars = tf.sparse_tensor_to_dense(tf.string_split(words, delimiter=''), default_value=char_pad)
+    word_chars = tf.concat([word_chars, tf.fill([tf.shape(words)[0], char_max_length], char_pad)], axis=1)
+    word_chars = word_chars[:,:char_max_length]
+    char_feat = tf.cast(char_vocab_index.lookup(word_chars), dtype=tf.int32)
+    
+    return char_feat
+
+def generate_src_feat(sentence,
+                      word_vocab_index,
+                      word_max_length,
+                      word_pad,
+                      word_sos,
+                      word_eos,
+                      word_placeholder_enable,
+                      word_feat_enable,
+                      subword_vocab_index,
+                      subword_max_length,
+                      subword_pad,
+                      subword_size,
+                      subword_feat_enable,
+                      char_vocab_index,
+                      char_max_length,
+                      char_pad,
+                      char_feat_enable):
+    """generate dict of variable-length word/subword/char feature for sentence, sentence is only split once"""
+    words = _split_sentence(sentence, word_max_length, word_sos, word_eos, word_placeholder_enable)
+    
+    src_feat = {}
+    if word_feat_enable == True:
+        src_feat["word"] = _lookup_word_feat(words, word_vocab_index)
+    
+    if subword_feat_enable == True:
+        src_feat["subword"] = _lookup_subword_feat(words, subword_vocab_index, subword_max_length, subword_size, subword_pad)
+    
+    if char_feat_enable == True:
+        src_feat["char"] = _lookup_char_feat(words, char_vocab_index, char_max_length, char_pad)
+    
+    return src_feat
+
+def generate_word_feat(sentence,
+                       word_vocab_index,
+                       word_max_length,
+                       word_pad,
+                       word_sos,
+                       word_eos,
+                       word_placeholder_enable):
+    """generate variable-length word feature for sentence, padding is done per batch"""
+    words = _split_sentence(sentence, word_max_length, word_sos, word_eos, word_placeholder_enable)
+    word_feat = _lookup_word_feat(words, word_vocab_index)
+    
+    return word_feat
+
 def generate_subword_feat(sentence,
                           subword_vocab_index,
                           word_max_length,
@@ -412,36 +673,11 @@ def generate_subword_feat(sentence,
                           word_eos,
                           word_placeholder_enable,
                           subword_pad):
-    def word_to_subword(word):
-        """generate subwords for word"""
-        word_len = tf.size(tf.string_split([word], delimiter=''))
-        subwords = tf.substr([word], 0, subword_size)
-        for i in range(1, subword_max_length):
-            subwords = tf.cond(i+subword_size-1 < word_len,
-                lambda: tf.concat([subwords, tf.substr([word], i, subword_size)], 0),
-                lambda: subwords)
-        
-        subwords = tf.concat([subwords[:subword_max_length],
-            tf.constant(subword_pad, shape=[subword_max_length])], axis=0)
-        subwords = tf.reshape(subwords[:subword_max_length], shape=[subword_max_length])
-        
-        return subwords
-    
-    """generate subword feature for sentence"""
-    words = tf.string_split([sentence], delimiter=' ').values
-    if word_placeholder_enable == True:
-        words = tf.concat([[word_sos], words[:word_max_length], [word_eos],
-            tf.constant(subword_pad, shape=[word_max_length])], axis=0)
-        word_max_length = word_max_length + 2
-    else:
-        words = tf.concat([words[:word_max_length],
-            tf.constant(subword_pad, shape=[word_max_length])], axis=0)
-    
-    words = tf.reshape(words[:word_max_length], shape=[word_max_length])
-    word_subwords = tf.map_fn(word_to_subword, words)
-    word_subwords = tf.cast(subword_vocab_index.lookup(word_subwords), dtype=tf.int32)
+    """generate variable-length subword feature for sentence, padding is done per batch"""
+    words = _split_sentence(sentence, word_max_length, word_sos, word_eos, word_placeholder_enable)
+    subword_feat = _lookup_subword_feat(words, subword_vocab_index, subword_max_length, subword_size, subword_pad)
     
-    return word_subwords
+    return subword_feat
 
 def generate_char_feat(sentence,
                        char_vocab_index,
@@ -451,32 +687,14 @@ def generate_char_feat(sentence,
                        word_eos,
                        word_placeholder_enable,
                        char_pad):
-    def word_to_char(word):
-        """generate chars for word"""
-        chars = tf.string_split([word], delimiter='').values
-        chars = tf.concat([chars[:char_max_length],
-            tf.constant(char_pad, shape=[char_max_length])], axis=0)
-        chars = tf.reshape(chars[:char_max_length], shape=[char_max_length])
-        
-        return chars
-    
-    """generate char feature for sentence"""
-    words = tf.string_split([sentence], delimiter=' ').values
-    if word_placeholder_enable == True:
-        words = tf.concat([[word_sos], words[:word_max_length], [word_eos],
-            tf.constant(char_pad, shape=[word_max_length])], axis=0)
-        word_max_length = word_max_length + 2
-    else:
-        words = tf.concat([words[:word_max_length],
-            tf.constant(char_pad, shape=[word_max_length])], axis=0)
+    """generate variable-length char feature for sentence, padding is done per batch"""
+    words = _split_sentence(sentence, word_max_length, word_sos, word_eos, word_placeholder_enable)
+    char_feat = _lookup_char_feat(words, char_vocab_index, char_max_length, char_pad)
     
-    words = tf.reshape(words[:word_max_length], shape=[word_max_length])
-    word_chars = tf.map_fn(word_to_char, words)
-    word_chars = tf.cast(char_vocab_index.lookup(word_chars), dtype=tf.int32)
-    
-    return word_chars
+    return char_feat
 
 def generate_dataset_from_tfrecord(tfrecord_file,
+                                   context_tfrecord_file,
                                    word_feat_enable,
                                    subword_feat_enable,
                                    char_feat_enable,
@@ -486,162 +704,455 @@ def generate_dataset_from_tfrecord(tfrecord_file,
                                    subword_max_length,
                                    char_max_length,
                                    answer_type,
-                                   num_parallel):
+                                   num_parallel,
+                                   num_shard=1,
+                                   compression_type="",
+                                   context_size=None,
+                                   feature_dtype=None):
+    def get_feature_dtype(feature_name):
+        """get dtype of raw feature bytes, feature data without recorded dtype is stored as int32"""
+        if feature_dtype is None or feature_name not in feature_dtype:
+            return tf.int32
+        
+        return tf.as_dtype(feature_dtype[feature_name])
+    
     def parse_example(example):
         feature = {}
         
         if word_feat_enable == True:
             feature['question_word'] = tf.FixedLenFeature([], tf.string)
-            feature['context_word'] = tf.FixedLenFeature([], tf.string)
         
         if subword_feat_enable == True:
             feature['question_subword'] = tf.FixedLenFeature([], tf.string)
-            feature['context_subword'] = tf.FixedLenFeature([], tf.string)
         
         if char_feat_enable == True:
             feature['question_char'] = tf.FixedLenFeature([], tf.string)
-            feature['context_char'] = tf.FixedLenFeature([], tf.string)
         
+        feature['context_index'] = tf.FixedLenFeature([], tf.int64)
         feature['answer'] = tf.FixedLenFeature([], tf.string)
         
         features = tf.parse_single_example(example, feature)
         
-        default_tensor = tf.constant(0, shape=[1,1], dtype=tf.int32)
+        question_data = {}
+        if word_feat_enable == True:
+            question_data["word"] = tf.reshape(tf.decode_raw(features['question_word'], get_feature_dtype('question_word')),
+                shape=[question_max_length, 1])
+        
+        if subword_feat_enable == True:
+            question_data["subword"] = tf.reshape(tf.decode_raw(features['question_subword'], get_feature_dtype('question_subword')),
+                shape=[question_max_length, subword_max_length])
         
-        question_word = (tf.reshape(tf.decode_raw(features['question_word'], tf.int32),
-            shape=[question_max_length, 1]) if word_feat_enable == True else default_tensor)
-        question_subword = (tf.reshape(tf.decode_raw(features['question_subword'], tf.int32),
-            shape=[question_max_length, subword_max_length]) if subword_feat_enable == True else default_tensor)
-        question_char = (tf.reshape(tf.decode_raw(features['question_char'], tf.int32),
-            shape=[question_max_length, char_max_length]) if char_feat_enable == True else default_tensor)
+        if char_feat_enable == True:
+            question_data["char"] = tf.reshape(tf.decode_raw(features['question_char'], get_feature_dtype('question_char')),
+                shape=[question_max_length, char_max_length])
         
-        context_word = (tf.reshape(tf.decode_raw(features['context_word'], tf.int32),
-            shape=[context_max_length, 1]) if word_feat_enable == True else default_tensor)
-        context_subword = (tf.reshape(tf.decode_raw(features['context_subword'], tf.int32),
-            shape=[context_max_length, subword_max_length]) if subword_feat_enable == True else default_tensor)
-        context_char = (tf.reshape(tf.decode_raw(features['context_char'], tf.int32),
-            shape=[context_max_length, char_max_length]) if char_feat_enable == True else default_tensor)
+        context_index = tf.cast(features['context_index'], dtype=tf.int32)
         
         if answer_type == "span":
-            answer = tf.reshape(tf.decode_raw(features['answer'], tf.int32), shape=[2, 1])
+            answer = tf.reshape(tf.decode_raw(features['answer'], get_feature_dtype('answer')), shape=[2, 1])
         elif answer_type == "text":
-            answer = tf.reshape(tf.decode_raw(features['answer'], tf.int32), shape=[answer_max_length, 1])
+            answer = tf.reshape(tf.decode_raw(features['answer'], get_feature_dtype('answer')), shape=[answer_max_length, 1])
         else:
-            answer = tf.decode_raw(features['answer'], tf.int32)
+            answer = tf.decode_raw(features['answer'], get_feature_dtype('answer'))
         
-        return question_word, question_subword, question_char, context_word, context_subword, context_char, answer
+        return {
+            "question": question_data,
+            "context_index": context_index,
+            "answer": answer
+        }
+    
+    def parse_context_example(example):
+        feature = {}
+        
+        if word_feat_enable == True:
+            feature['context_word'] = tf.FixedLenFeature([], tf.string)
+        
+        if subword_feat_enable == True:
+            feature['context_subword'] = tf.FixedLenFeature([], tf.string)
+        
+        if char_feat_enable == True:
+            feature['context_char'] = tf.FixedLenFeature([], tf.string)
+        
+        features = tf.parse_single_example(example, feature)
+        
+        context_data = {}
+        if word_feat_enable == True:
+            context_data["word"] = tf.reshape(tf.decode_raw(features['context_word'], get_feature_dtype('context_word')),
+                shape=[context_max_length, 1])
+        
+        if subword_feat_enable == True:
+            context_data["subword"] = tf.reshape(tf.decode_raw(features['context_subword'], get_feature_dtype('context_subword')),
+                shape=[context_max_length, subword_max_length])
+        
+        if char_feat_enable == True:
+            context_data["char"] = tf.reshape(tf.decode_raw(features['context_char'], get_feature_dtype('context_char')),
+                shape=[context_max_length, char_max_length])
+        
+        return context_data
     
     """generate dataset from tfrecord"""
-    dataset = tf.data.TFRecordDataset([tfrecord_file])
+    tfrecord_file_list = get_tfrecord_shard_file(tfrecord_file, num_shard)
+    dataset = _create_tfrecord_dataset(tfrecord_file_list, compression_type)
     dataset = dataset.map(parse_example, num_parallel_calls=num_parallel)
     
+    """unique context features are read once into local variable store on initialization and gathered by context index"""
+    if context_size is None:
+        raise ValueError("context size of context tfrecord must be provided, e.g. from tfrecord manifest")
     
-    question_word_dataset = dataset.map(lambda qw, qs, qc, cw, cs, cc, a: qw) if word_feat_enable == True else None
-    question_subword_dataset = dataset.map(lambda qw, qs, qc, cw, cs, cc, a: qs) if subword_feat_enable == True else None
-    question_char_dataset = dataset.map(lambda qw, qs, qc, cw, cs, cc, a: qc) if char_feat_enable == True else None
-    context_word_dataset = dataset.map(lambda qw, qs, qc, cw, cs, cc, a: cw) if word_feat_enable == True else None
-    context_subword_dataset = dataset.map(lambda qw, qs, qc, cw, cs, cc, a: cs) if subword_feat_enable == True else None
-    context_char_dataset = dataset.map(lambda qw, qs, qc, cw, cs, cc, a: cc) if char_feat_enable == True else None
-    answer_dataset = dataset.map(lambda qw, qs, qc, cw, cs, cc, a: a)
+    context_tfrecord_file_list = get_tfrecord_shard_file(context_tfrecord_file, num_shard)
+    context_dataset = _create_tfrecord_dataset(context_tfrecord_file_list, compression_type)
+    context_dataset = context_dataset.map(parse_context_example, num_parallel_calls=num_parallel)
+    context_dataset = context_dataset.batch(batch_size=max(context_size, 1))
+    context_data = create_data_store(tf.contrib.data.get_single_element(context_dataset))
+    
+    return dataset, context_data
+
+def get_tfrecord_shard_file(tfrecord_file,
+                            num_shard):
+    """get tfrecord shard file list for tfrecord file"""
+    return ["{0}-{1:05d}-of-{2:05d}".format(tfrecord_file, i, num_shard) for i in range(num_shard)]
+
+def _create_tfrecord_dataset(tfrecord_file_list,
+                             compression_type):
+    """create dataset reading tfrecord shards in parallel, records are written round-robin so interleaving keeps order"""
+    dataset = tf.data.Dataset.from_tensor_slices(tfrecord_file_list)
+    dataset = dataset.apply(tf.contrib.data.parallel_interleave(
+        lambda tfrecord_file: tf.data.TFRecordDataset(tfrecord_file, compression_type=compression_type),
+        cycle_length=len(tfrecord_file_list), block_length=1, sloppy=False))
     
-    return (question_word_dataset, question_subword_dataset, question_char_dataset,
-        context_word_dataset, context_subword_dataset, context_char_dataset, answer_dataset)
+    return dataset
 
 def create_tfrecord_file(tfrecord_file,
+                         context_tfrecord_file,
                          input_question_word,
                          input_question_subword,
                          input_question_char,
                          input_context_word,
                          input_context_subword,
                          input_context_char,
+                         input_context_index,
                          input_answer,
                          word_feat_enable,
                          subword_feat_enable,
-                         char_feat_enable):
-    """create tfrecord file"""
-    data_size = len(input_answer)
+                         char_feat_enable,
+                         num_shard=1,
+                         compression_type="",
+                         num_parallel=1,
+                         process_pool=None):
+    """create sharded tfrecord file for questions & answers and sharded context tfrecord file for unique contexts"""
+    question_feature = {}
+    context_feature = {}
+    
+    if word_feat_enable == True:
+        question_feature['question_word'] = input_question_word
+        context_feature['context_word'] = input_context_word
+    
+    if subword_feat_enable == True:
+        question_feature['question_subword'] = input_question_subword
+        context_feature['context_subword'] = input_context_subword
+    
+    if char_feat_enable == True:
+        question_feature['question_char'] = input_question_char
+        context_feature['context_char'] = input_context_char
+    
+    question_feature['context_index'] = input_context_index
+    question_feature['answer'] = input_answer
+    
+    """record i is written to shard i % num_shard, so each shard holds a strided view of data"""
+    shard_task_list = []
+    for output_file, feature_data in [(tfrecord_file, question_feature), (context_tfrecord_file, context_feature)]:
+        for i, tfrecord_shard_file in enumerate(get_tfrecord_shard_file(output_file, num_shard)):
+            shard_data = { name: data[i::num_shard] for name, data in feature_data.items() }
+            shard_task_list.append((tfrecord_shard_file, compression_type, shard_data))
+    
+    if process_pool is not None or num_parallel > 1:
+        pool = process_pool if process_pool is not None else ProcessPool(min(num_parallel, len(shard_task_list)))
+        try:
+            pool.map(_write_tfrecord_shard, shard_task_list)
+        finally:
+            if pool is not process_pool:
+                pool.close()
+    else:
+        for shard_task in shard_task_list:
+            _write_tfrecord_shard(shard_task)
+    
+    """dtype of raw bytes is needed to decode feature data"""
+    feature_dtype = { name: np.dtype(_get_storage_dtype(data)).name
+        for feature_data in [question_feature, context_feature] for name, data in feature_data.items() if data.ndim > 1 }
     
-    with tf.python_io.TFRecordWriter(tfrecord_file) as writer:
-        for i in range(data_size):
-            feature = {}
+    return feature_dtype
 
-            if word_feat_enable == True:
-                question_word = input_question_word[i].tostring()
-                context_word = input_context_word[i].tostring()
-                feature['question_word'] = tf.train.Feature(bytes_list=tf.train.BytesList(value=[question_word]))
-                feature['context_word'] = tf.train.Feature(bytes_list=tf.train.BytesList(value=[context_word]))
+def generate_dataset_from_mmap(mmap_dir,
+                               word_feat_enable,
+                               subword_feat_enable,
+                               char_feat_enable,
+                               num_parallel,
+                               read_size=1024):
+    """generate dataset from memory-mapped npy file"""
+    feat_name_list = [feat_name for feat_name, feat_enable in [("word", word_feat_enable),
+        ("subword", subword_feat_enable), ("char", char_feat_enable)] if feat_enable == True]
+    question_name_list = ["question_{0}".format(feat_name) for feat_name in feat_name_list]
+    context_name_list = ["context_{0}".format(feat_name) for feat_name in feat_name_list]
+    data_name_list = question_name_list + context_name_list + ["answer"]
+    
+    mmap_data = { data_name: np.load(get_mmap_file(mmap_dir, data_name), mmap_mode="r")
+        for data_name in data_name_list + ["context_index"] }
+    data_size = mmap_data["context_index"].shape[0]
+    
+    def read_mmap(read_start):
+        """read contiguous range of examples from memory-mapped file, context features are gathered by context index"""
+        read_end = min(read_start + read_size, data_size)
+        context_index = np.asarray(mmap_data["context_index"][read_start:read_end])
+        read_data = [np.asarray(mmap_data[data_name][context_index]) if data_name in context_name_list
+            else np.asarray(mmap_data[data_name][read_start:read_end]) for data_name in data_name_list]
+        
+        return read_data
+    
+    def parse_mmap(read_start):
+        """parse range of examples into feature dict, stored ids are kept narrow until widened after batching"""
+        read_data = tf.py_func(read_mmap, [read_start],
+            [tf.as_dtype(mmap_data[data_name].dtype) for data_name in data_name_list], stateful=False)
+        
+        data_tensor = {}
+        for data_name, read_tensor in zip(data_name_list, read_data):
+            read_tensor.set_shape([None] + list(mmap_data[data_name].shape[1:]))
+            data_tensor[data_name] = read_tensor
+        
+        return {
+            "question": { feat_name: data_tensor["question_{0}".format(feat_name)] for feat_name in feat_name_list },
+            "context": { feat_name: data_tensor["context_{0}".format(feat_name)] for feat_name in feat_name_list },
+            "answer": data_tensor["answer"]
+        }
+    
+    dataset = tf.data.Dataset.range(0, data_size, read_size)
+    dataset = dataset.map(parse_mmap, num_parallel_calls=num_parallel)
+    dataset = dataset.apply(tf.contrib.data.unbatch())
+    
+    return dataset
 
-            if subword_feat_enable == True:
-                question_subword = input_question_subword[i].tostring()
-                context_subword = input_context_subword[i].tostring()
-                feature['question_subword'] = tf.train.Feature(bytes_list=tf.train.BytesList(value=[question_subword]))
-                feature['context_subword'] = tf.train.Feature(bytes_list=tf.train.BytesList(value=[context_subword]))
+def get_mmap_file(mmap_dir,
+                  data_name):
+    """get memory-mapped npy file for data"""
+    return os.path.join(mmap_dir, "{0}.npy".format(data_name))
 
-            if char_feat_enable == True:
-                question_char = input_question_char[i].tostring()
-                context_char = input_context_char[i].tostring()
-                feature['question_char'] = tf.train.Feature(bytes_list=tf.train.BytesList(value=[question_char]))
-                feature['context_char'] = tf.train.Feature(bytes_list=tf.train.BytesList(value=[context_char]))
-            
-            answer = input_answer[i].tostring()
-            feature['answer'] = tf.train.Feature(bytes_list=tf.train.BytesList(value=[answer]))
+def create_mmap_file(mmap_dir,
+                     input_question_word,
+                     input_question_subword,
+                     input_question_char,
+                     input_context_word,
+                     input_context_subword,
+                     input_context_char,
+                     input_context_index,
+                     input_answer,
+                     word_feat_enable,
+                     subword_feat_enable,
+                     char_feat_enable,
+                     enable_int16=False):
+    """create memory-mapped npy file for each input data, ids are stored as int16 when all of them fit"""
+    mmap_data = [
+        ("question_word", input_question_word if word_feat_enable == True else None),
+        ("question_subword", input_question_subword if subword_feat_enable == True else None),
+        ("question_char", input_question_char if char_feat_enable == True else None),
+        ("context_word", input_context_word if word_feat_enable == True else None),
+        ("context_subword", input_context_subword if subword_feat_enable == True else None),
+        ("context_char", input_context_char if char_feat_enable == True else None),
+        ("context_index", input_context_index),
+        ("answer", input_answer)
+    ]
+    
+    int16_info = np.iinfo(np.int16)
+    for data_name, data in mmap_data:
+        if data is None:
+            continue
+        
+        data_dtype = _get_storage_dtype(data) if data_name != "context_index" else np.int32
+        if (enable_int16 == True and data_dtype == np.int32 and data_name != "context_index" and data.size > 0 and
+            data.min() >= int16_info.min and data.max() <= int16_info.max):
+            data_dtype = np.int16
+        
+        np.save(get_mmap_file(mmap_dir, data_name), data.astype(data_dtype))
+
+def create_cache_key(input_file_list,
+                     cache_setting):
+    """create content-addressed cache key from content of input files and cache setting"""
+    cache_hash = hashlib.sha1()
+    for input_file in input_file_list:
+        if input_file and os.path.exists(input_file):
+            with open(input_file, "rb") as file:
+                for data_block in iter(lambda: file.read(1 << 20), b""):
+                    cache_hash.update(data_block)
+        else:
+            cache_hash.update(b"<none>")
+        
+        cache_hash.update(b"<eof>")
+    
+    cache_hash.update(json.dumps(cache_setting, sort_keys=True).encode("utf-8"))
+    return cache_hash.hexdigest()
+
+def create_tfrecord_manifest(manifest_file,
+                             manifest):
+    """create tfrecord manifest file, manifest is written last and marks a complete tfrecord cache"""
+    manifest_temp_file = "{0}.tmp".format(manifest_file)
+    with open(manifest_temp_file, 'w') as file:
+        json.dump(manifest, file, indent=4, sort_keys=True)
+    
+    os.rename(manifest_temp_file, manifest_file)
 
-            example = tf.train.Example(features=tf.train.Features(feature=feature))
-            writer.write(example.SerializeToString())          
+def load_tfrecord_manifest(manifest_file):
+    """load tfrecord manifest file, return None when tfrecord cache is incomplete"""
+    if not os.path.exists(manifest_file):
+        return None
+    
+    with open(manifest_file, 'r') as file:
+        return json.load(file)
+
+def create_context_index(input_context_data):
+    """create unique context data and per-question index into unique contexts, contexts follow first occurrence"""
+    context_lookup = {}
+    context_data = []
+    context_index = np.empty((len(input_context_data),), dtype=np.int32)
+    for i, context in enumerate(input_context_data):
+        if context not in context_lookup:
+            context_lookup[context] = len(context_data)
+            context_data.append(context)
+        
+        context_index[i] = context_lookup[context]
+    
+    return context_data, context_index
+
+def get_embedding_store_file(embedding_file):
+    """get binary embedding matrix file & embedding vocab file for embedding file"""
+    embedding_matrix_file = "{0}.npy".format(embedding_file)
+    embedding_vocab_file = "{0}.vocab".format(embedding_file)
+    
+    return embedding_matrix_file, embedding_vocab_file
+
+def create_embedding_store(embedding_file,
+                           embedding_vocab,
+                           embedding_matrix):
+    """create binary embedding store with float32 embedding matrix & embedding vocab"""
+    embedding_matrix_file, embedding_vocab_file = get_embedding_store_file(embedding_file)
+    
+    np.save(embedding_matrix_file, np.asarray(embedding_matrix, dtype=np.float32))
+    with open(embedding_vocab_file, 'wb') as file:
+        for vocab in embedding_vocab:
+            file.write("{0}\n".format(vocab).encode('utf-8'))
+
+def convert_embedding_file(embedding_file,
+                           embedding_size):
+    """convert text embedding file to binary embedding store in one streaming pass over raw file"""
+    embedding_matrix_file, embedding_vocab_file = get_embedding_store_file(embedding_file)
+    
+    embedding_vocab = []
+    embedding_line = []
+    embedding_vocab_index = set()
+    with open(embedding_file, 'rb') as file:
+        for i, line in enumerate(file):
+            items = line.decode('utf-8').strip().split(' ')
+            if len(items) != embedding_size + 1:
+                continue
+            word = items[0]
+            if word not in embedding_vocab_index:
+                embedding_vocab_index.add(word)
+                embedding_vocab.append(word)
+                embedding_line.append(i)
+    
+    embedding_matrix_temp_file = "{0}.tmp".format(embedding_matrix_file)
+    embedding_matrix = np.lib.format.open_memmap(embedding_matrix_temp_file, mode='w+',
+        dtype=np.float32, shape=(len(embedding_vocab), embedding_size))
+    with open(embedding_file, 'rb') as file:
+        row = 0
+        for i, line in enumerate(file):
+            if row >= len(embedding_line):
+                break
+            if i != embedding_line[row]:
+                continue
+            items = line.decode('utf-8').strip().split(' ')
+            embedding_matrix[row] = np.asarray(items[1:], dtype=np.float32)
+            row += 1
+    
+    embedding_matrix.flush()
+    del embedding_matrix
+    
+    with open(embedding_vocab_file, 'wb') as file:
+        for vocab in embedding_vocab:
+            file.write("{0}\n".format(vocab).encode('utf-8'))
+    
+    os.rename(embedding_matrix_temp_file, embedding_matrix_file)
 
 def create_embedding_file(embedding_file,
-                          embedding_table):
-    """create embedding file based on embedding table"""
+                          embedding_vocab,
+                          embedding_matrix):
+    """create embedding file based on embedding vocab & embedding matrix"""
     embedding_dir = os.path.dirname(embedding_file)
     if not os.path.exists(embedding_dir):
         os.path.mkdir(embedding_dir)
     
     if not os.path.exists(embedding_file):
         with open(embedding_file, 'wb') as file:
-            for vocab in embedding_table.keys():
-                embed = embedding_table[vocab]
+            for vocab, embed in zip(embedding_vocab, embedding_matrix):
                 embed_str = " ".join(map(str, embed))
                 file.write("{0} {1}\n".format(vocab, embed_str).encode('utf-8'))
+        
+        create_embedding_store(embedding_file, embedding_vocab, embedding_matrix)
 
 def load_embedding_file(embedding_file,
-                        embedding_size,
-                        unk,
-                        pad,
-                        sos,
-                        eos):
-    """load pre-train embeddings from embedding file"""
+                        embedding_size):
+    """load pre-train embeddings from binary embedding store of embedding file, create the store on first load"""
     if os.path.exists(embedding_file):
-        with open(embedding_file, 'rb') as file:
-            embedding = {}
+        embedding_matrix_file, embedding_vocab_file = get_embedding_store_file(embedding_file)
+        if not os.path.exists(embedding_matrix_file) or not os.path.exists(embedding_vocab_file):
+            convert_embedding_file(embedding_file, embedding_size)
+        
+        embedding_matrix = np.load(embedding_matrix_file, mmap_mode='r')
+        if embedding_matrix.ndim != 2 or embedding_matrix.shape[1] != embedding_size:
+            raise ValueError("embedding store {0} has shape {1}, expect embedding size {2}".format(
+                embedding_matrix_file, embedding_matrix.shape, embedding_size))
+        
+        with open(embedding_vocab_file, 'rb') as file:
+            embedding_index = {}
             for line in file:
-                items = line.decode('utf-8').strip().split(' ')
-                if len(items) != embedding_size + 1:
-                    continue
-                word = items[0]
-                vector = [float(x) for x in items[1:]]
-                if word not in embedding:
-                    embedding[word] = vector
-            
-            if unk not in embedding:
-                embedding[unk] = np.random.rand(embedding_size)
-            if pad not in embedding:
-                embedding[pad] = np.random.rand(embedding_size)
-            if sos and sos not in embedding:
-                embedding[sos] = np.random.rand(embedding_size)
-            if eos and eos not in embedding:
-                embedding[eos] = np.random.rand(embedding_size)
-            
-            return embedding
+                word = line.decode('utf-8').rstrip('\n')
+                if word not in embedding_index:
+                    embedding_index[word] = len(embedding_index)
+        
+        if len(embedding_index) != embedding_matrix.shape[0]:
+            raise ValueError("embedding store {0} has {1} rows but {2} words".format(
+                embedding_matrix_file, embedding_matrix.shape[0], len(embedding_index)))
+        
+        return embedding_matrix, embedding_index
     else:
         raise FileNotFoundError("embedding file not found")
 
-def convert_embedding(embedding_lookup):
-    if embedding_lookup is not None:
-        embedding = [v for k,v in embedding_lookup.items()]
-    else:
-        embedding = None
-    
-    return embedding
+def convert_embedding(embedding_matrix,
+                      embedding_index,
+                      vocab_table,
+                      unk,
+                      pad,
+                      sos,
+                      eos):
+    """gather embedding rows of vocab table from embedding matrix, missing special vocab gets random embedding"""
+    if embedding_matrix is None or embedding_index is None:
+        return None, None
+    
+    special_vocab = [vocab for vocab in [unk, pad, sos, eos] if vocab]
+    embedding_vocab = [vocab for vocab in vocab_table if vocab in embedding_index or vocab in special_vocab]
+    embedding_size = embedding_matrix.shape[1]
+    
+    """gather rows in sorted order so that the memory-mapped matrix is read sequentially"""
+    embedding_row = np.asarray([embedding_index.get(vocab, -1) for vocab in embedding_vocab], dtype=np.int64)
+    embedding_valid = embedding_row >= 0
+    embedding = np.empty((len(embedding_vocab), embedding_size), dtype=np.float32)
+    if np.any(embedding_valid):
+        valid_row = embedding_row[embedding_valid]
+        sorted_order = np.argsort(valid_row)
+        valid_embedding = np.empty((len(valid_row), embedding_size), dtype=np.float32)
+        valid_embedding[sorted_order] = embedding_matrix[valid_row[sorted_order]]
+        embedding[embedding_valid] = valid_embedding
+    if not np.all(embedding_valid):
+        embedding[~embedding_valid] = np.random.rand(int(np.sum(~embedding_valid)), embedding_size)
+    
+    return embedding_vocab, embedding
 
 def create_vocab_file(vocab_file,
                       vocab_table):
@@ -712,65 +1223,82 @@ def process_vocab_table(vocab,
     
     return vocab_table, vocab_size, vocab_index, vocab_inverted_index
 
-def create_word_vocab(input_data):
-    """create word vocab from input data"""
-    word_vocab_lookup = {}
-    for sentence in input_data:
-        words = sentence.strip().split(' ')
-        for word in words:
-            word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
-            for word_vocab in word_vocabs:
-                if word_vocab not in word_vocab_lookup:
-                    word_vocab_lookup[word_vocab] = 1
-                else:
-                    word_vocab_lookup[word_vocab] += 1
+def generate_unique_text(*input_data_list):
+    """generate unique text from input data lists lazily, text order follows first occurrence, seen set only references input texts"""
+    seen_text = set()
+    for input_data in input_data_list:
+        for text in input_data:
+            if text in seen_text:
+                continue
+            
+            seen_text.add(text)
+            yield text
+
+def count_word(input_data,
+               num_parallel=1,
+               shard_size=10000,
+               process_pool=None):
+    """count words from streamed input data with multiple processes, word order follows first occurrence"""
+    input_shards = _generate_data_shard(input_data, shard_size)
+    word_count = collections.Counter()
+    if process_pool is not None or num_parallel > 1:
+        pool = process_pool if process_pool is not None else ProcessPool(num_parallel)
+        try:
+            for shard_count in pool.imap(_count_word_shard, input_shards):
+                word_count.update(shard_count)
+        finally:
+            if pool is not process_pool:
+                pool.close()
+    else:
+        for input_shard in input_shards:
+            word_count.update(_count_word_shard(input_shard))
+    
+    return word_count
+
+def create_word_vocab(word_count):
+    """create word vocab from word count"""
+    word_vocab_lookup = collections.Counter()
+    for word, count in word_count.items():
+        word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
+        for word_vocab in word_vocabs:
+            word_vocab_lookup[word_vocab] += count
     
     return word_vocab_lookup
 
-def create_subword_vocab(input_data,
-                         subword_size):
-    """create subword vocab from input data"""
-    def generate_subword(word,
+def _generate_vocab_subword(word,
+                            subword_size):
+    """generate subword for word"""
+    subwords = []
+    chars = list(word)
+    char_length = len(chars)
+    for i in range(char_length-subword_size+1):
+        subword =  ''.join(chars[i:i+subword_size])
+        subwords.append(subword)
+    
+    return subwords
+
+def create_subword_vocab(word_count,
                          subword_size):
-        """generate subword for word"""
-        subwords = []
-        chars = list(word)
-        char_length = len(chars)
-        for i in range(char_length-subword_size+1):
-            subword =  ''.join(chars[i:i+subword_size])
-            subwords.append(subword)
-        
-        return subwords
-    
-    subword_vocab_lookup = {}
-    for sentence in input_data:
-        words = sentence.strip().split(' ')
-        for word in words:
-            word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
-            for word_vocab in word_vocabs:
-                subword_vocabs = generate_subword(word_vocab, subword_size)
-                for subword_vocab in subword_vocabs:
-                    if subword_vocab not in subword_vocab_lookup:
-                        subword_vocab_lookup[subword_vocab] = 1
-                    else:
-                        subword_vocab_lookup[subword_vocab] += 1
+    """create subword vocab from word count"""
+    subword_vocab_lookup = collections.Counter()
+    for word, count in word_count.items():
+        word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
+        for word_vocab in word_vocabs:
+            subword_vocabs = _generate_vocab_subword(word_vocab, subword_size)
+            for subword_vocab in subword_vocabs:
+                subword_vocab_lookup[subword_vocab] += count
     
     return subword_vocab_lookup
 
-def create_char_vocab(input_data):
-    """create char vocab from input data"""
-    char_vocab_lookup = {}
-    for sentence in input_data:
-        words = sentence.strip().split(' ')
-        for word in words:
-            word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
-            for word_vocab in word_vocabs:
-                char_vocabs = list(word_vocab)
-                for char_vocab in char_vocabs:
-                    if char_vocab not in char_vocab_lookup:
-                        char_vocab_lookup[char_vocab] = 1
-                    else:
-                        char_vocab_lookup[char_vocab] += 1
+def create_char_vocab(word_count):
+    """create char vocab from word count"""
+    char_vocab_lookup = collections.Counter()
+    for word, count in word_count.items():
+        word_vocabs = [word, word.lower(), word.capitalize(), word.upper()]
+        for word_vocab in word_vocabs:
+            char_vocabs = list(word_vocab)
+            for char_vocab in char_vocabs:
+                char_vocab_lookup[char_vocab] += count
     
     return char_vocab_lookup
 
@@ -907,24 +1435,45 @@ def prepare_data(logger,
                  char_vocab_threshold,
                  char_unk,
                  char_pad,
-                 char_feat_enable):
+                 char_feat_enable,
+                 num_parallel=1,
+                 process_pool=None):
     """prepare data"""    
     word_embed_data = None
+    word_embed_index = None
     if pretrain_word_embed == True:
         if os.path.exists(word_embed_file):
             logger.log_print("# loading word embeddings from {0}".format(word_embed_file))
-            word_embed_data = load_embedding_file(word_embed_file,
-                word_embed_dim, word_unk, word_pad, word_sos, word_eos)
+            word_embed_data, word_embed_index = load_embedding_file(word_embed_file, word_embed_dim)
         elif os.path.exists(full_word_embed_file):
             logger.log_print("# loading word embeddings from {0}".format(full_word_embed_file))
-            word_embed_data = load_embedding_file(full_word_embed_file,
-                word_embed_dim, word_unk, word_pad, word_sos, word_eos)
+            word_embed_data, word_embed_index = load_embedding_file(full_word_embed_file, word_embed_dim)
         else:
             raise ValueError("{0} or {1} must be provided".format(word_vocab_file, full_word_embed_file))
         
-        word_embed_size = len(word_embed_data) if word_embed_data is not None else 0
+        word_embed_size = len(word_embed_index) if word_embed_index is not None else 0
         logger.log_print("# word embedding table has {0} words".format(word_embed_size))
     
+    word_count = None
+    if input_data is not None and (not os.path.exists(word_vocab_file) or
+        (subword_feat_enable is True and not os.path.exists(subword_vocab_file)) or
+        (char_feat_enable is True and not os.path.exists(char_vocab_file))):
+        logger.log_print("# counting words from input data with {0} processes".format(num_parallel))
+        input_line_count = collections.Counter()
+        def generate_input_line():
+            """generate input line and record number of lines counted"""
+            for line in input_data:
+                input_line_count["line"] += 1
+                yield line
+        
+        start_time = time.time()
+        word_count = count_word(generate_input_line(), num_parallel, process_pool=process_pool)
+        count_time = max(time.time() - start_time, 1e-6)
+        num_line = input_line_count["line"]
+        num_token = sum(word_count.values())
+        logger.log_print("# counted {0} tokens ({1} unique words) from {2} lines in {3:.2f}s, {4:.0f} lines/s, {5:.0f} tokens/s".format(
+            num_token, len(word_count), num_line, count_time, num_line / count_time, num_token / count_time))
+    
     word_vocab = None
     word_vocab_index = None
     word_vocab_inverted_index = None
@@ -933,13 +1482,13 @@ def prepare_data(logger,
         word_vocab = load_vocab_file(word_vocab_file)
         (word_vocab_table, word_vocab_size, word_vocab_index,
             word_vocab_inverted_index) = process_vocab_table(word_vocab, word_vocab_size,
-            word_vocab_threshold, word_embed_data, word_unk, word_pad, word_sos, word_eos)
+            word_vocab_threshold, word_embed_index, word_unk, word_pad, word_sos, word_eos)
     elif input_data is not None:
         logger.log_print("# creating word vocab table from input data")
-        word_vocab = create_word_vocab(input_data)
+        word_vocab = create_word_vocab(word_count)
         (word_vocab_table, word_vocab_size, word_vocab_index,
             word_vocab_inverted_index) = process_vocab_table(word_vocab, word_vocab_size,
-            word_vocab_threshold, word_embed_data, word_unk, word_pad, word_sos, word_eos)
+            word_vocab_threshold, word_embed_index, word_unk, word_pad, word_sos, word_eos)
         logger.log_print("# creating word vocab file {0}".format(word_vocab_file))
         create_vocab_file(word_vocab_file, word_vocab_table)
     else:
@@ -959,7 +1508,7 @@ def prepare_data(logger,
                 subword_vocab_threshold, None, subword_unk, subword_pad, None, None)
         elif input_data is not None:
             logger.log_print("# creating subword vocab table from input data")
-            subword_vocab = create_subword_vocab(input_data, subword_size)
+            subword_vocab = create_subword_vocab(word_count, subword_size)
             (subword_vocab_table, subword_vocab_size, subword_vocab_index,
                 subword_vocab_inverted_index) = process_vocab_table(subword_vocab, subword_vocab_size,
                 subword_vocab_threshold, None, subword_unk, subword_pad, None, None)
@@ -982,7 +1531,7 @@ def prepare_data(logger,
                 char_vocab_threshold, None, char_unk, char_pad, None, None)
         elif input_data is not None:
             logger.log_print("# creating char vocab table from input data")
-            char_vocab = create_char_vocab(input_data)
+            char_vocab = create_char_vocab(word_count)
             (char_vocab_table, char_vocab_size, char_vocab_index,
                 char_vocab_inverted_index) = process_vocab_table(char_vocab, char_vocab_size,
                 char_vocab_threshold, None, char_unk, char_pad, None, None)
@@ -994,13 +1543,12 @@ def prepare_data(logger,
         logger.log_print("# char vocab table has {0} chars".format(char_vocab_size))
     
     if word_embed_data is not None and word_vocab_table is not None:
-        word_embed_data = { k: word_embed_data[k] for k in word_vocab_table if k in word_embed_data }
-        logger.log_print("# word embedding table has {0} words after filtering".format(len(word_embed_data)))
+        word_embed_vocab, word_embed_data = convert_embedding(word_embed_data, word_embed_index,
+            word_vocab_table, word_unk, word_pad, word_sos, word_eos)
+        logger.log_print("# word embedding table has {0} words after filtering".format(len(word_embed_vocab)))
         if not os.path.exists(word_embed_file):
             logger.log_print("# creating word embedding file {0}".format(word_embed_file))
-            create_embedding_file(word_embed_file, word_embed_data)
-        
-        word_embed_data = convert_embedding(word_embed_data)
+            create_embedding_file(word_embed_file, word_embed_vocab, word_embed_data)
     
     return (word_embed_data, word_vocab_size, word_vocab_index, word_vocab_inverted_index,
         subword_vocab_size, subword_vocab_index, subword_vocab_inverted_index,
@@ -1039,7 +1587,9 @@ def prepare_mrc_data(logger,
                      char_vocab_threshold,
                      char_unk,
                      char_pad,
-                     char_feat_enable):
+                     char_feat_enable,
+                     num_parallel=1,
+                     process_pool=None):
     """prepare mrc data"""
     logger.log_print("# loading input mrc data from {0}".format(input_mrc_file))
     (input_mrc_data, input_question_data, input_context_data,
@@ -1062,20 +1612,20 @@ def prepare_mrc_data(logger,
         input_mrc_size = len(input_mrc_data)
         logger.log_print("# input mrc data has {0} lines after validation".format(input_mrc_size))
     
-    input_text_data = set()
-    input_text_data.update(input_question_data)
-    input_text_data.update(input_context_data)
+    """loaded mrc lists are kept for featurization, word counting iterates unique texts over them without a merged copy"""
     if input_answer_type == "text":
-        input_text_data.update(input_answer_data)
+        input_text_data = generate_unique_text(input_question_data, input_context_data, input_answer_data)
+    else:
+        input_text_data = generate_unique_text(input_question_data, input_context_data)
     
-    input_text_data = list(input_text_data)
     (word_embed_data, word_vocab_size, word_vocab_index, word_vocab_inverted_index,
         subword_vocab_size, subword_vocab_index, subword_vocab_inverted_index,
         char_vocab_size, char_vocab_index, char_vocab_inverted_index) = prepare_data(logger, input_text_data,
             word_vocab_file, word_vocab_size, word_vocab_threshold, word_embed_dim, word_embed_file,
             full_word_embed_file, word_unk, word_pad, word_sos, word_eos, word_feat_enable, pretrain_word_embed,
             subword_vocab_file, subword_vocab_size, subword_vocab_threshold, subword_unk, subword_pad, subword_size,
-            subword_feat_enable, char_vocab_file, char_vocab_size, char_vocab_threshold, char_unk, char_pad, char_feat_enable)
+            subword_feat_enable, char_vocab_file, char_vocab_size, char_vocab_threshold, char_unk, char_pad, char_feat_enable,
+            num_parallel, process_pool)
     
     return (input_mrc_data, input_question_data, input_context_data, input_answer_data,
         word_embed_data, word_vocab_size, word_vocab_index, word_vocab_inverted_index,
@@ -0,0 +1,107 @@
+import numpy as np
+
+__all__ = ["decode_span", "decode_span_nbest"]
+
+def _generate_band_index(context_length,
+                         answer_length):
+    """generate band index for start position i and answer offset k, i.e. end position i+k"""
+    band_index = np.arange(context_length)[:,np.newaxis] + np.arange(answer_length)[np.newaxis,:]
+    band_mask = band_index < context_length
+    
+    return band_index, band_mask
+
+def _generate_span_score(answer_start,
+                         answer_start_mask,
+                         answer_end,
+                         answer_end_mask,
+                         context_length,
+                         answer_length):
+    """generate flattened [batch, context * answer] span score, invalid spans are set to -inf"""
+    batch_size = answer_start.shape[0]
+    predict_start = answer_start[:,:context_length] * answer_start_mask[:,:context_length]
+    predict_end = answer_end[:,:context_length] * answer_end_mask[:,:context_length]
+    predict_end = np.pad(predict_end, ((0,0), (0,answer_length-1)), mode="constant")
+    
+    """span score for start i and end i+k is kept in a [batch, context, answer] band instead of a full [batch, context, context] matrix"""
+    band_index, band_mask = _generate_band_index(context_length, answer_length)
+    predict_span = np.expand_dims(predict_start, axis=-1) * predict_end[:,band_index]
+    predict_span = np.where(band_mask, predict_span, float('-inf'))
+    predict_span = predict_span.reshape((batch_size, context_length * answer_length))
+    
+    return predict_span
+
+def decode_span(answer_start,
+                answer_start_mask,
+                answer_end,
+                answer_end_mask,
+                max_context_length,
+                max_answer_length):
+    """decode best answer span for a batch of start/end distributions with banded span score"""
+    batch_size = answer_start.shape[0]
+    context_length = min(answer_start.shape[-1], max_context_length)
+    answer_length = min(max_answer_length, context_length)
+    
+    predict = np.full((batch_size, 2), -1)
+    predict_score = np.full((batch_size,), float('-inf'), dtype=np.float32)
+    if batch_size == 0 or answer_length <= 0:
+        return predict, predict_score
+    
+    predict_span = _generate_span_score(answer_start, answer_start_mask,
+        answer_end, answer_end_mask, context_length, answer_length)
+    
+    """argmax keeps the first maximum in (start, end) order, which matches the original loop on ties"""
+    max_index = np.argmax(predict_span, axis=-1)
+    predict[:,0] = max_index // answer_length
+    predict[:,1] = predict[:,0] + max_index % answer_length
+    predict_score = predict_span[np.arange(batch_size), max_index]
+    
+    return predict, predict_score
+
+def decode_span_nbest(answer_start,
+                      answer_start_mask,
+                      answer_end,
+                      answer_end_mask,
+                      max_context_length,
+                      max_answer_length,
+                      nbest_size):
+    """decode top-k answer spans for a batch of start/end distributions with banded span score"""
+    batch_size = answer_start.shape[0]
+    context_length = min(answer_start.shape[-1], max_context_length)
+    answer_length = min(max_answer_length, context_length)
+    
+    predict_nbest = np.full((batch_size, nbest_size, 2), -1)
+    predict_nbest_score = np.full((batch_size, nbest_size), float('-inf'), dtype=np.float32)
+    if batch_size == 0 or answer_length <= 0 or nbest_size <= 0:
+        return predict_nbest, predict_nbest_score
+    
+    predict_span = _generate_span_score(answer_start, answer_start_mask,
+        answer_end, answer_end_mask, context_length, answer_length)
+    
+    """partial selection of top-k candidates, candidates tied with the k-th score are taken in index order like decode_span"""
+    topk_size = min(nbest_size, predict_span.shape[-1])
+    topk_index = np.argpartition(-predict_span, topk_size-1, axis=-1)[:,:topk_size]
+    kth_score = np.min(np.take_along_axis(predict_span, topk_index, axis=-1), axis=-1, keepdims=True)
+    topk_greater = predict_span > kth_score
+    topk_equal = predict_span == kth_score
+    topk_equal_size = topk_size - np.sum(topk_greater, axis=-1, keepdims=True)
+    topk_select = topk_greater | (topk_equal & (np.cumsum(topk_equal, axis=-1) <= topk_equal_size))
+    topk_index = np.nonzero(topk_select)[1].reshape((batch_size, topk_size))
+    
+    """only the selected k candidates are sorted by (-score, index)"""
+    topk_score = np.take_along_axis(predict_span, topk_index, axis=-1)
+    topk_order = np.lexsort((topk_index, -topk_score), axis=-1)
+    topk_index = np.take_along_axis(topk_index, topk_order, axis=-1)
+    topk_score = np.take_along_axis(topk_score, topk_order, axis=-1)
+    
+    """spans out of band or with masked start/end are invalid"""
+    topk_start = topk_index // answer_length
+    topk_end = topk_start + topk_index % answer_length
+    topk_valid = np.isfinite(topk_score)
+    topk_end = np.where(topk_valid, topk_end, 0)
+    topk_valid = (topk_valid & (np.take_along_axis(answer_start_mask[:,:context_length], topk_start, axis=-1) > 0) &
+        (np.take_along_axis(answer_end_mask[:,:context_length], topk_end, axis=-1) > 0))
+    predict_nbest[:,:topk_size,0] = np.where(topk_valid, topk_start, -1)
+    predict_nbest[:,:topk_size,1] = np.where(topk_valid, topk_end, -1)
+    predict_nbest_score[:,:topk_size] = np.where(topk_valid, topk_score, float('-inf'))
+    
+    return predict_nbest, predict_nbest_score
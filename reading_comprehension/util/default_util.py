@@ -26,10 +26,13 @@ def safe_exp(value):
 def get_config_proto(log_device_placement,
                      allow_soft_placement,
                      allow_growth,
-                     per_process_gpu_memory_fraction):
-    """get config proto for device setting"""
+                     per_process_gpu_memory_fraction,
+                     intra_op_parallelism_threads=0,
+                     inter_op_parallelism_threads=0):
+    """get config proto for device setting, 0 threads lets tensorflow pick based on available cores"""
     config_proto = tf.ConfigProto(log_device_placement=log_device_placement,
-        allow_soft_placement=allow_soft_placement)
+        allow_soft_placement=allow_soft_placement, intra_op_parallelism_threads=intra_op_parallelism_threads,
+        inter_op_parallelism_threads=inter_op_parallelism_threads)
     config_proto.gpu_options.allow_growth = allow_growth
     config_proto.gpu_options.per_process_gpu_memory_fraction = per_process_gpu_memory_fraction
     
@@ -0,0 +1,338 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+
+import numpy as np
+
+__all__ = ["FeatureCache", "ProcessPool", "get_id_dtype"]
+
+def get_id_dtype(max_id):
+    """get smallest integer dtype which holds ids up to max id"""
+    if max_id <= np.iinfo(np.uint8).max:
+        return np.uint8
+    elif max_id <= np.iinfo(np.int16).max:
+        return np.int16
+    else:
+        return np.int32
+
+class FeatureCache(object):
+    """token-level feature cache, each unique token is featurized once into word/subword/char id rows"""
+    def __init__(self,
+                 word_vocab_index,
+                 word_pad,
+                 word_feat_enable,
+                 subword_vocab_index,
+                 subword_max_length,
+                 subword_pad,
+                 subword_size,
+                 subword_feat_enable,
+                 char_vocab_index,
+                 char_max_length,
+                 char_pad,
+                 char_feat_enable,
+                 initial_capacity=1024):
+        """initialize feature cache"""
+        self.word_vocab_index = word_vocab_index
+        self.word_pad = word_pad
+        self.word_feat_enable = word_feat_enable
+        self.subword_vocab_index = subword_vocab_index
+        self.subword_pad = subword_pad
+        self.subword_max_length = subword_max_length
+        self.subword_size = subword_size
+        self.subword_feat_enable = subword_feat_enable
+        self.char_vocab_index = char_vocab_index
+        self.char_pad = char_pad
+        self.char_max_length = char_max_length
+        self.char_feat_enable = char_feat_enable
+        
+        self.word_pad_index = (word_vocab_index[word_pad]
+            if word_feat_enable == True and word_pad in word_vocab_index else 0)
+        self.subword_pad_index = (subword_vocab_index[subword_pad]
+            if subword_feat_enable == True and subword_pad in subword_vocab_index else 0)
+        self.char_pad_index = (char_vocab_index[char_pad]
+            if char_feat_enable == True and char_pad in char_vocab_index else 0)
+        
+        """ids are stored in smallest dtype allowed by vocab size and widened to int32 in graph"""
+        self.word_dtype = (get_id_dtype(max(list(word_vocab_index.values()) + [0]))
+            if word_feat_enable == True else np.int32)
+        self.subword_dtype = (get_id_dtype(max(list(subword_vocab_index.values()) + [0]))
+            if subword_feat_enable == True else np.int32)
+        self.char_dtype = (get_id_dtype(max(list(char_vocab_index.values()) + [0]))
+            if char_feat_enable == True else np.int32)
+        
+        self.token_index = {}
+        self.cache_size = 0
+        self.initial_capacity = initial_capacity
+        self.cache_capacity = initial_capacity
+        self.num_lookup = 0
+        self.num_hit = 0
+        self.word_table = np.zeros((initial_capacity,), dtype=self.word_dtype) if word_feat_enable == True else None
+        self.subword_table = (np.zeros((initial_capacity, subword_max_length), dtype=self.subword_dtype)
+            if subword_feat_enable == True else None)
+        self.char_table = (np.zeros((initial_capacity, char_max_length), dtype=self.char_dtype)
+            if char_feat_enable == True else None)
+    
+    def _grow_table(self):
+        """double capacity of feature tables"""
+        def grow(table):
+            if table is None:
+                return None
+            grown_table = np.zeros((2 * table.shape[0],) + table.shape[1:], dtype=table.dtype)
+            grown_table[:table.shape[0]] = table
+            return grown_table
+        
+        self.word_table = grow(self.word_table)
+        self.subword_table = grow(self.subword_table)
+        self.char_table = grow(self.char_table)
+        self.cache_capacity = 2 * self.cache_capacity
+    
+    def _featurize_token(self,
+                         token,
+                         row):
+        """featurize token into row of feature tables"""
+        if self.word_feat_enable == True:
+            word_index = 0
+            word_vocabs = [token, token.lower(), token.capitalize(), token.upper()]
+            for word_vocab in word_vocabs:
+                if word_vocab in self.word_vocab_index:
+                    word_index = self.word_vocab_index[word_vocab]
+                    break
+            
+            self.word_table[row] = word_index
+        
+        if self.subword_feat_enable == True:
+            subwords = [token[i:i+self.subword_size] for i in range(len(token)-self.subword_size+1)]
+            subwords = subwords[:self.subword_max_length]
+            self.subword_table[row] = self.subword_pad_index
+            for j, subword in enumerate(subwords):
+                self.subword_table[row,j] = self.subword_vocab_index[subword] if subword in self.subword_vocab_index else 0
+        
+        if self.char_feat_enable == True:
+            chars = token[:self.char_max_length]
+            self.char_table[row] = self.char_pad_index
+            for j, char in enumerate(chars):
+                self.char_table[row,j] = self.char_vocab_index[char] if char in self.char_vocab_index else 0
+    
+    def lookup(self,
+               tokens):
+        """look up feature table rows for tokens, featurize tokens not in cache"""
+        token_index = self.token_index
+        rows = np.empty((len(tokens),), dtype=np.int64)
+        for i, token in enumerate(tokens):
+            row = token_index.get(token)
+            if row is None:
+                row = self.cache_size
+                if row >= self.cache_capacity:
+                    self._grow_table()
+                self._featurize_token(token, row)
+                token_index[token] = row
+                self.cache_size += 1
+            else:
+                self.num_hit += 1
+            rows[i] = row
+        
+        self.num_lookup += len(tokens)
+        return rows
+    
+    def create_empty_cache(self):
+        """create empty feature cache with same vocab and setting, e.g. to seed pool workers"""
+        return FeatureCache(self.word_vocab_index, self.word_pad, self.word_feat_enable,
+            self.subword_vocab_index, self.subword_max_length, self.subword_pad, self.subword_size, self.subword_feat_enable,
+            self.char_vocab_index, self.char_max_length, self.char_pad, self.char_feat_enable, self.initial_capacity)
+    
+    def add_lookup_stat(self,
+                        num_lookup,
+                        num_hit):
+        """add token lookup stats of lookups done elsewhere, e.g. in pool workers"""
+        self.num_lookup += num_lookup
+        self.num_hit += num_hit
+    
+    def get_hit_rate(self):
+        """get hit rate of token lookups"""
+        return float(self.num_hit) / self.num_lookup if self.num_lookup > 0 else 0.0
+    
+    def get_memory_size(self):
+        """get approximate memory size in bytes of token index and feature tables"""
+        memory_size = sys.getsizeof(self.token_index) + sum(sys.getsizeof(token) for token in self.token_index)
+        for table in [self.word_table, self.subword_table, self.char_table]:
+            if table is not None:
+                memory_size += table.nbytes
+        
+        return memory_size
+
+def _tokenize_sentence(sentence,
+                       word_max_length,
+                       word_sos,
+                       word_eos,
+                       word_placeholder_enable):
+    """tokenize sentence into words with truncation"""
+    words = sentence.strip().split(' ')
+    if word_placeholder_enable == True:
+        words = [word_sos] + words[:word_max_length] + [word_eos]
+    else:
+        words = words[:word_max_length]
+    
+    return words
+
+def _featurize_src_data(input_data,
+                        feature_cache,
+                        word_max_length,
+                        word_sos,
+                        word_eos,
+                        word_placeholder_enable,
+                        word_only=False):
+    """featurize input data with feature cache and scatter token features into preallocated arrays"""
+    input_words = [_tokenize_sentence(sentence, word_max_length,
+        word_sos, word_eos, word_placeholder_enable) for sentence in input_data]
+    word_max_length = word_max_length + 2 if word_placeholder_enable == True else word_max_length
+    
+    data_size = len(input_words)
+    word_length = np.asarray([len(words) for words in input_words], dtype=np.int64)
+    token_rows = feature_cache.lookup(list(itertools.chain.from_iterable(input_words)))
+    token_sent_index = np.repeat(np.arange(data_size), word_length)
+    token_position = np.arange(len(token_rows)) - np.repeat(np.cumsum(word_length) - word_length, word_length)
+    
+    word_data = None
+    if feature_cache.word_feat_enable == True:
+        word_data = np.full((data_size, word_max_length, 1), feature_cache.word_pad_index, dtype=feature_cache.word_dtype)
+        word_data[token_sent_index, token_position, 0] = feature_cache.word_table[token_rows]
+    
+    subword_data = None
+    if feature_cache.subword_feat_enable == True and word_only == False:
+        subword_data = np.full((data_size, word_max_length, feature_cache.subword_max_length),
+            feature_cache.subword_pad_index, dtype=feature_cache.subword_dtype)
+        subword_data[token_sent_index, token_position] = feature_cache.subword_table[token_rows]
+    
+    char_data = None
+    if feature_cache.char_feat_enable == True and word_only == False:
+        char_data = np.full((data_size, word_max_length, feature_cache.char_max_length),
+            feature_cache.char_pad_index, dtype=feature_cache.char_dtype)
+        char_data[token_sent_index, token_position] = feature_cache.char_table[token_rows]
+    
+    return word_data, subword_data, char_data
+
+class ProcessPool(object):
+    """process pool shared by preprocessing steps of one run"""
+    def __init__(self,
+                 num_parallel):
+        """initialize process pool"""
+        self.num_parallel = num_parallel
+        self.pool = None
+        self.feature_cache_file = {}
+    
+    def _get_pool(self):
+        """get process pool, pool is started on first use"""
+        if self.pool is None:
+            """forkserver is a fresh process without tensorflow threads, it imports main module once and workers are forked from it"""
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["__main__", "util.feature_util"])
+            self.pool = context.Pool(processes=self.num_parallel)
+        
+        return self.pool
+    
+    def imap(self,
+             function,
+             input_data):
+        """apply function to input data in pool workers lazily, output order follows input order"""
+        return self._get_pool().imap(function, input_data)
+    
+    def map(self,
+            function,
+            input_data):
+        """apply function to input data in pool workers"""
+        return self._get_pool().map(function, input_data)
+    
+    def get_feature_cache_file(self,
+                               feature_cache):
+        """dump empty copy of feature cache once per run, each worker loads it on first use and keeps it across tasks"""
+        cache_key = id(feature_cache)
+        if cache_key not in self.feature_cache_file:
+            cache_fd, cache_file = tempfile.mkstemp(suffix=".feature_cache")
+            with os.fdopen(cache_fd, 'wb') as file:
+                pickle.dump(feature_cache.create_empty_cache(), file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.feature_cache_file[cache_key] = (feature_cache, cache_file)
+        
+        return self.feature_cache_file[cache_key][1]
+    
+    def close(self):
+        """close process pool and remove dumped feature caches"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        
+        for _, cache_file in self.feature_cache_file.values():
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+        
+        self.feature_cache_file = {}
+
+_worker_feature_cache = {}
+
+def _featurize_src_shard(shard_task):
+    """featurize input data shard in pool worker, return shard data with lookup stats of this shard"""
+    cache_file, feature_setting, input_shard = shard_task
+    if cache_file not in _worker_feature_cache:
+        with open(cache_file, 'rb') as file:
+            _worker_feature_cache[cache_file] = pickle.load(file)
+    
+    feature_cache = _worker_feature_cache[cache_file]
+    num_lookup = feature_cache.num_lookup
+    num_hit = feature_cache.num_hit
+    shard_data = _featurize_src_data(input_shard, feature_cache, *feature_setting)
+    
+    return shard_data, feature_cache.num_lookup - num_lookup, feature_cache.num_hit - num_hit
+
+def _count_word_shard(input_data):
+    """count words for a shard of input data"""
+    word_count = collections.Counter()
+    for sentence in input_data:
+        word_count.update(sentence.strip().split(' '))
+    
+    return word_count
+
+def _generate_data_shard(input_data,
+                         shard_size):
+    """generate shards of input data without materializing the whole input"""
+    input_iterator = iter(input_data)
+    while True:
+        input_shard = list(itertools.islice(input_iterator, shard_size))
+        if not input_shard:
+            break
+        
+        yield input_shard
+
+def _get_storage_dtype(data):
+    """get dtype in which feature data is stored, narrow id dtype is kept and others are stored as int32"""
+    if data.dtype in [np.uint8, np.int16]:
+        return data.dtype
+    
+    return np.int32
+
+def _write_tfrecord_shard(shard_task):
+    """write tfrecord shard, 1-d feature data is stored as int64 and other feature data as raw bytes of its narrow dtype"""
+    tfrecord_shard_file, compression_type, feature_data = shard_task
+    feature_data = { name: np.asarray(data, dtype=np.int64 if data.ndim == 1 else _get_storage_dtype(data))
+        for name, data in feature_data.items() }
+    data_size = min([len(data) for data in feature_data.values()])
+    
+    """tensorflow is only imported by workers which write tfrecord"""
+    import tensorflow as tf
+    tfrecord_option = tf.python_io.TFRecordOptions(compression_type)
+    with tf.python_io.TFRecordWriter(tfrecord_shard_file, options=tfrecord_option) as writer:
+        for i in range(data_size):
+            feature = {}
+            for name, data in feature_data.items():
+                if data.ndim == 1:
+                    feature[name] = tf.train.Feature(int64_list=tf.train.Int64List(value=[data[i]]))
+                else:
+                    feature[name] = tf.train.Feature(bytes_list=tf.train.BytesList(value=[data[i].tostring()]))
+            
+            example = tf.train.Example(features=tf.train.Features(feature=feature))
+            writer.write(example.SerializeToString())
+    
+    return data_size
@@ -25,7 +25,6 @@ def create_dropout_layer(dropout,
 def create_embedding_layer(vocab_size,
                            embed_dim,
                            pretrained,
-                           embedding,
                            num_gpus,
                            default_gpu_id,
                            regularizer,
@@ -33,7 +32,7 @@ def create_embedding_layer(vocab_size,
                            trainable):
     """create embedding layer"""
     if pretrained == True:
-        embed_layer = PretrainedEmbedding(vocab_size=vocab_size, embed_dim=embed_dim, embedding=embedding,
+        embed_layer = PretrainedEmbedding(vocab_size=vocab_size, embed_dim=embed_dim,
             num_gpus=num_gpus, default_gpu_id=default_gpu_id, regularizer=regularizer, trainable=trainable)
     else:
         embed_layer = Embedding(vocab_size=vocab_size, embed_dim=embed_dim,
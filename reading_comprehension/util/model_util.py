@@ -1,5 +1,6 @@
 import collections
 import os.path
+import time
 
 import numpy as np
 import tensorflow as tf
@@ -10,25 +11,31 @@ from model.rnet import *
 from util.data_util import *
 
 __all__ = ["TrainModel", "InferModel",
-           "create_train_model", "create_infer_model",
-           "init_model", "load_model"]
+           "create_train_model", "create_infer_model", "log_feature_cache",
+           "init_model", "load_model", "fetch_model_variable", "assign_model_variable"]
 
 class TrainModel(collections.namedtuple("TrainModel",
     ("graph", "model", "data_pipeline", "word_embedding", "input_data",
      "input_question", "input_question_word", "input_question_subword", "input_question_char",
-     "input_context", "input_context_word", "input_context_subword", "input_context_char", "input_answer"))):
+     "input_context", "input_context_word", "input_context_subword", "input_context_char", "input_context_index",
+     "input_answer", "feature_cache"))):
     pass
 
 class InferModel(collections.namedtuple("InferModel",
     ("graph", "model", "data_pipeline", "word_embedding", "input_data",
      "input_question", "input_question_word", "input_question_subword", "input_question_char",
-     "input_context", "input_context_word", "input_context_subword", "input_context_char", "input_answer"))):
+     "input_context", "input_context_word", "input_context_subword", "input_context_char", "input_context_index",
+     "input_answer", "feature_cache"))):
     pass
 
 def create_train_model(logger,
-                       hyperparams):
+                       hyperparams,
+                       feature_cache=None):
     graph = tf.Graph()
     with graph.as_default():
+        """one process pool is shared by word counting, featurization and tfrecord writing of this run"""
+        process_pool = ProcessPool(hyperparams.data_num_parallel) if hyperparams.data_num_parallel > 1 else None
+        
         logger.log_print("# prepare train data")
         (input_data, input_question_data, input_context_data, input_answer_data,
              word_embed_data, word_vocab_size, word_vocab_index, word_vocab_inverted_index,
@@ -44,9 +51,19 @@ def create_train_model(logger,
              hyperparams.data_subword_vocab_file, hyperparams.data_subword_vocab_size, hyperparams.data_subword_vocab_threshold, 
              hyperparams.data_subword_unk, hyperparams.data_subword_pad, hyperparams.data_subword_size,                                                  hyperparams.model_representation_subword_feat_enable, hyperparams.data_char_vocab_file,
              hyperparams.data_char_vocab_size, hyperparams.data_char_vocab_threshold, hyperparams.data_char_unk,
-             hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+             hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel,
+             process_pool=process_pool)
         
         external_data = {}
+        dataset_num_parallel = (tf.contrib.data.AUTOTUNE
+            if hyperparams.data_enable_autotune == True else hyperparams.data_num_parallel)
+        
+        if feature_cache is None:
+            feature_cache = FeatureCache(word_vocab_index, hyperparams.data_word_pad,
+                hyperparams.model_representation_word_feat_enable, subword_vocab_index, hyperparams.data_max_subword_length,
+                hyperparams.data_subword_pad, hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable,
+                char_vocab_index, hyperparams.data_max_char_length, hyperparams.data_char_pad,
+                hyperparams.model_representation_char_feat_enable)
         
         word_vocab_tensor_index = (tf.contrib.lookup.index_table_from_tensor(mapping=tf.constant(list(word_vocab_index.keys())),
             default_value=0) if hyperparams.model_representation_word_feat_enable else None)
@@ -55,11 +72,17 @@ def create_train_model(logger,
         char_vocab_tensor_index = (tf.contrib.lookup.index_table_from_tensor(mapping=tf.constant(list(char_vocab_index.keys())),
             default_value=0) if hyperparams.model_representation_char_feat_enable else None)
         
-        if hyperparams.data_pipeline_mode == "tfrecord":
-            if not os.path.exists(hyperparams.data_tfrecord_dir):
-                os.mkdir(hyperparams.data_tfrecord_dir)
+        if hyperparams.data_pipeline_mode in ["tfrecord", "mmap"]:
+            train_cache_key = create_cache_key([hyperparams.data_train_mrc_file, hyperparams.data_word_vocab_file,
+                hyperparams.data_subword_vocab_file, hyperparams.data_char_vocab_file], get_tfrecord_setting(hyperparams, "train"))
+            train_cache_dir = os.path.join(hyperparams.data_tfrecord_dir
+                if hyperparams.data_pipeline_mode == "tfrecord" else hyperparams.data_mmap_dir, train_cache_key)
+            if not os.path.exists(train_cache_dir):
+                os.makedirs(train_cache_dir)
             
-            train_tfrecord_file = os.path.join(hyperparams.data_tfrecord_dir, "train.tfrecord")
+            train_tfrecord_file = os.path.join(train_cache_dir, "train.tfrecord")
+            train_context_tfrecord_file = os.path.join(train_cache_dir, "train.context.tfrecord")
+            train_manifest_file = os.path.join(train_cache_dir, "manifest.json")
             
             input_question_word_data = None
             input_question_subword_data = None
@@ -67,7 +90,9 @@ def create_train_model(logger,
             input_context_word_data = None
             input_context_subword_data = None
             input_context_char_data = None
-            if not os.path.exists(train_tfrecord_file):
+            input_context_index_data = None
+            train_manifest = load_tfrecord_manifest(train_manifest_file)
+            if train_manifest is None:
                 logger.log_print("# create train question data")
                 (input_question_word_data, input_question_subword_data,
                      input_question_char_data) = create_src_data(input_question_data,
@@ -76,37 +101,77 @@ def create_train_model(logger,
                      hyperparams.model_representation_word_feat_enable, subword_vocab_index,
                      hyperparams.data_max_subword_length, hyperparams.data_subword_pad, hyperparams.data_subword_size,
                      hyperparams.model_representation_subword_feat_enable, char_vocab_index, hyperparams.data_max_char_length,
-                     hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+                     hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel,
+                     feature_cache=feature_cache, process_pool=process_pool)
 
                 logger.log_print("# create train context data")
+                input_unique_context_data, input_context_index_data = create_context_index(input_context_data)
+                logger.log_print("# train data has {0} unique contexts for {1} questions".format(
+                    len(input_unique_context_data), len(input_context_data)))
                 (input_context_word_data, input_context_subword_data,
-                     input_context_char_data) = create_src_data(input_context_data,
+                     input_context_char_data) = create_src_data(input_unique_context_data,
                      word_vocab_index, hyperparams.data_max_context_length, hyperparams.data_word_pad,
                      hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
                      hyperparams.model_representation_word_feat_enable, subword_vocab_index, 
                      hyperparams.data_max_subword_length, hyperparams.data_subword_pad, hyperparams.data_subword_size,
                      hyperparams.model_representation_subword_feat_enable, char_vocab_index, hyperparams.data_max_char_length,
-                     hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+                     hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel,
+                     feature_cache=feature_cache, process_pool=process_pool)
 
                 logger.log_print("# create train answer data")
                 input_answer_data = create_trg_data(input_answer_data, hyperparams.data_answer_type,
                     word_vocab_index, hyperparams.data_max_answer_length, hyperparams.data_word_pad,
-                    hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable)
+                    hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
+                    feature_cache=feature_cache)
+                
+                log_feature_cache(logger, feature_cache)
 
-                logger.log_print("# create train tfrecord file")
-                create_tfrecord_file(train_tfrecord_file, input_question_word_data,
-                    input_question_subword_data, input_question_char_data, input_context_word_data, input_context_subword_data,
-                    input_context_char_data, input_answer_data, hyperparams.model_representation_word_feat_enable,
-                    hyperparams.model_representation_subword_feat_enable, hyperparams.model_representation_char_feat_enable)
+                if hyperparams.data_pipeline_mode == "tfrecord":
+                    logger.log_print("# create train tfrecord file")
+                    train_feature_dtype = create_tfrecord_file(train_tfrecord_file, train_context_tfrecord_file, input_question_word_data,
+                        input_question_subword_data, input_question_char_data, input_context_word_data, input_context_subword_data,
+                        input_context_char_data, input_context_index_data, input_answer_data,
+                        hyperparams.model_representation_word_feat_enable, hyperparams.model_representation_subword_feat_enable,
+                        hyperparams.model_representation_char_feat_enable, hyperparams.data_tfrecord_num_shard,
+                        hyperparams.data_tfrecord_compression_type, hyperparams.data_num_parallel,
+                        process_pool=process_pool)
+                else:
+                    logger.log_print("# create train mmap file")
+                    train_feature_dtype = None
+                    create_mmap_file(train_cache_dir, input_question_word_data, input_question_subword_data,
+                        input_question_char_data, input_context_word_data, input_context_subword_data,
+                        input_context_char_data, input_context_index_data, input_answer_data,
+                        hyperparams.model_representation_word_feat_enable, hyperparams.model_representation_subword_feat_enable,
+                        hyperparams.model_representation_char_feat_enable, hyperparams.data_mmap_enable_int16)
+                
+                train_manifest = {
+                    "cache_key": train_cache_key,
+                    "build_time": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+                    "record_size": len(input_answer_data),
+                    "context_size": len(input_unique_context_data),
+                    "feature_dtype": train_feature_dtype,
+                    "setting": get_tfrecord_setting(hyperparams, "train")
+                }
+                create_tfrecord_manifest(train_manifest_file, train_manifest)
+            else:
+                logger.log_print("# reuse train {0} cache {1} built at {2} with {3} records".format(
+                    hyperparams.data_pipeline_mode, train_cache_key, train_manifest["build_time"], train_manifest["record_size"]))
             
-            logger.log_print("# generate train dataset from tfrecord")
-            (input_question_word_dataset, input_question_subword_dataset, input_question_char_dataset,
-                input_context_word_dataset, input_context_subword_dataset, input_context_char_dataset,
-                input_answer_dataset) = generate_dataset_from_tfrecord(train_tfrecord_file,
+            if hyperparams.data_pipeline_mode == "tfrecord":
+                logger.log_print("# generate train dataset from tfrecord")
+                input_dataset, input_context_tensor = generate_dataset_from_tfrecord(train_tfrecord_file, train_context_tfrecord_file,
                     hyperparams.model_representation_word_feat_enable, hyperparams.model_representation_subword_feat_enable,
                     hyperparams.model_representation_char_feat_enable, hyperparams.data_max_question_length,
                     hyperparams.data_max_context_length, hyperparams.data_max_answer_length, hyperparams.data_max_subword_length,
-                    hyperparams.data_max_char_length, hyperparams.data_answer_type, hyperparams.data_num_parallel)
+                    hyperparams.data_max_char_length, hyperparams.data_answer_type, dataset_num_parallel,
+                    hyperparams.data_tfrecord_num_shard, hyperparams.data_tfrecord_compression_type,
+                    train_manifest["context_size"], train_manifest.get("feature_dtype"))
+            else:
+                logger.log_print("# generate train dataset from mmap")
+                input_dataset = generate_dataset_from_mmap(train_cache_dir, hyperparams.model_representation_word_feat_enable,
+                    hyperparams.model_representation_subword_feat_enable, hyperparams.model_representation_char_feat_enable,
+                    dataset_num_parallel)
+                input_context_tensor = None
             
             input_question_placeholder = None
             input_question_word_placeholder = None
@@ -116,6 +181,7 @@ def create_train_model(logger,
             input_context_word_placeholder = None
             input_context_subword_placeholder = None
             input_context_char_placeholder = None
+            input_context_index_placeholder = None
             input_answer_placeholder = None
             
             if word_embed_data is not None:
@@ -128,55 +194,54 @@ def create_train_model(logger,
                  hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable, hyperparams.model_representation_word_feat_enable,
                  subword_vocab_index, hyperparams.data_max_subword_length, hyperparams.data_subword_pad,
                  hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable, char_vocab_index,
-                 hyperparams.data_max_char_length, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+                 hyperparams.data_max_char_length, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable,
+                 hyperparams.data_num_parallel, feature_cache=feature_cache, process_pool=process_pool)
             
             input_question_placeholder = None
             input_question_word_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_question_length, 1], dtype=tf.int32)
+                shape=[None, hyperparams.data_max_question_length, 1], dtype=tf.as_dtype(feature_cache.word_dtype))
                 if hyperparams.model_representation_word_feat_enable else None)
             input_question_subword_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_question_length, hyperparams.data_max_subword_length], dtype=tf.int32)
+                shape=[None, hyperparams.data_max_question_length, hyperparams.data_max_subword_length], dtype=tf.as_dtype(feature_cache.subword_dtype))
                 if hyperparams.model_representation_subword_feat_enable else None)
             input_question_char_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_question_length, hyperparams.data_max_char_length], dtype=tf.int32)
-                if hyperparams.model_representation_char_feat_enable else None)
-            input_question_word_dataset = (tf.data.Dataset.from_tensor_slices(input_question_word_placeholder)
-                if hyperparams.model_representation_word_feat_enable else None)
-            input_question_subword_dataset = (tf.data.Dataset.from_tensor_slices(input_question_subword_placeholder)
-                if hyperparams.model_representation_subword_feat_enable else None)
-            input_question_char_dataset = (tf.data.Dataset.from_tensor_slices(input_question_char_placeholder)
+                shape=[None, hyperparams.data_max_question_length, hyperparams.data_max_char_length], dtype=tf.as_dtype(feature_cache.char_dtype))
                 if hyperparams.model_representation_char_feat_enable else None)
             
             logger.log_print("# create train context dataset")
+            input_unique_context_data, input_context_index_data = create_context_index(input_context_data)
+            logger.log_print("# train data has {0} unique contexts for {1} questions".format(
+                len(input_unique_context_data), len(input_context_data)))
             (input_context_word_data, input_context_subword_data,
-                 input_context_char_data) = create_src_data(input_context_data,
+                 input_context_char_data) = create_src_data(input_unique_context_data,
                  word_vocab_index, hyperparams.data_max_context_length, hyperparams.data_word_pad, hyperparams.data_word_sos,
                  hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable, hyperparams.model_representation_word_feat_enable,
                  subword_vocab_index, hyperparams.data_max_subword_length, hyperparams.data_subword_pad,
                  hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable, char_vocab_index,
-                 hyperparams.data_max_char_length, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+                 hyperparams.data_max_char_length, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable,
+                 hyperparams.data_num_parallel, feature_cache=feature_cache, process_pool=process_pool)
             
             input_context_placeholder = None
             input_context_word_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_context_length, 1], dtype=tf.int32)
+                shape=[None, hyperparams.data_max_context_length, 1], dtype=tf.as_dtype(feature_cache.word_dtype))
                 if hyperparams.model_representation_word_feat_enable else None)
             input_context_subword_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_context_length, hyperparams.data_max_subword_length], dtype=tf.int32)
+                shape=[None, hyperparams.data_max_context_length, hyperparams.data_max_subword_length], dtype=tf.as_dtype(feature_cache.subword_dtype))
                 if hyperparams.model_representation_subword_feat_enable else None)
             input_context_char_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_context_length, hyperparams.data_max_char_length], dtype=tf.int32)
-                if hyperparams.model_representation_char_feat_enable else None)
-            input_context_word_dataset = (tf.data.Dataset.from_tensor_slices(input_context_word_placeholder)
-                if hyperparams.model_representation_word_feat_enable else None)
-            input_context_subword_dataset = (tf.data.Dataset.from_tensor_slices(input_context_subword_placeholder)
-                if hyperparams.model_representation_subword_feat_enable else None)
-            input_context_char_dataset = (tf.data.Dataset.from_tensor_slices(input_context_char_placeholder)
+                shape=[None, hyperparams.data_max_context_length, hyperparams.data_max_char_length], dtype=tf.as_dtype(feature_cache.char_dtype))
                 if hyperparams.model_representation_char_feat_enable else None)
+            input_context_index_placeholder = tf.placeholder(shape=[None], dtype=tf.int32)
+            input_context_tensor = create_data_store(_create_feat_dict(input_context_word_placeholder,
+                input_context_subword_placeholder, input_context_char_placeholder))
             
             logger.log_print("# create train answer dataset")
             input_answer_data = create_trg_data(input_answer_data, hyperparams.data_answer_type,
                 word_vocab_index, hyperparams.data_max_answer_length, hyperparams.data_word_pad,
-                hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable)
+                hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
+                feature_cache=feature_cache)
+            
+            log_feature_cache(logger, feature_cache)
             
             input_answer_placeholder = None
             if hyperparams.data_answer_type == "span":
@@ -184,10 +249,18 @@ def create_train_model(logger,
             elif hyperparams.data_answer_type == "text":
                 input_answer_placeholder = tf.placeholder(shape=[None, hyperparams.data_max_answer_length, 1], dtype=tf.int32)
             
-            input_answer_dataset = (tf.data.Dataset.from_tensor_slices(input_answer_placeholder)
-                if input_answer_placeholder is not None else None)
+            """all features are sliced from placeholders in one dataset, context features are gathered by context index"""
+            input_slice_tensor = {
+                "question": _create_feat_dict(input_question_word_placeholder,
+                    input_question_subword_placeholder, input_question_char_placeholder),
+                "context_index": input_context_index_placeholder
+            }
+            if input_answer_placeholder is not None:
+                input_slice_tensor["answer"] = input_answer_placeholder
+            
+            input_dataset = tf.data.Dataset.from_tensor_slices(create_data_store(input_slice_tensor))
         else:
-            logger.log_print("# create train question dataset")
+            logger.log_print("# create train mrc dataset")
             input_question_word_data = None
             input_question_subword_data = None
             input_question_char_data = None
@@ -195,48 +268,40 @@ def create_train_model(logger,
             input_question_word_placeholder = None
             input_question_subword_placeholder = None
             input_question_char_placeholder = None
-            input_question_dataset = tf.data.Dataset.from_tensor_slices(input_question_placeholder)
-            (input_question_word_dataset, input_question_subword_dataset,
-                 input_question_char_dataset) = create_src_dataset(input_question_dataset,
-                 word_vocab_tensor_index, hyperparams.data_max_question_length, hyperparams.data_word_pad,
-                 hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
-                 hyperparams.model_representation_word_feat_enable, subword_vocab_tensor_index, hyperparams.data_max_subword_length,
-                 hyperparams.data_subword_pad, hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable,
-                 char_vocab_tensor_index, hyperparams.data_max_char_length, hyperparams.data_char_pad,
-                 hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel)
-
-            logger.log_print("# create train context dataset")
             input_context_word_data = None
             input_context_subword_data = None
             input_context_char_data = None
+            input_context_index_data = None
+            input_context_index_placeholder = None
+            input_context_tensor = None
             input_context_placeholder = tf.placeholder(shape=[None], dtype=tf.string)
             input_context_word_placeholder = None
             input_context_subword_placeholder = None
             input_context_char_placeholder = None
-            input_context_dataset = tf.data.Dataset.from_tensor_slices(input_context_placeholder)
-            (input_context_word_dataset, input_context_subword_dataset,
-                 input_context_char_dataset) = create_src_dataset(input_context_dataset,
-                 word_vocab_tensor_index, hyperparams.data_max_context_length, hyperparams.data_word_pad,
-                 hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
-                 hyperparams.model_representation_word_feat_enable, subword_vocab_tensor_index, hyperparams.data_max_subword_length,
-                 hyperparams.data_subword_pad, hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable,
-                 char_vocab_tensor_index, hyperparams.data_max_char_length, hyperparams.data_char_pad,
-                 hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel)
-
-            logger.log_print("# create train answer dataset")
             input_answer_placeholder = tf.placeholder(shape=[None], dtype=tf.string)
-            input_answer_dataset = tf.data.Dataset.from_tensor_slices(input_answer_placeholder)
-            input_answer_dataset = create_trg_dataset(input_answer_dataset,
-                hyperparams.data_answer_type, word_vocab_tensor_index, hyperparams.data_max_answer_length,
-                hyperparams.data_word_pad, hyperparams.data_word_sos, hyperparams.data_word_eos,
-                hyperparams.data_word_placeholder_enable, hyperparams.data_num_parallel)
+            
+            """question/context/answer texts are sliced from one data store and featurized in a single map"""
+            input_dataset = tf.data.Dataset.from_tensor_slices(create_data_store({
+                "question": input_question_placeholder,
+                "context": input_context_placeholder,
+                "answer": input_answer_placeholder
+            }))
+            input_dataset = create_mrc_dataset(input_dataset, hyperparams.data_answer_type,
+                hyperparams.data_max_question_length, hyperparams.data_max_context_length, hyperparams.data_max_answer_length,
+                word_vocab_tensor_index, hyperparams.data_word_pad, hyperparams.data_word_sos, hyperparams.data_word_eos,
+                hyperparams.data_word_placeholder_enable, hyperparams.model_representation_word_feat_enable,
+                subword_vocab_tensor_index, hyperparams.data_max_subword_length, hyperparams.data_subword_pad,
+                hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable,
+                char_vocab_tensor_index, hyperparams.data_max_char_length, hyperparams.data_char_pad,
+                hyperparams.model_representation_char_feat_enable, dataset_num_parallel)
+        
+        if process_pool is not None:
+            process_pool.close()
         
         logger.log_print("# create train data pipeline")
         data_size_placeholder = tf.placeholder(shape=[], dtype=tf.int64)
         batch_size_placeholder = tf.placeholder(shape=[], dtype=tf.int64)
-        data_pipeline = create_data_pipeline(input_question_word_dataset,
-            input_question_subword_dataset, input_question_char_dataset, input_context_word_dataset,
-            input_context_subword_dataset, input_context_char_dataset, input_answer_dataset, hyperparams.data_answer_type,
+        data_pipeline = create_data_pipeline(input_dataset, hyperparams.data_answer_type,
             word_vocab_tensor_index, hyperparams.data_word_pad, hyperparams.model_representation_word_feat_enable,
             subword_vocab_tensor_index, hyperparams.data_subword_pad, hyperparams.model_representation_subword_feat_enable,
             char_vocab_tensor_index, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable,
@@ -244,7 +309,9 @@ def create_train_model(logger,
             input_question_placeholder, input_question_word_placeholder, input_question_subword_placeholder,
             input_question_char_placeholder, input_context_placeholder, input_context_word_placeholder,
             input_context_subword_placeholder, input_context_char_placeholder, input_answer_placeholder,
-            data_size_placeholder, batch_size_placeholder)
+            data_size_placeholder, batch_size_placeholder, input_context_tensor, input_context_index_placeholder,
+            hyperparams.train_enable_bucket, hyperparams.train_bucket_width, hyperparams.train_bucket_token_size,
+            hyperparams.data_enable_autotune)
         
         model_creator = get_model_creator(hyperparams.model_type)
         model = model_creator(logger=logger, hyperparams=hyperparams, data_pipeline=data_pipeline,
@@ -255,12 +322,17 @@ def create_train_model(logger,
             input_question_word=input_question_word_data, input_question_subword=input_question_subword_data,
             input_question_char=input_question_char_data, input_context=input_context_data,
             input_context_word=input_context_word_data, input_context_subword=input_context_subword_data,
-            input_context_char=input_context_char_data, input_answer=input_answer_data)
+            input_context_char=input_context_char_data, input_context_index=input_context_index_data,
+            input_answer=input_answer_data, feature_cache=feature_cache)
 
 def create_infer_model(logger,
-                       hyperparams):
+                       hyperparams,
+                       feature_cache=None):
     graph = tf.Graph()
     with graph.as_default():
+        """one process pool is shared by word counting, featurization and tfrecord writing of this run"""
+        process_pool = ProcessPool(hyperparams.data_num_parallel) if hyperparams.data_num_parallel > 1 else None
+        
         logger.log_print("# prepare infer data")
         (input_data, input_question_data, input_context_data, input_answer_data,
              word_embed_data, word_vocab_size, word_vocab_index, word_vocab_inverted_index,
@@ -276,9 +348,19 @@ def create_infer_model(logger,
              hyperparams.data_subword_vocab_file, hyperparams.data_subword_vocab_size, hyperparams.data_subword_vocab_threshold, 
              hyperparams.data_subword_unk, hyperparams.data_subword_pad, hyperparams.data_subword_size,                                                  hyperparams.model_representation_subword_feat_enable, hyperparams.data_char_vocab_file,
              hyperparams.data_char_vocab_size, hyperparams.data_char_vocab_threshold, hyperparams.data_char_unk,
-             hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+             hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel,
+             process_pool=process_pool)
         
         external_data = {}
+        dataset_num_parallel = (tf.contrib.data.AUTOTUNE
+            if hyperparams.data_enable_autotune == True else hyperparams.data_num_parallel)
+        
+        if feature_cache is None:
+            feature_cache = FeatureCache(word_vocab_index, hyperparams.data_word_pad,
+                hyperparams.model_representation_word_feat_enable, subword_vocab_index, hyperparams.data_max_subword_length,
+                hyperparams.data_subword_pad, hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable,
+                char_vocab_index, hyperparams.data_max_char_length, hyperparams.data_char_pad,
+                hyperparams.model_representation_char_feat_enable)
         
         word_vocab_tensor_index = (tf.contrib.lookup.index_table_from_tensor(mapping=tf.constant(list(word_vocab_index.keys())),
             default_value=0) if hyperparams.model_representation_word_feat_enable else None)
@@ -287,11 +369,17 @@ def create_infer_model(logger,
         char_vocab_tensor_index = (tf.contrib.lookup.index_table_from_tensor(mapping=tf.constant(list(char_vocab_index.keys())),
             default_value=0) if hyperparams.model_representation_char_feat_enable else None)
         
-        if hyperparams.data_pipeline_mode == "tfrecord":
-            if not os.path.exists(hyperparams.data_tfrecord_dir):
-                os.mkdir(hyperparams.data_tfrecord_dir)
-
-            infer_tfrecord_file = os.path.join(hyperparams.data_tfrecord_dir, "infer.tfrecord")
+        if hyperparams.data_pipeline_mode in ["tfrecord", "mmap"]:
+            infer_cache_key = create_cache_key([hyperparams.data_eval_mrc_file, hyperparams.data_word_vocab_file,
+                hyperparams.data_subword_vocab_file, hyperparams.data_char_vocab_file], get_tfrecord_setting(hyperparams, "infer"))
+            infer_cache_dir = os.path.join(hyperparams.data_tfrecord_dir
+                if hyperparams.data_pipeline_mode == "tfrecord" else hyperparams.data_mmap_dir, infer_cache_key)
+            if not os.path.exists(infer_cache_dir):
+                os.makedirs(infer_cache_dir)
+            
+            infer_tfrecord_file = os.path.join(infer_cache_dir, "infer.tfrecord")
+            infer_context_tfrecord_file = os.path.join(infer_cache_dir, "infer.context.tfrecord")
+            infer_manifest_file = os.path.join(infer_cache_dir, "manifest.json")
             
             input_question_word_data = None
             input_question_subword_data = None
@@ -299,7 +387,9 @@ def create_infer_model(logger,
             input_context_word_data = None
             input_context_subword_data = None
             input_context_char_data = None
-            if not os.path.exists(infer_tfrecord_file):               
+            input_context_index_data = None
+            infer_manifest = load_tfrecord_manifest(infer_manifest_file)
+            if infer_manifest is None:
                 logger.log_print("# create infer question data")
                 (input_question_word_data, input_question_subword_data,
                      input_question_char_data) = create_src_data(input_question_data,
@@ -308,37 +398,77 @@ def create_infer_model(logger,
                      hyperparams.model_representation_word_feat_enable, subword_vocab_index,
                      hyperparams.data_max_subword_length, hyperparams.data_subword_pad, hyperparams.data_subword_size,
                      hyperparams.model_representation_subword_feat_enable, char_vocab_index, hyperparams.data_max_char_length,
-                     hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+                     hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel,
+                     feature_cache=feature_cache, process_pool=process_pool)
 
                 logger.log_print("# create infer context data")
+                input_unique_context_data, input_context_index_data = create_context_index(input_context_data)
+                logger.log_print("# infer data has {0} unique contexts for {1} questions".format(
+                    len(input_unique_context_data), len(input_context_data)))
                 (input_context_word_data, input_context_subword_data,
-                     input_context_char_data) = create_src_data(input_context_data,
+                     input_context_char_data) = create_src_data(input_unique_context_data,
                      word_vocab_index, hyperparams.data_max_context_length, hyperparams.data_word_pad,
                      hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
                      hyperparams.model_representation_word_feat_enable, subword_vocab_index, 
                      hyperparams.data_max_subword_length, hyperparams.data_subword_pad, hyperparams.data_subword_size,
                      hyperparams.model_representation_subword_feat_enable, char_vocab_index, hyperparams.data_max_char_length,
-                     hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+                     hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel,
+                     feature_cache=feature_cache, process_pool=process_pool)
 
                 logger.log_print("# create infer answer data")
                 input_answer_data = create_trg_data(input_answer_data, hyperparams.data_answer_type,
                     word_vocab_index, hyperparams.data_max_answer_length, hyperparams.data_word_pad,
-                    hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable)
+                    hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
+                    feature_cache=feature_cache)
+                
+                log_feature_cache(logger, feature_cache)
 
-                logger.log_print("# create infer tfrecord file")
-                create_tfrecord_file(infer_tfrecord_file, input_question_word_data,
-                    input_question_subword_data, input_question_char_data, input_context_word_data, input_context_subword_data,
-                    input_context_char_data, input_answer_data, hyperparams.model_representation_word_feat_enable,
-                    hyperparams.model_representation_subword_feat_enable, hyperparams.model_representation_char_feat_enable)
+                if hyperparams.data_pipeline_mode == "tfrecord":
+                    logger.log_print("# create infer tfrecord file")
+                    infer_feature_dtype = create_tfrecord_file(infer_tfrecord_file, infer_context_tfrecord_file, input_question_word_data,
+                        input_question_subword_data, input_question_char_data, input_context_word_data, input_context_subword_data,
+                        input_context_char_data, input_context_index_data, input_answer_data,
+                        hyperparams.model_representation_word_feat_enable, hyperparams.model_representation_subword_feat_enable,
+                        hyperparams.model_representation_char_feat_enable, hyperparams.data_tfrecord_num_shard,
+                        hyperparams.data_tfrecord_compression_type, hyperparams.data_num_parallel,
+                        process_pool=process_pool)
+                else:
+                    logger.log_print("# create infer mmap file")
+                    infer_feature_dtype = None
+                    create_mmap_file(infer_cache_dir, input_question_word_data, input_question_subword_data,
+                        input_question_char_data, input_context_word_data, input_context_subword_data,
+                        input_context_char_data, input_context_index_data, input_answer_data,
+                        hyperparams.model_representation_word_feat_enable, hyperparams.model_representation_subword_feat_enable,
+                        hyperparams.model_representation_char_feat_enable, hyperparams.data_mmap_enable_int16)
+                
+                infer_manifest = {
+                    "cache_key": infer_cache_key,
+                    "build_time": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+                    "record_size": len(input_answer_data),
+                    "context_size": len(input_unique_context_data),
+                    "feature_dtype": infer_feature_dtype,
+                    "setting": get_tfrecord_setting(hyperparams, "infer")
+                }
+                create_tfrecord_manifest(infer_manifest_file, infer_manifest)
+            else:
+                logger.log_print("# reuse infer {0} cache {1} built at {2} with {3} records".format(
+                    hyperparams.data_pipeline_mode, infer_cache_key, infer_manifest["build_time"], infer_manifest["record_size"]))
             
-            logger.log_print("# generate infer dataset from tfrecord")
-            (input_question_word_dataset, input_question_subword_dataset, input_question_char_dataset,
-                input_context_word_dataset, input_context_subword_dataset, input_context_char_dataset,
-                input_answer_dataset) = generate_dataset_from_tfrecord(infer_tfrecord_file,
+            if hyperparams.data_pipeline_mode == "tfrecord":
+                logger.log_print("# generate infer dataset from tfrecord")
+                input_dataset, input_context_tensor = generate_dataset_from_tfrecord(infer_tfrecord_file, infer_context_tfrecord_file,
                     hyperparams.model_representation_word_feat_enable, hyperparams.model_representation_subword_feat_enable,
                     hyperparams.model_representation_char_feat_enable, hyperparams.data_max_question_length,
                     hyperparams.data_max_context_length, hyperparams.data_max_answer_length, hyperparams.data_max_subword_length,
-                    hyperparams.data_max_char_length, hyperparams.data_answer_type, hyperparams.data_num_parallel)
+                    hyperparams.data_max_char_length, hyperparams.data_answer_type, dataset_num_parallel,
+                    hyperparams.data_tfrecord_num_shard, hyperparams.data_tfrecord_compression_type,
+                    infer_manifest["context_size"], infer_manifest.get("feature_dtype"))
+            else:
+                logger.log_print("# generate infer dataset from mmap")
+                input_dataset = generate_dataset_from_mmap(infer_cache_dir, hyperparams.model_representation_word_feat_enable,
+                    hyperparams.model_representation_subword_feat_enable, hyperparams.model_representation_char_feat_enable,
+                    dataset_num_parallel)
+                input_context_tensor = None
             
             input_question_placeholder = None
             input_question_word_placeholder = None
@@ -348,6 +478,7 @@ def create_infer_model(logger,
             input_context_word_placeholder = None
             input_context_subword_placeholder = None
             input_context_char_placeholder = None
+            input_context_index_placeholder = None
             input_answer_placeholder = None
             
             if word_embed_data is not None:
@@ -360,55 +491,54 @@ def create_infer_model(logger,
                  hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable, hyperparams.model_representation_word_feat_enable,
                  subword_vocab_index, hyperparams.data_max_subword_length, hyperparams.data_subword_pad,
                  hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable, char_vocab_index,
-                 hyperparams.data_max_char_length, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+                 hyperparams.data_max_char_length, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable,
+                 hyperparams.data_num_parallel, feature_cache=feature_cache, process_pool=process_pool)
             
             input_question_placeholder = None
             input_question_word_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_question_length, 1], dtype=tf.int32)
+                shape=[None, hyperparams.data_max_question_length, 1], dtype=tf.as_dtype(feature_cache.word_dtype))
                 if hyperparams.model_representation_word_feat_enable else None)
             input_question_subword_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_question_length, hyperparams.data_max_subword_length], dtype=tf.int32)
+                shape=[None, hyperparams.data_max_question_length, hyperparams.data_max_subword_length], dtype=tf.as_dtype(feature_cache.subword_dtype))
                 if hyperparams.model_representation_subword_feat_enable else None)
             input_question_char_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_question_length, hyperparams.data_max_char_length], dtype=tf.int32)
-                if hyperparams.model_representation_char_feat_enable else None)
-            input_question_word_dataset = (tf.data.Dataset.from_tensor_slices(input_question_word_placeholder)
-                if hyperparams.model_representation_word_feat_enable else None)
-            input_question_subword_dataset = (tf.data.Dataset.from_tensor_slices(input_question_subword_placeholder)
-                if hyperparams.model_representation_subword_feat_enable else None)
-            input_question_char_dataset = (tf.data.Dataset.from_tensor_slices(input_question_char_placeholder)
+                shape=[None, hyperparams.data_max_question_length, hyperparams.data_max_char_length], dtype=tf.as_dtype(feature_cache.char_dtype))
                 if hyperparams.model_representation_char_feat_enable else None)
             
             logger.log_print("# create infer context dataset")
+            input_unique_context_data, input_context_index_data = create_context_index(input_context_data)
+            logger.log_print("# infer data has {0} unique contexts for {1} questions".format(
+                len(input_unique_context_data), len(input_context_data)))
             (input_context_word_data, input_context_subword_data,
-                 input_context_char_data) = create_src_data(input_context_data,
+                 input_context_char_data) = create_src_data(input_unique_context_data,
                  word_vocab_index, hyperparams.data_max_context_length, hyperparams.data_word_pad, hyperparams.data_word_sos,
                  hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable, hyperparams.model_representation_word_feat_enable,
                  subword_vocab_index, hyperparams.data_max_subword_length, hyperparams.data_subword_pad,
                  hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable, char_vocab_index,
-                 hyperparams.data_max_char_length, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable)
+                 hyperparams.data_max_char_length, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable,
+                 hyperparams.data_num_parallel, feature_cache=feature_cache, process_pool=process_pool)
             
             input_context_placeholder = None
             input_context_word_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_context_length, 1], dtype=tf.int32)
+                shape=[None, hyperparams.data_max_context_length, 1], dtype=tf.as_dtype(feature_cache.word_dtype))
                 if hyperparams.model_representation_word_feat_enable else None)
             input_context_subword_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_context_length, hyperparams.data_max_subword_length], dtype=tf.int32)
+                shape=[None, hyperparams.data_max_context_length, hyperparams.data_max_subword_length], dtype=tf.as_dtype(feature_cache.subword_dtype))
                 if hyperparams.model_representation_subword_feat_enable else None)
             input_context_char_placeholder = (tf.placeholder(
-                shape=[None, hyperparams.data_max_context_length, hyperparams.data_max_char_length], dtype=tf.int32)
-                if hyperparams.model_representation_char_feat_enable else None)
-            input_context_word_dataset = (tf.data.Dataset.from_tensor_slices(input_context_word_placeholder)
-                if hyperparams.model_representation_word_feat_enable else None)
-            input_context_subword_dataset = (tf.data.Dataset.from_tensor_slices(input_context_subword_placeholder)
-                if hyperparams.model_representation_subword_feat_enable else None)
-            input_context_char_dataset = (tf.data.Dataset.from_tensor_slices(input_context_char_placeholder)
+                shape=[None, hyperparams.data_max_context_length, hyperparams.data_max_char_length], dtype=tf.as_dtype(feature_cache.char_dtype))
                 if hyperparams.model_representation_char_feat_enable else None)
+            input_context_index_placeholder = tf.placeholder(shape=[None], dtype=tf.int32)
+            input_context_tensor = create_data_store(_create_feat_dict(input_context_word_placeholder,
+                input_context_subword_placeholder, input_context_char_placeholder))
             
             logger.log_print("# create infer answer dataset")
             input_answer_data = create_trg_data(input_answer_data, hyperparams.data_answer_type,
                 word_vocab_index, hyperparams.data_max_answer_length, hyperparams.data_word_pad,
-                hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable)
+                hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
+                feature_cache=feature_cache)
+            
+            log_feature_cache(logger, feature_cache)
             
             input_answer_placeholder = None
             if hyperparams.data_answer_type == "span":
@@ -416,10 +546,18 @@ def create_infer_model(logger,
             elif hyperparams.data_answer_type == "text":
                 input_answer_placeholder = tf.placeholder(shape=[None, hyperparams.data_max_answer_length, 1], dtype=tf.int32)
             
-            input_answer_dataset = (tf.data.Dataset.from_tensor_slices(input_answer_placeholder)
-                if input_answer_placeholder is not None else None)
+            """all features are sliced from placeholders in one dataset, context features are gathered by context index"""
+            input_slice_tensor = {
+                "question": _create_feat_dict(input_question_word_placeholder,
+                    input_question_subword_placeholder, input_question_char_placeholder),
+                "context_index": input_context_index_placeholder
+            }
+            if input_answer_placeholder is not None:
+                input_slice_tensor["answer"] = input_answer_placeholder
+            
+            input_dataset = tf.data.Dataset.from_tensor_slices(create_data_store(input_slice_tensor))
         else:
-            logger.log_print("# create infer question dataset")
+            logger.log_print("# create infer mrc dataset")
             input_question_word_data = None
             input_question_subword_data = None
             input_question_char_data = None
@@ -427,55 +565,67 @@ def create_infer_model(logger,
             input_question_word_placeholder = None
             input_question_subword_placeholder = None
             input_question_char_placeholder = None
-            input_question_dataset = tf.data.Dataset.from_tensor_slices(input_question_placeholder)
-            (input_question_word_dataset, input_question_subword_dataset,
-                 input_question_char_dataset) = create_src_dataset(input_question_dataset,
-                 word_vocab_tensor_index, hyperparams.data_max_question_length, hyperparams.data_word_pad,
-                 hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
-                 hyperparams.model_representation_word_feat_enable, subword_vocab_tensor_index, hyperparams.data_max_subword_length,
-                 hyperparams.data_subword_pad, hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable,
-                 char_vocab_tensor_index, hyperparams.data_max_char_length, hyperparams.data_char_pad,
-                 hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel)
-
-            logger.log_print("# create infer context dataset")
             input_context_word_data = None
             input_context_subword_data = None
             input_context_char_data = None
+            input_context_index_data = None
+            input_context_index_placeholder = None
+            input_context_tensor = None
             input_context_placeholder = tf.placeholder(shape=[None], dtype=tf.string)
             input_context_word_placeholder = None
             input_context_subword_placeholder = None
             input_context_char_placeholder = None
-            input_context_dataset = tf.data.Dataset.from_tensor_slices(input_context_placeholder)
-            (input_context_word_dataset, input_context_subword_dataset,
-                 input_context_char_dataset) = create_src_dataset(input_context_dataset,
-                 word_vocab_tensor_index, hyperparams.data_max_context_length, hyperparams.data_word_pad,
-                 hyperparams.data_word_sos, hyperparams.data_word_eos, hyperparams.data_word_placeholder_enable,
-                 hyperparams.model_representation_word_feat_enable, subword_vocab_tensor_index, hyperparams.data_max_subword_length,
-                 hyperparams.data_subword_pad, hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable,
-                 char_vocab_tensor_index, hyperparams.data_max_char_length, hyperparams.data_char_pad,
-                 hyperparams.model_representation_char_feat_enable, hyperparams.data_num_parallel)
-
-            logger.log_print("# create infer answer dataset")
             input_answer_placeholder = tf.placeholder(shape=[None], dtype=tf.string)
-            input_answer_dataset = tf.data.Dataset.from_tensor_slices(input_answer_placeholder)
-            input_answer_dataset = create_trg_dataset(input_answer_dataset,
-                hyperparams.data_answer_type, word_vocab_tensor_index, hyperparams.data_max_answer_length,
-                hyperparams.data_word_pad, hyperparams.data_word_sos, hyperparams.data_word_eos,
-                hyperparams.data_word_placeholder_enable, hyperparams.data_num_parallel)
+            
+            """question/context/answer texts are sliced from one data store and featurized in a single map"""
+            input_dataset = tf.data.Dataset.from_tensor_slices(create_data_store({
+                "question": input_question_placeholder,
+                "context": input_context_placeholder,
+                "answer": input_answer_placeholder
+            }))
+            input_dataset = create_mrc_dataset(input_dataset, hyperparams.data_answer_type,
+                hyperparams.data_max_question_length, hyperparams.data_max_context_length, hyperparams.data_max_answer_length,
+                word_vocab_tensor_index, hyperparams.data_word_pad, hyperparams.data_word_sos, hyperparams.data_word_eos,
+                hyperparams.data_word_placeholder_enable, hyperparams.model_representation_word_feat_enable,
+                subword_vocab_tensor_index, hyperparams.data_max_subword_length, hyperparams.data_subword_pad,
+                hyperparams.data_subword_size, hyperparams.model_representation_subword_feat_enable,
+                char_vocab_tensor_index, hyperparams.data_max_char_length, hyperparams.data_char_pad,
+                hyperparams.model_representation_char_feat_enable, dataset_num_parallel)
+        
+        infer_cache_file = None
+        if hyperparams.data_infer_enable_cache == True:
+            infer_cache_setting = get_tfrecord_setting(hyperparams, "infer")
+            infer_cache_setting["data_pipeline_mode"] = hyperparams.data_pipeline_mode
+            infer_cache_setting["train_eval_batch_size"] = hyperparams.train_eval_batch_size
+            infer_cache_key = create_cache_key([hyperparams.data_eval_mrc_file, hyperparams.data_word_vocab_file,
+                hyperparams.data_subword_vocab_file, hyperparams.data_char_vocab_file], infer_cache_setting)
+            infer_cache_dir = os.path.join(hyperparams.data_infer_cache_dir, infer_cache_key)
+            if not os.path.exists(infer_cache_dir):
+                os.makedirs(infer_cache_dir)
+            
+            """batches are cached to file on first evaluation and replayed on later ones, partial cache is discarded"""
+            infer_cache_file = os.path.join(infer_cache_dir, "infer.cache")
+            if not tf.gfile.Exists("{0}.index".format(infer_cache_file)):
+                for cache_file in tf.gfile.Glob("{0}*".format(infer_cache_file)):
+                    tf.gfile.Remove(cache_file)
+            
+            logger.log_print("# cache infer batches in {0}".format(infer_cache_file))
+        
+        if process_pool is not None:
+            process_pool.close()
         
         logger.log_print("# create infer data pipeline")
         data_size_placeholder = tf.placeholder(shape=[], dtype=tf.int64)
         batch_size_placeholder = tf.placeholder(shape=[], dtype=tf.int64)
-        data_pipeline = create_data_pipeline(input_question_word_dataset,
-            input_question_subword_dataset, input_question_char_dataset, input_context_word_dataset,
-            input_context_subword_dataset, input_context_char_dataset, input_answer_dataset, hyperparams.data_answer_type,
+        data_pipeline = create_data_pipeline(input_dataset, hyperparams.data_answer_type,
             word_vocab_tensor_index, hyperparams.data_word_pad, hyperparams.model_representation_word_feat_enable,
             subword_vocab_tensor_index, hyperparams.data_subword_pad, hyperparams.model_representation_subword_feat_enable,
             char_vocab_tensor_index, hyperparams.data_char_pad, hyperparams.model_representation_char_feat_enable, False, 0, 0,
             input_question_placeholder, input_question_word_placeholder, input_question_subword_placeholder,
             input_question_char_placeholder, input_context_placeholder, input_context_word_placeholder,
             input_context_subword_placeholder, input_context_char_placeholder, input_answer_placeholder,
-            data_size_placeholder, batch_size_placeholder)
+            data_size_placeholder, batch_size_placeholder, input_context_tensor, input_context_index_placeholder,
+            enable_autotune=hyperparams.data_enable_autotune, cache_file=infer_cache_file)
         
         model_creator = get_model_creator(hyperparams.model_type)
         model = model_creator(logger=logger, hyperparams=hyperparams, data_pipeline=data_pipeline,
@@ -486,7 +636,69 @@ def create_infer_model(logger,
             input_question_word=input_question_word_data, input_question_subword=input_question_subword_data,
             input_question_char=input_question_char_data, input_context=input_context_data,
             input_context_word=input_context_word_data, input_context_subword=input_context_subword_data,
-            input_context_char=input_context_char_data, input_answer=input_answer_data)
+            input_context_char=input_context_char_data, input_context_index=input_context_index_data,
+            input_answer=input_answer_data, feature_cache=feature_cache)
+
+def _create_feat_dict(word_data,
+                      subword_data,
+                      char_data):
+    """create word/subword/char-level feature dict for enabled features"""
+    feat_dict = {}
+    if word_data is not None:
+        feat_dict["word"] = word_data
+    
+    if subword_data is not None:
+        feat_dict["subword"] = subword_data
+    
+    if char_data is not None:
+        feat_dict["char"] = char_data
+    
+    return feat_dict
+
+def get_tfrecord_setting(hyperparams,
+                         data_mode):
+    """get hyperparams which determine content of tfrecord/mmap cache"""
+    return {
+        "data_mode": data_mode,
+        "data_pipeline_mode": hyperparams.data_pipeline_mode,
+        "data_file_type": hyperparams.data_train_mrc_file_type if data_mode == "train" else hyperparams.data_eval_mrc_file_type,
+        "data_answer_type": hyperparams.data_answer_type,
+        "data_expand_multiple_answer": hyperparams.data_expand_multiple_answer,
+        "data_enable_validation": hyperparams.data_enable_validation,
+        "data_max_question_length": hyperparams.data_max_question_length,
+        "data_max_context_length": hyperparams.data_max_context_length,
+        "data_max_answer_length": hyperparams.data_max_answer_length,
+        "data_max_subword_length": hyperparams.data_max_subword_length,
+        "data_max_char_length": hyperparams.data_max_char_length,
+        "data_word_vocab_size": hyperparams.data_word_vocab_size,
+        "data_word_vocab_threshold": hyperparams.data_word_vocab_threshold,
+        "data_word_unk": hyperparams.data_word_unk,
+        "data_word_pad": hyperparams.data_word_pad,
+        "data_word_sos": hyperparams.data_word_sos,
+        "data_word_eos": hyperparams.data_word_eos,
+        "data_word_placeholder_enable": hyperparams.data_word_placeholder_enable,
+        "data_subword_vocab_size": hyperparams.data_subword_vocab_size,
+        "data_subword_vocab_threshold": hyperparams.data_subword_vocab_threshold,
+        "data_subword_unk": hyperparams.data_subword_unk,
+        "data_subword_pad": hyperparams.data_subword_pad,
+        "data_subword_size": hyperparams.data_subword_size,
+        "data_char_vocab_size": hyperparams.data_char_vocab_size,
+        "data_char_vocab_threshold": hyperparams.data_char_vocab_threshold,
+        "data_char_unk": hyperparams.data_char_unk,
+        "data_char_pad": hyperparams.data_char_pad,
+        "data_tfrecord_num_shard": hyperparams.data_tfrecord_num_shard,
+        "data_tfrecord_compression_type": hyperparams.data_tfrecord_compression_type,
+        "data_mmap_enable_int16": hyperparams.data_mmap_enable_int16,
+        "model_representation_word_feat_enable": hyperparams.model_representation_word_feat_enable,
+        "model_representation_subword_feat_enable": hyperparams.model_representation_subword_feat_enable,
+        "model_representation_char_feat_enable": hyperparams.model_representation_char_feat_enable
+    }
+
+def log_feature_cache(logger,
+                      feature_cache):
+    """log size, hit rate and memory use of feature cache"""
+    logger.log_print("# feature cache has {0} tokens, hit rate {1:.4f}, memory {2:.2f}MB".format(feature_cache.cache_size,
+        feature_cache.get_hit_rate(), feature_cache.get_memory_size() / (1024.0 * 1024.0)))
 
 def get_model_creator(model_type):
     if model_type == "bidaf":
@@ -500,11 +712,34 @@ def get_model_creator(model_type):
     
     return model_creator
 
+def _create_data_store_feed_dict(model):
+    """create feed dict which fills data store of model with input data"""
+    data_pipeline = model.data_pipeline
+    data_store_feed = [
+        (data_pipeline.input_question_placeholder, model.input_question),
+        (data_pipeline.input_question_word_placeholder, model.input_question_word),
+        (data_pipeline.input_question_subword_placeholder, model.input_question_subword),
+        (data_pipeline.input_question_char_placeholder, model.input_question_char),
+        (data_pipeline.input_context_placeholder, model.input_context),
+        (data_pipeline.input_context_word_placeholder, model.input_context_word),
+        (data_pipeline.input_context_subword_placeholder, model.input_context_subword),
+        (data_pipeline.input_context_char_placeholder, model.input_context_char),
+        (data_pipeline.input_context_index_placeholder, model.input_context_index),
+        (data_pipeline.input_answer_placeholder, model.input_answer)
+    ]
+    
+    feed_dict = { placeholder: data for placeholder, data in data_store_feed
+        if placeholder is not None and data is not None }
+    
+    return feed_dict
+
 def init_model(sess,
                model):
     with model.graph.as_default():
         sess.run(tf.global_variables_initializer())
+        sess.run(tf.local_variables_initializer(), feed_dict=_create_data_store_feed_dict(model))
         sess.run(tf.tables_initializer())
+        model.model.init_embedding(sess)
 
 def load_model(sess,
                model,
@@ -512,3 +747,21 @@ def load_model(sess,
                ckpt_type):
     with model.graph.as_default():
         model.model.restore(sess, ckpt_file, ckpt_type)
+
+def fetch_model_variable(sess,
+                         model,
+                         variable_name_list):
+    """fetch model variables into host memory by checkpoint name, ema shadows are named as in checkpoint"""
+    with model.graph.as_default():
+        variable_lookup = { variable.op.name: variable for variable in tf.global_variables() }
+        variable_list = [variable_lookup[variable_name] for variable_name in variable_name_list]
+        variable_value_list = sess.run(variable_list)
+    
+    return dict(zip(variable_name_list, variable_value_list))
+
+def assign_model_variable(sess,
+                          model,
+                          variable_value_dict):
+    """assign model variables from host memory by checkpoint name"""
+    with model.graph.as_default():
+        model.model.assign_variable(sess, variable_value_dict)
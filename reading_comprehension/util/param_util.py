@@ -21,6 +21,12 @@ def create_default_hyperparams(config_type):
             data_embedding_file="",
             data_full_embedding_file="",
             data_tfrecord_dir="",
+            data_tfrecord_num_shard=8,
+            data_tfrecord_compression_type="",
+            data_mmap_dir="",
+            data_mmap_enable_int16=False,
+            data_infer_cache_dir="",
+            data_infer_enable_cache=False,
             data_max_question_length=40,
             data_max_context_length=500,
             data_max_answer_length=30,
@@ -50,18 +56,26 @@ def create_default_hyperparams(config_type):
             data_enable_validation=False,
             data_pipeline_mode="tfrecord",
             data_num_parallel=4,
+            data_enable_autotune=False,
             data_log_output_dir="",
             data_result_output_dir="",
             train_random_seed=100,
             train_enable_shuffle=True,
             train_shuffle_buffer_size=30000,
+            train_enable_bucket=False,
+            train_bucket_width=40,
+            train_bucket_token_size=0,
             train_batch_size=60,
             train_eval_batch_size=100,
             train_eval_metric=["exact", "f1"],
             train_eval_detail_type="full",
+            train_eval_enable_async=False,
+            train_eval_async_queue_size=1,
+            train_eval_enable_weight_share=False,
             train_decoding_sample_size=3,
             train_num_epoch=3,
             train_ckpt_output_dir="",
+            train_ckpt_enable_async=False,
             train_summary_output_dir="",
             train_step_per_stat=10,
             train_step_per_ckpt=1000,
@@ -98,6 +112,8 @@ def create_default_hyperparams(config_type):
             train_optimizer_adam_epsilon=1e-08,
             model_type="bidaf",
             model_scope="mrc",
+            model_infer_decode_in_graph=False,
+            model_infer_nbest_size=1,
             model_representation_word_embed_dim=100,
             model_representation_word_embed_pretrained=True,
             model_representation_word_feat_trainable=False,
@@ -197,10 +213,14 @@ def create_default_hyperparams(config_type):
             model_output_answer_end_trainable=True,
             device_num_gpus=1,
             device_default_gpu_id=0,
+            device_num_towers=1,
+            device_enable_tower_trace=False,
             device_log_device_placement=False,
             device_allow_soft_placement=False,
             device_allow_growth=False,
-            device_per_process_gpu_memory_fraction=0.8
+            device_per_process_gpu_memory_fraction=0.8,
+            device_intra_op_parallelism_threads=0,
+            device_inter_op_parallelism_threads=0
         )
     elif config_type == "qanet":
         hyperparams = tf.contrib.training.HParams(
@@ -211,6 +231,12 @@ def create_default_hyperparams(config_type):
             data_embedding_file="",
             data_full_embedding_file="",
             data_tfrecord_dir="",
+            data_tfrecord_num_shard=8,
+            data_tfrecord_compression_type="",
+            data_mmap_dir="",
+            data_mmap_enable_int16=False,
+            data_infer_cache_dir="",
+            data_infer_enable_cache=False,
             data_max_question_length=40,
             data_max_context_length=500,
             data_max_answer_length=30,
@@ -240,18 +266,26 @@ def create_default_hyperparams(config_type):
             data_enable_validation=False,
             data_pipeline_mode="tfrecord",
             data_num_parallel=4,
+            data_enable_autotune=False,
             data_log_output_dir="",
             data_result_output_dir="",
             train_random_seed=100,
             train_enable_shuffle=True,
             train_shuffle_buffer_size=30000,
+            train_enable_bucket=False,
+            train_bucket_width=40,
+            train_bucket_token_size=0,
             train_batch_size=32,
             train_eval_batch_size=100,
             train_eval_metric=["exact", "f1"],
             train_eval_detail_type="full",
+            train_eval_enable_async=False,
+            train_eval_async_queue_size=1,
+            train_eval_enable_weight_share=False,
             train_decoding_sample_size=3,
             train_num_epoch=3,
             train_ckpt_output_dir="",
+            train_ckpt_enable_async=False,
             train_summary_output_dir="",
             train_step_per_stat=10,
             train_step_per_ckpt=1000,
@@ -288,6 +322,8 @@ def create_default_hyperparams(config_type):
             train_optimizer_adam_epsilon=1e-07,
             model_type="qanet",
             model_scope="mrc",
+            model_infer_decode_in_graph=False,
+            model_infer_nbest_size=1,
             model_representation_word_embed_dim=300,
             model_representation_word_dropout=0.1,
             model_representation_word_embed_pretrained=True,
@@ -373,10 +409,14 @@ def create_default_hyperparams(config_type):
             model_output_answer_end_trainable=True,
             device_num_gpus=1,
             device_default_gpu_id=0,
+            device_num_towers=1,
+            device_enable_tower_trace=False,
             device_log_device_placement=False,
             device_allow_soft_placement=False,
             device_allow_growth=False,
-            device_per_process_gpu_memory_fraction=0.8
+            device_per_process_gpu_memory_fraction=0.8,
+            device_intra_op_parallelism_threads=0,
+            device_inter_op_parallelism_threads=0
         )
     elif config_type == "rnet":
         hyperparams = tf.contrib.training.HParams(
@@ -387,6 +427,12 @@ def create_default_hyperparams(config_type):
             data_embedding_file="",
             data_full_embedding_file="",
             data_tfrecord_dir="",
+            data_tfrecord_num_shard=8,
+            data_tfrecord_compression_type="",
+            data_mmap_dir="",
+            data_mmap_enable_int16=False,
+            data_infer_cache_dir="",
+            data_infer_enable_cache=False,
             data_max_question_length=40,
             data_max_context_length=500,
             data_max_answer_length=30,
@@ -416,18 +462,26 @@ def create_default_hyperparams(config_type):
             data_enable_validation=False,
             data_pipeline_mode="tfrecord",
             data_num_parallel=4,
+            data_enable_autotune=False,
             data_log_output_dir="",
             data_result_output_dir="",
             train_random_seed=100,
             train_enable_shuffle=True,
             train_shuffle_buffer_size=30000,
+            train_enable_bucket=False,
+            train_bucket_width=40,
+            train_bucket_token_size=0,
             train_batch_size=64,
             train_eval_batch_size=100,
             train_eval_metric=["exact", "f1"],
             train_eval_detail_type="full",
+            train_eval_enable_async=False,
+            train_eval_async_queue_size=1,
+            train_eval_enable_weight_share=False,
             train_decoding_sample_size=3,
             train_num_epoch=3,
             train_ckpt_output_dir="",
+            train_ckpt_enable_async=False,
             train_summary_output_dir="",
             train_step_per_stat=10,
             train_step_per_ckpt=1000,
@@ -464,6 +518,8 @@ def create_default_hyperparams(config_type):
             train_optimizer_adam_epsilon=1e-08,
             model_type="rnet",
             model_scope="mrc",
+            model_infer_decode_in_graph=False,
+            model_infer_nbest_size=1,
             model_representation_word_embed_dim=300,
             model_representation_word_embed_pretrained=True,
             model_representation_word_feat_trainable=False,
@@ -540,10 +596,14 @@ def create_default_hyperparams(config_type):
             model_output_answer_trainable=True,
             device_num_gpus=1,
             device_default_gpu_id=0,
+            device_num_towers=1,
+            device_enable_tower_trace=False,
             device_log_device_placement=False,
             device_allow_soft_placement=False,
             device_allow_growth=False,
-            device_per_process_gpu_memory_fraction=0.8
+            device_per_process_gpu_memory_fraction=0.8,
+            device_intra_op_parallelism_threads=0,
+            device_inter_op_parallelism_threads=0
         )
     else:
         raise ValueError("unsupported config type {0}".format(config_type))